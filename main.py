@@ -1,7 +1,7 @@
 from pyfiglet import Figlet
 from trading_system.strategy_manager import StrategyManager
 from trading_system.state import PortfolioState
-from trading_system.utils.portfolio_manager import PortfolioManager  #  New import
+from trading_system.utils.portfolio_manager import PortfolioManager, last_prices  #  New import
 from trading_system.backtest.portfolio_backtest import PortfolioBacktester
 from datetime import datetime
 
@@ -41,6 +41,24 @@ help
 clear 
     ➔ Clear the screen 
 
+sweep [spec.yaml]
+    ➔ Sweep dei parametri di una strategia (default config/sweep.yaml), risultati ordinati in logs/
+
+walkforward [spec.yaml]
+    ➔ Walk-forward in-sample/out-of-sample (default config/walk_forward.yaml), curva out-of-sample in logs/
+
+replay
+    ➔ Replay delle barre locali attraverso i runner live con broker simulato (TRADING_PROVIDER=sim), misura il throughput
+
+latency [on|off|reset|<stock>]
+    ➔ Latenze per simbolo e stadio (adapter -> aggregate -> runner -> strategy -> book -> submit), p50/p99/max
+
+profile start [ms] | profile stop | profile
+    ➔ Profiler CPU a campionamento su tutti i thread (default 10 ms); stop scrive logs/profile_<ts>.folded (flamegraph)
+
+memsnap [stop]
+    ➔ Snapshot tracemalloc: il primo fa da baseline, i successivi scrivono il diff in logs/memsnap_<ts>.txt
+
 set_reinvest <stock> <ratio 0..1>
     ➔ Imposta la quota di profitto da reinvestire per uno stock (es. set_reinvest btc_usd 0.4)
 
@@ -60,8 +78,8 @@ def main():
 
     # === Shared State ===
     state = PortfolioState()
-    manager = StrategyManager(state)
     portfolio = PortfolioManager()  #  New: loads portfolio config and trader
+    manager = StrategyManager(state, stock_state=portfolio.stock_state)
 
     # === Bootstrap from broker state ===
     portfolio.bootstrap()
@@ -85,14 +103,15 @@ def main():
             print(f"Available Cash: ${cash:,.2f}\n")
             
             market_value = 0.0
-            
+            prices = last_prices(portfolio.trader, holdings)
+
             for stock, data in holdings.items():
                 qty = data.get("quantity", 0)
                 invested = data.get("money_invested", 0.0)
                 realized = data.get("realized_pnl", 0.0)
                 avg_price = (invested / qty) if qty else 0.0
 
-                current_price = portfolio.trader.get_last_price(stock)
+                current_price = prices.get(stock.upper().replace("_", "/"))
                 stock_value = qty * current_price if current_price else 0.0
                 market_value += stock_value
 
@@ -119,23 +138,118 @@ def main():
             start_iso, end_iso = _to_iso(start), _to_iso(end)
             try: timeframe_minutes = int(tf_s)
             except: timeframe_minutes = 1
+            wk_s  = input("Parallel workers (1 = sequenziale, 0 = tutti i core) ...: ").strip()
+            try: workers = int(wk_s)
+            except: workers = 1
+            eng_s = input("Engine (symbol = per simbolo, event = orologio comune + equity curve) ...: ").strip().lower()
+            engine = eng_s if eng_s in ("symbol", "event") else "symbol"
 
-            # <<< QUI >>> broker disabilitato
-            portfolio = PortfolioManager(broker_enabled=False)
-            portfolio.bootstrap()
+            # <<< QUI >>> broker disabilitato, stato in memoria (lo stato live resta intatto)
+            # nomi separati: portfolio/manager restano quelli live (exit chiude la loro pipeline)
+            bt_portfolio = PortfolioManager(broker_enabled=False, state_backend="memory")
+            bt_portfolio.bootstrap()
 
-            manager = StrategyManager(PortfolioState())
-            strategies_map = manager.stock_to_strategy
+            bt_manager = StrategyManager(PortfolioState(), stock_state=bt_portfolio.stock_state)
+            strategies_map = bt_manager.stock_to_strategy
 
             backtester = PortfolioBacktester(
-                portfolio=portfolio,
+                portfolio=bt_portfolio,
                 strategies_map=strategies_map,
                 timeframe_minutes=timeframe_minutes,
                 start_iso=start_iso,
                 end_iso=end_iso,
+                workers=workers,
+                engine=engine,
             )
             print("\n[Backtest] Starting ..."); backtester.run(); print("[Backtest] Completed.\n")
 
+        elif cmd == "sweep" or cmd.startswith("sweep "):
+            from trading_system.backtest.param_sweep import load_spec, run_sweep, print_top, SWEEP_SPEC
+            parts = cmd.split()
+            spec_path = parts[1] if len(parts) > 1 else SWEEP_SPEC
+            wk_s = input("Parallel workers (0 = tutti i core) ...: ").strip()
+            try: workers = int(wk_s)
+            except: workers = 0
+            try:
+                spec = load_spec(spec_path)
+                rows = run_sweep(spec, workers=workers)
+                print_top(rows, list(spec["params"].keys()))
+            except Exception as e:
+                print(f"[Sweep] ERRORE: {e}")
+
+        elif cmd == "walkforward" or cmd.startswith("walkforward "):
+            from trading_system.backtest.param_sweep import load_spec
+            from trading_system.backtest.walk_forward import run_walk_forward, WALK_FORWARD_SPEC
+            parts = cmd.split()
+            spec_path = parts[1] if len(parts) > 1 else WALK_FORWARD_SPEC
+            wk_s = input("Parallel workers (0 = tutti i core) ...: ").strip()
+            try: workers = int(wk_s)
+            except: workers = 0
+            try:
+                run_walk_forward(load_spec(spec_path), workers=workers)
+            except Exception as e:
+                print(f"[WalkForward] ERRORE: {e}")
+
+        elif cmd == "replay":
+            from trading_system.backtest.replay import run_replay
+            start = input("Start date ...: ").strip()
+            end   = input("End date ...  : ").strip()
+            sp_s  = input("Speed (0 = massima, 60 = un minuto di mercato al secondo) ...: ").strip()
+            def _to_iso(x): return x if ("T" in x or " " in x) else x + "T00:00:00Z"
+            try: speed = float(sp_s)
+            except: speed = 0.0
+            try:
+                run_replay(_to_iso(start), _to_iso(end), speed=speed)
+            except Exception as e:
+                print(f"[Replay] ERRORE: {e}")
+
+        elif cmd == "latency" or cmd.startswith("latency "):
+            from trading_system.utils.latency import TRACER
+            arg = cmd.split(" ", 1)[1].strip() if " " in cmd else ""
+            if arg == "on":
+                TRACER.enable()
+                print("[Latency] tracing attivo")
+            elif arg == "off":
+                TRACER.disable()
+                print("[Latency] tracing disattivato")
+            elif arg == "reset":
+                TRACER.reset()
+                print("[Latency] istogrammi azzerati")
+            else:
+                print(TRACER.report(arg or None))
+
+        elif cmd == "profile" or cmd.startswith("profile "):
+            from trading_system.utils.profiling import PROFILER
+            parts = cmd.split()
+            try:
+                if len(parts) >= 2 and parts[1] == "start":
+                    PROFILER.start(float(parts[2]) / 1000.0 if len(parts) > 2 else None)
+                    print(f"[Profile] campionamento ogni {PROFILER.interval * 1000:.1f} ms su tutti i thread")
+                elif len(parts) == 2 and parts[1] == "stop":
+                    path, summ = PROFILER.stop()
+                    print(f"[Profile] {summ['samples']} campioni in {summ['seconds']:.1f}s -> {path}")
+                    for name, n in summ["top_self"]:
+                        print(f"    {n:>7}  {name}")
+                elif len(parts) == 1:
+                    state = "attivo" if PROFILER.running else "fermo"
+                    print(f"[Profile] {state}, {PROFILER.samples} campioni")
+                else:
+                    print("Usage: profile start [interval_ms] | profile stop")
+            except (RuntimeError, ValueError) as e:
+                print(f"[Profile] {e}")
+
+        elif cmd == "memsnap" or cmd.startswith("memsnap "):
+            from trading_system.utils.profiling import MEMSNAP
+            if cmd == "memsnap stop":
+                MEMSNAP.stop()
+                print("[Memsnap] tracemalloc fermato")
+            elif cmd == "memsnap":
+                path = MEMSNAP.snap()
+                print(f"[Memsnap] diff scritto in {path}" if path else
+                      "[Memsnap] baseline presa (tracemalloc attivo), rilancia memsnap per il diff")
+            else:
+                print("Usage: memsnap [stop]")
+
         elif cmd.startswith("close "):
             stock = cmd.split(" ", 1)[1].strip()
             manager.send_command(stock, "close_position")
@@ -175,6 +289,7 @@ def main():
 
         elif cmd == "exit":
             print(" Exiting Trading System.")
+            portfolio.close()
             break
         
         elif cmd.startswith("set_reinvest "):
@@ -0,0 +1,189 @@
+# trading_system/backtest/event_engine.py
+from __future__ import annotations
+import os
+import csv
+import heapq
+import importlib
+from itertools import repeat
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from trading_system.utils.portfolio_manager import PortfolioManager
+from trading_system.utils.bars import BarArrays, NS_PER_MIN, to_ns, ns_to_iso
+from trading_system.utils.bar_store import BarStore, STORE_ROOT
+from trading_system.utils.resample import resample, bucket_start_ns
+from trading_system.utils.decision_log import get_decision_logger, LOG_TRADES
+from trading_system.backtest.portfolio_backtest import open_local_source, _norm_symbol
+
+# barre sorgente lette (e convertite in oggetti Python) per volta, per simbolo
+CHUNK_ROWS = 16_384
+
+EQUITY_FIELDS = ["bar_ts", "equity", "cash", "holdings_value", "realized_pnl_pool", "trades"]
+
+# ===================== STREAM PER SIMBOLO =====================
+
+def iter_chunks(bars: BarArrays, tf_src: int, tf_out: int, start_ns: int, end_ns: int,
+                chunk_rows: int = CHUNK_ROWS) -> Iterator[BarArrays]:
+    """
+    Scorre le barre sorgente (memory-mapped) a blocchi di ~chunk_rows righe e restituisce
+    blocchi già aggregati a tf_out e filtrati su [start, end]. Se serve aggregare, i tagli
+    cadono sui confini dei bucket di tf_out: il risultato concatenato è identico a
+    resample(bars) sull'intera serie, ma in memoria c'è un solo blocco alla volta.
+    """
+    n = len(bars)
+    tf_ns = int(tf_out) * NS_PER_MIN
+    i = 0
+    while i < n:
+        j = min(i + chunk_rows, n)
+        if tf_src != tf_out and j < n:
+            edge = int(bucket_start_ns(int(bars.t[j - 1]), tf_out)) + tf_ns
+            j = int(np.searchsorted(bars.t, edge, side="left"))
+        part = bars[i:j]
+        if tf_src != tf_out:
+            part = resample(part, tf_out, label="right")
+        part = part.between(start_ns, end_ns)
+        if len(part):
+            yield part
+        i = j
+
+
+def iter_events(idx: int, chunks: Iterator[BarArrays]) -> Iterator[Tuple[int, int, float]]:
+    """Eventi (t_ns, indice_simbolo, close) in ordine di tempo; l'indice rompe i pareggi."""
+    for part in chunks:
+        yield from zip(part.t.tolist(), repeat(idx), part.c.tolist())
+
+# ===================== ENGINE =====================
+
+class EventBacktestEngine:
+    """
+    Backtest di portafoglio guidato dagli eventi: le barre di tutti i simboli vengono fuse
+    in ordine di timestamp (k-way merge con heapq.merge su un iteratore per simbolo) e
+    passate alle strategie e al PortfolioManager su un orologio comune. A differenza del
+    backtest per simbolo, cash, PnL pool e posizioni evolvono insieme nel tempo.
+
+    Ogni volta che l'orologio avanza viene scritta una riga della curva di equity
+    (cash + valore posizioni ai last price + PnL pool) in streaming su CSV.
+    La memoria resta limitata: per ogni simbolo è aperto un solo blocco di CHUNK_ROWS barre
+    (le colonne sono memory-mapped dallo store), l'heap del merge ha un elemento per simbolo.
+    """
+    def __init__(self, portfolio: PortfolioManager, strategies_map: Dict[str, str],
+                 timeframe_minutes: int, start_iso: str, end_iso: str,
+                 data_dirs: Optional[List[str]] = None,
+                 allow_download: bool = True,
+                 decision_log: str = LOG_TRADES,
+                 equity_path: Optional[str] = None,
+                 equity_every: int = 1,
+                 store_root: Optional[str] = None,
+                 chunk_rows: int = CHUNK_ROWS):
+        self.portfolio = portfolio
+        self.strategies_map = strategies_map
+        self.tf = int(timeframe_minutes)
+        self.start_iso = start_iso
+        self.end_iso = end_iso
+        self.data_dirs = data_dirs or ["data", os.path.join("data", "crypto")]
+        self.allow_download = allow_download
+        self.decision_log = decision_log
+        self.equity_path = equity_path or os.path.join("logs", "backtest_equity.csv")
+        # una riga di equity ogni `equity_every` tick dell'orologio (l'ultima viene sempre scritta)
+        self.equity_every = max(1, int(equity_every))
+        self.store = BarStore(store_root or STORE_ROOT)
+        self.chunk_rows = int(chunk_rows)
+
+        self.symbols: List[str] = []
+        self.strategies: list = []
+        self.trades = 0
+
+    # ---------- setup ----------
+    def _streams(self) -> List[Iterator[Tuple[int, int, float]]]:
+        start_ns, end_ns = to_ns(self.start_iso), to_ns(self.end_iso)
+        pm = self.portfolio
+        streams = []
+        for stock, module_name in self.strategies_map.items():
+            sym_norm = _norm_symbol(stock)
+            try:
+                strategy_cls = getattr(importlib.import_module(f"trading_system.strategies.{module_name}"), "Strategy")
+            except Exception as e:
+                print(f"[Backtest/Event] Cannot load strategy {module_name} for {stock}: {e}")
+                continue
+            bars, tf_file, source = open_local_source(self.store, stock, self.tf, self.data_dirs,
+                                                      start_ns, end_ns, self.allow_download)
+            if bars is None or not len(bars):
+                print(f"[Backtest/Event] No bars for {stock}, skipping.")
+                continue
+            print(f"[Backtest/Event] {stock} <- {source} (tf={tf_file}m -> {self.tf}m)")
+
+            budget = float(pm.allocations.get(sym_norm, 0.0)) * pm.initial_budget
+            self.strategies.append(strategy_cls(
+                sym_norm, budget,
+                log_path=os.path.join("logs", f"backtest_rsi_{sym_norm}.csv"),
+                log_level=self.decision_log,
+            ))
+            self.symbols.append(sym_norm)
+            chunks = iter_chunks(bars, tf_file, self.tf, start_ns, end_ns, self.chunk_rows)
+            streams.append(iter_events(len(self.symbols) - 1, chunks))
+        return streams
+
+    # ---------- loop ----------
+    def run(self) -> Dict[str, float]:
+        print(f"[Backtest/Event] {self.tf}m, {self.start_iso} -> {self.end_iso}, symbols={list(self.strategies_map)}")
+        streams = self._streams()
+        pm = self.portfolio
+        stock_state = pm.stock_state
+        strategies, symbols = self.strategies, self.symbols
+        n = len(symbols)
+        last = [0.0] * n
+        qty = [float(stock_state.get_quantity(s)) for s in symbols]
+        holdings = 0.0
+        cash = sum(pm.stock_cash.values())
+
+        d = os.path.dirname(self.equity_path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        clock, ticks, row = None, 0, None
+        with open(self.equity_path, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(EQUITY_FIELDS)
+            for t, i, price in heapq.merge(*streams):
+                if t != clock:
+                    if row is not None and ticks % self.equity_every == 0:
+                        w.writerow((ns_to_iso(row[0]),) + row[1:])
+                    clock = t
+                    ticks += 1
+
+                holdings += qty[i] * (price - last[i])
+                last[i] = price
+                sym = symbols[i]
+                signal = strategies[i].on_data({"symbol": sym, "price": price, "timestamp": t})
+                action = signal["action"]
+                if action != "hold":
+                    if action == "buy":
+                        q = float(signal.get("quantity", 0.0))
+                        if q > 0:
+                            pm.book_buy(sym, q, price)
+                            self.trades += 1
+                    elif action == "sell":
+                        q = float(stock_state.get_quantity(sym))
+                        if q > 0:
+                            pm.book_sell(sym, q, price)
+                            self.trades += 1
+                    # dopo un trade si ricalcolano i totali (niente deriva dagli aggiornamenti incrementali)
+                    qty[i] = float(stock_state.get_quantity(sym))
+                    holdings = sum(q * p for q, p in zip(qty, last))
+                    cash = sum(pm.stock_cash.values())
+
+                # timestamp formattato in ISO solo per le righe scritte
+                row = (t, cash + holdings + pm.realized_pnl_pool, cash, holdings, pm.realized_pnl_pool, self.trades)
+            if row is not None:
+                w.writerow((ns_to_iso(row[0]),) + row[1:])
+
+        get_decision_logger().flush()
+        summary = {
+            "equity": row[1] if row is not None else cash + pm.realized_pnl_pool,
+            "realized_pnl_pool": pm.realized_pnl_pool,
+            "trades": self.trades,
+            "ticks": ticks,
+        }
+        print(f"[Backtest/Event] done: ticks={ticks} trades={self.trades} "
+              f"equity={summary['equity']:.2f} (curve: {self.equity_path})")
+        return summary
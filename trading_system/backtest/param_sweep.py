@@ -0,0 +1,353 @@
+# trading_system/backtest/param_sweep.py
+"""
+Sweep degli iperparametri di una strategia (grid o random search).
+
+Le barre vengono caricate una sola volta (fetch_local_bars) e copiate in shared memory;
+ogni worker del pool le mappa all'avvio e valuta blocchi di set di parametri su tutti i
+simboli con il percorso batch della strategia (on_bars) quando disponibile.
+Il risultato è una tabella CSV ordinata (logs/sweep_<strategia>_<timestamp>.csv) con
+PnL, numero di trade, win rate e max drawdown per ogni set.
+
+    python -m trading_system.backtest.param_sweep --spec config/sweep.yaml --workers 8
+
+Esempio di spec (YAML):
+
+    strategy: rsi_strategy
+    symbols: [btc_usd, eth_usd]
+    timeframe_minutes: 5
+    start: 2025-01-01T00:00:00Z
+    end: 2025-06-01T00:00:00Z
+    capital: 1000            # capitale per simbolo
+    mode: grid               # grid | random
+    samples: 500             # solo per mode=random
+    seed: 42
+    rank_by: pnl             # pnl | return_pct | max_drawdown_pct | win_rate | trades
+    params:
+      window: [7, 14, 21]                   # lista di valori
+      rsi_buy: {min: 20, max: 40, step: 5}  # range (estremi inclusi)
+      hard_tp_pct: [null, 0.02]
+"""
+from __future__ import annotations
+import os
+import csv
+import random
+import argparse
+import importlib
+import itertools
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import yaml
+
+from trading_system.strategies.base import has_batch, ACTION_BUY, ACTION_SELL
+from trading_system.utils.bars import BarArrays
+from trading_system.utils.decision_log import LOG_OFF
+from trading_system.backtest.portfolio_backtest import fetch_local_bars, _norm_symbol, _real_symbol
+
+SWEEP_SPEC = os.path.join("config", "sweep.yaml")
+RANK_KEYS = ("pnl", "return_pct", "max_drawdown_pct", "win_rate", "trades")
+
+# ===================== SPEC =====================
+
+def load_spec(path: str = SWEEP_SPEC) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Spec sweep non trovata: {path}")
+    with open(path, "r", encoding="utf-8") as f:
+        spec = yaml.safe_load(f) or {}
+    for key in ("strategy", "symbols", "start", "end", "params"):
+        if not spec.get(key):
+            raise ValueError(f"Spec sweep: campo '{key}' mancante")
+    mode = spec.get("mode", "grid")
+    if mode not in ("grid", "random"):
+        raise ValueError(f"Spec sweep: mode non valido: {mode} (usa 'grid' o 'random')")
+    if spec.get("rank_by", "pnl") not in RANK_KEYS:
+        raise ValueError(f"Spec sweep: rank_by non valido: {spec.get('rank_by')} (usa {', '.join(RANK_KEYS)})")
+    return spec
+
+
+def _range_values(name: str, r: dict) -> List[Any]:
+    lo, hi, step = r.get("min"), r.get("max"), r.get("step")
+    if lo is None or hi is None or not step:
+        raise ValueError(f"Parametro '{name}': un range richiede min, max e step")
+    if all(isinstance(x, int) for x in (lo, hi, step)):
+        return list(range(lo, hi + 1, step))
+    n = int(np.floor((hi - lo) / step + 1e-9)) + 1
+    # arrotondamento per evitare 0.30000000000000004 nei nomi/CSV
+    return [round(lo + i * step, 10) for i in range(n)]
+
+
+def expand_grid(params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Prodotto cartesiano dei valori di ogni parametro (liste, range {min,max,step} o scalari)."""
+    names, values = [], []
+    for name, spec in params.items():
+        if isinstance(spec, dict):
+            vals = _range_values(name, spec)
+        elif isinstance(spec, (list, tuple)):
+            vals = list(spec)
+        else:
+            vals = [spec]
+        names.append(name)
+        values.append(vals)
+    return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+
+def sample_random(params: Dict[str, Any], samples: int, seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Random search: liste -> scelta uniforme; range {min,max} -> uniforme continuo
+    (intero se min/max sono interi, quantizzato se c'è step).
+    """
+    rng = random.Random(seed)
+    out = []
+    for _ in range(int(samples)):
+        p = {}
+        for name, spec in params.items():
+            if isinstance(spec, dict):
+                if spec.get("step"):
+                    p[name] = rng.choice(_range_values(name, spec))
+                elif isinstance(spec.get("min"), int) and isinstance(spec.get("max"), int):
+                    p[name] = rng.randint(spec["min"], spec["max"])
+                else:
+                    p[name] = rng.uniform(float(spec["min"]), float(spec["max"]))
+            elif isinstance(spec, (list, tuple)):
+                p[name] = rng.choice(list(spec))
+            else:
+                p[name] = spec
+        out.append(p)
+    return out
+
+
+def param_sets(spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if spec.get("mode", "grid") == "random":
+        return sample_random(spec["params"], spec.get("samples", 100), spec.get("seed"))
+    return expand_grid(spec["params"])
+
+# ===================== VALUTAZIONE =====================
+
+def _signals(strategy, bars: BarArrays) -> Tuple[np.ndarray, np.ndarray]:
+    if has_batch(strategy):
+        return strategy.on_bars(bars.t, bars.o, bars.h, bars.l, bars.c, bars.v)
+    actions = np.zeros(len(bars), dtype=np.int8)
+    qtys = np.zeros(len(bars), dtype=np.float64)
+    for i, (t, price) in enumerate(zip(bars.t.tolist(), bars.c.tolist())):
+        sig = strategy.on_data({"symbol": strategy.stock, "price": price, "timestamp": t})
+        if sig["action"] == "buy":
+            actions[i], qtys[i] = ACTION_BUY, float(sig.get("quantity", 0.0))
+        elif sig["action"] == "sell":
+            actions[i] = ACTION_SELL
+    return actions, qtys
+
+
+def account(c: np.ndarray, actions: np.ndarray, qtys: np.ndarray, capital: float,
+            with_equity: bool = False) -> Dict[str, Any]:
+    """
+    Contabilità di un singolo simbolo con le stesse regole del backtest (book_buy/book_sell):
+    buy della quantità del segnale, sell dell'intera posizione, costo medio per il PnL realizzato.
+    La curva di equity (cash + qty * close) è costante a tratti tra un trade e l'altro,
+    quindi si ricostruisce in modo vettoriale dai soli indici dei trade.
+    Con with_equity=True la curva (una voce per barra) è restituita in "equity".
+    """
+    idx = np.flatnonzero(actions)
+    cash, qty, invested, realized = float(capital), 0.0, 0.0, 0.0
+    trades = wins = 0
+    cash_after = np.empty(len(idx))
+    qty_after = np.empty(len(idx))
+    for k, i in enumerate(idx.tolist()):
+        price = float(c[i])
+        if actions[i] == ACTION_BUY and qtys[i] > 0:
+            q = float(qtys[i])
+            cash -= q * price
+            invested += q * price
+            qty += q
+            trades += 1
+        elif actions[i] == ACTION_SELL and qty > 0:
+            avg_cost = invested / qty
+            pnl = qty * price - qty * avg_cost
+            realized += pnl
+            wins += pnl > 0
+            cash += qty * price
+            invested = qty = 0.0
+            trades += 1
+        cash_after[k], qty_after[k] = cash, qty
+
+    if len(c):
+        k = np.searchsorted(idx, np.arange(len(c)), side="right") - 1
+        seg_cash = np.where(k >= 0, cash_after[np.maximum(k, 0)] if len(idx) else capital, capital)
+        seg_qty = np.where(k >= 0, qty_after[np.maximum(k, 0)] if len(idx) else 0.0, 0.0)
+        equity = seg_cash + seg_qty * c
+        peak = np.maximum.accumulate(equity)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dd = np.where(peak > 0, (peak - equity) / peak, 0.0)
+        max_dd = float(dd.max())
+        final = float(equity[-1])
+    else:
+        equity = np.empty(0)
+        max_dd, final = 0.0, float(capital)
+
+    sells = int((actions == ACTION_SELL).sum())
+    out = {
+        "pnl": final - float(capital),
+        "realized_pnl": realized,
+        "trades": trades,
+        "win_rate": (wins / sells) if sells else 0.0,
+        "max_drawdown_pct": max_dd * 100.0,
+        "final_equity": final,
+    }
+    if with_equity:
+        out["equity"] = equity
+    return out
+
+
+def evaluate(strategy_cls, params: Dict[str, Any], bars_by_sym: Dict[str, BarArrays],
+             capital: float) -> Dict[str, Any]:
+    """Valuta un set di parametri su tutti i simboli; ritorna metriche aggregate e PnL per simbolo."""
+    row: Dict[str, Any] = {"pnl": 0.0, "realized_pnl": 0.0, "trades": 0, "wins": 0.0, "max_drawdown_pct": 0.0}
+    sells = 0
+    for sym, bars in bars_by_sym.items():
+        # log della strategia disattivato: migliaia di istanze scriverebbero tutte su disco
+        strat = strategy_cls(sym, capital, log_level=LOG_OFF, **params)
+        actions, qtys = _signals(strat, bars)
+        m = account(bars.c, actions, qtys, capital)
+        n_sells = int((actions == ACTION_SELL).sum())
+        row["pnl"] += m["pnl"]
+        row["realized_pnl"] += m["realized_pnl"]
+        row["trades"] += m["trades"]
+        row["wins"] += m["win_rate"] * n_sells
+        row["max_drawdown_pct"] = max(row["max_drawdown_pct"], m["max_drawdown_pct"])
+        row[f"pnl_{sym}"] = m["pnl"]
+        sells += n_sells
+    total_capital = capital * max(1, len(bars_by_sym))
+    row["return_pct"] = row["pnl"] / total_capital * 100.0 if total_capital else 0.0
+    row["win_rate"] = row.pop("wins") / sells if sells else 0.0
+    return row
+
+# ===================== WORKER =====================
+
+_WORKER: Dict[str, Any] = {}
+
+
+def _detach_worker():
+    _WORKER.pop("bars", None)
+    from trading_system.utils.shared_bars import release
+    for shm in _WORKER.pop("shm", []):
+        release(shm)
+
+
+def _init_worker(handles: Dict[str, dict], strategy: str, capital: float):
+    from multiprocessing import util
+    from trading_system.utils.shared_bars import attach_bars
+    shms, bars = [], {}
+    for sym, h in handles.items():
+        shm, b = attach_bars(h)
+        shms.append(shm)
+        bars[sym] = b
+    _WORKER.update(shm=shms, bars=bars, capital=capital,
+                   cls=getattr(importlib.import_module(f"trading_system.strategies.{strategy}"), "Strategy"))
+    # le viste vanno rilasciate prima di chiudere i blocchi, all'uscita del worker
+    util.Finalize(None, _detach_worker, exitpriority=10)
+
+
+def _eval_chunk(chunk: List[Tuple[int, Dict[str, Any]]]) -> List[Tuple[int, Dict[str, Any]]]:
+    return [(i, evaluate(_WORKER["cls"], p, _WORKER["bars"], _WORKER["capital"])) for i, p in chunk]
+
+# ===================== SWEEP =====================
+
+def run_sweep(spec: Dict[str, Any], workers: Optional[int] = None, out_path: Optional[str] = None,
+              store_root: Optional[str] = None, data_dirs: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Esegue lo sweep e scrive il CSV ordinato. workers: None/0 = un processo per core, 1 = nel processo corrente.
+    Ritorna le righe ordinate (rank 1 = migliore secondo rank_by).
+    """
+    sets = param_sets(spec)
+    if not sets:
+        raise ValueError("Spec sweep: nessun set di parametri da valutare")
+    tf = int(spec.get("timeframe_minutes", 1))
+    capital = float(spec.get("capital", 1000.0))
+    syms = [_norm_symbol(s) for s in spec["symbols"]]
+    start_iso, end_iso = str(spec["start"]), str(spec["end"])
+
+    print(f"[Sweep] Loading {tf}m bars for {syms} from {start_iso} to {end_iso} ...")
+    loaded = fetch_local_bars(syms, start_iso, end_iso, tf, data_dirs=data_dirs,
+                              allow_download=bool(spec.get("allow_download", True)), store_root=store_root)
+    bars_by_sym = {s: loaded[_real_symbol(s)] for s in syms if len(loaded.get(_real_symbol(s), ()))}
+    if not bars_by_sym:
+        raise RuntimeError("[Sweep] Nessuna barra disponibile per i simboli richiesti")
+
+    workers = int(workers) if workers else (os.cpu_count() or 1)
+    workers = max(1, min(workers, len(sets)))
+    print(f"[Sweep] {len(sets)} set di parametri × {len(bars_by_sym)} simboli su {workers} processi ...")
+
+    indexed = list(enumerate(sets))
+    results: Dict[int, Dict[str, Any]] = {}
+    if workers == 1:
+        cls = getattr(importlib.import_module(f"trading_system.strategies.{spec['strategy']}"), "Strategy")
+        for i, p in indexed:
+            results[i] = evaluate(cls, p, bars_by_sym, capital)
+    else:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        from trading_system.utils.shared_bars import share_bars, release
+        blocks, handles = [], {}
+        for s, b in bars_by_sym.items():
+            shm, h = share_bars(b)
+            blocks.append(shm)
+            handles[s] = h
+        size = max(1, len(indexed) // (workers * 8))
+        chunks = [indexed[i:i + size] for i in range(0, len(indexed), size)]
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(handles, spec["strategy"], capital)) as ex:
+                done = 0
+                for fut in as_completed([ex.submit(_eval_chunk, ch) for ch in chunks]):
+                    for i, r in fut.result():
+                        results[i] = r
+                    done += 1
+                    if done % max(1, len(chunks) // 10) == 0 or done == len(chunks):
+                        print(f"[Sweep] {len(results)}/{len(sets)} set valutati")
+        finally:
+            for shm in blocks:
+                release(shm, unlink=True)
+
+    key = spec.get("rank_by", "pnl")
+    reverse = key != "max_drawdown_pct"
+    order = sorted(results, key=lambda i: (results[i][key], -i) if reverse else (-results[i][key], -i), reverse=True)
+    rows = []
+    for rank, i in enumerate(order, 1):
+        rows.append({"rank": rank, **sets[i], **results[i]})
+
+    out_path = out_path or os.path.join(
+        "logs", f"sweep_{spec['strategy']}_{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.csv")
+    write_results(out_path, rows, list(spec["params"].keys()), list(bars_by_sym.keys()))
+    print(f"[Sweep] Risultati ({len(rows)} righe, ordinati per {key}) scritti in: {out_path}")
+    return rows
+
+
+def write_results(path: str, rows: List[Dict[str, Any]], param_names: List[str], symbols: List[str]) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fields = (["rank"] + param_names +
+              ["pnl", "return_pct", "realized_pnl", "trades", "win_rate", "max_drawdown_pct"] +
+              [f"pnl_{s}" for s in symbols])
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        w.writeheader()
+        w.writerows(rows)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--spec", default=SWEEP_SPEC)
+    ap.add_argument("--workers", type=int, default=0, help="processi (0 = tutti i core)")
+    ap.add_argument("--out", default=None, help="CSV risultati (default logs/sweep_<strategia>_<ts>.csv)")
+    args = ap.parse_args(argv)
+    spec = load_spec(args.spec)
+    rows = run_sweep(spec, workers=args.workers, out_path=args.out)
+    print_top(rows, list(spec["params"].keys()))
+
+
+def print_top(rows: List[Dict[str, Any]], param_names: List[str], n: int = 10) -> None:
+    for r in rows[:n]:
+        print(f"  #{r['rank']:<3} pnl={r['pnl']:>10.2f}  trades={r['trades']:<5} "
+              f"dd={r['max_drawdown_pct']:.2f}%  {', '.join(f'{k}={r[k]}' for k in param_names)}")
+
+
+if __name__ == "__main__":
+    main()
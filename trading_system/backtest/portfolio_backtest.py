@@ -4,11 +4,19 @@ import os
 import re
 import csv
 import importlib
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 from typing import Dict, List, Any, Optional, Tuple
 
+import numpy as np
+
+from trading_system.strategies.base import has_batch, ACTION_BUY, ACTION_SELL
 from trading_system.utils.portfolio_manager import PortfolioManager
-from trading_system.utils.historical_downloader import fetch_crypto_bars
+from trading_system.utils.bars import BarArrays, NS_PER_MIN, to_ns
+from trading_system.utils.bar_store import BarStore, STORE_ROOT
+from trading_system.utils.bar_csv import read_csv_rows, read_csv_bars, write_csv_bars
+from trading_system.utils.resample import resample
+from trading_system.utils.bar_sync import sync_symbol
+from trading_system.utils.decision_log import get_decision_logger, LOG_TRADES
 
 # ===================== UTIL LOCAL DATA =====================
 
@@ -22,32 +30,6 @@ def _file_symbol(sym_norm: str) -> str:
     # nome file con trattino: BTC-USD
     return sym_norm.upper().replace("_", "-")
 
-def _parse_iso(ts: str) -> datetime:
-    ts = ts.strip()
-    if ts.endswith("Z"):
-        ts = ts.replace("Z", "+00:00")
-    try:
-        dt = datetime.fromisoformat(ts)
-    except Exception:
-        for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
-            try:
-                dt = datetime.strptime(ts, fmt)
-                break
-            except Exception:
-                dt = None
-        if dt is None:
-            raise
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    return dt.astimezone(timezone.utc)
-
-def _floor_min(dt: datetime) -> datetime:
-    return dt.replace(second=0, microsecond=0)
-
-def _bucket_start(dt: datetime, tf_min: int) -> datetime:
-    base = _floor_min(dt)
-    return base - timedelta(minutes=(base.minute % tf_min))
-
 def _infer_tf_from_path(path: str) -> Optional[int]:
     m = re.search(r'[/\\](\d{1,3})m[/\\]', path, re.IGNORECASE)
     if m: return int(m.group(1))
@@ -67,17 +49,6 @@ def _candidate_paths(symbol_variants: List[str], tf_min: int, data_dirs: List[st
                 os.path.join(root, f"{tf_min}m", f"{sym.replace('_','-')}.csv"),
                 os.path.join(root, f"{tf_min}m", f"{sym.replace('_','')}.csv"),
             ]
-    # fallback: 1m
-    for root in data_dirs:
-        for sym in symbol_variants:
-            cands += [
-                os.path.join(root, f"{sym}_1m.csv"),
-                os.path.join(root, f"{sym.replace('_','-')}_1m.csv"),
-                os.path.join(root, f"{sym.replace('_','')}_1m.csv"),
-                os.path.join(root, "1m", f"{sym}.csv"),
-                os.path.join(root, "1m", f"{sym.replace('_','-')}.csv"),
-                os.path.join(root, "1m", f"{sym.replace('_','')}.csv"),
-            ]
     # de-dup mantenendo ordine
     seen = set(); out = []
     for p in cands:
@@ -85,78 +56,92 @@ def _candidate_paths(symbol_variants: List[str], tf_min: int, data_dirs: List[st
             seen.add(p); out.append(p)
     return out
 
-def _read_csv_bars(path: str) -> List[dict]:
-    bars: List[dict] = []
-    with open(path, "r", newline="", encoding="utf-8") as f:
-        rdr = csv.DictReader(f)
-        def pick(row: dict, keys: List[str], default=None):
-            for k in keys:
-                if k in row and row[k] not in (None, ""):
-                    return row[k]
-            return default
-        for row in rdr:
-            t = pick(row, ["t","timestamp","time","datetime","date"])
-            o = pick(row, ["o","open","Open"])
-            h = pick(row, ["h","high","High"])
-            l = pick(row, ["l","low","Low"])
-            c = pick(row, ["c","close","Close","adj_close"])
-            v = pick(row, ["v","volume","Volume"], "0")
-            if t is None or o is None or h is None or l is None or c is None:
-                continue
-            try:
-                bars.append({
-                    "t": _parse_iso(str(t)).isoformat(),
-                    "o": float(o), "h": float(h), "l": float(l), "c": float(c), "v": float(v or 0.0)
-                })
-            except Exception:
-                continue
-    bars.sort(key=lambda x: x["t"])
-    return bars
+def _read_csv_bars(path: str, bulk: bool = False):
+    """
+    bulk=False: lettura riga per riga -> list-of-dict {t: iso, o,h,l,c,v} (formato legacy).
+    bulk=True : ingestione vettoriale -> BarArrays ordinato (vedi bar_csv.read_csv_bars).
+    """
+    if bulk:
+        return read_csv_bars(path)
+    return read_csv_rows(path)
 
-def _aggregate_bars(bars: List[dict], tf_in_min: int, tf_out_min: int) -> List[dict]:
+def _aggregate_bars(bars: BarArrays, tf_in_min: int, tf_out_min: int) -> BarArrays:
+    # t = fine finestra (stessa convenzione di sempre); bucket math condivisa con lo stream live
     if tf_in_min == tf_out_min:
-        return bars[:]
-    out: List[dict] = []
-    cur_start: Optional[datetime] = None
-    o = h = l = c = v = None
-    for b in bars:
-        ts = _parse_iso(b["t"])
-        bstart = _bucket_start(ts, tf_out_min)
-        if cur_start is None:
-            cur_start = bstart
-            o = b["o"]; h = b["h"]; l = b["l"]; c = b["c"]; v = b["v"]
-        elif bstart != cur_start:
-            out.append({
-                "t": (cur_start + timedelta(minutes=tf_out_min)).isoformat(),
-                "o": float(o), "h": float(h), "l": float(l), "c": float(c), "v": float(v or 0.0)
-            })
-            cur_start = bstart
-            o = b["o"]; h = b["h"]; l = b["l"]; c = b["c"]; v = b["v"]
-        else:
-            h = max(h, b["h"])
-            l = min(l, b["l"])
-            c = b["c"]
-            v = (v or 0.0) + (b.get("v") or 0.0)
-    if cur_start is not None:
-        out.append({
-            "t": (cur_start + timedelta(minutes=tf_out_min)).isoformat(),
-            "o": float(o), "h": float(h), "l": float(l), "c": float(c), "v": float(v or 0.0)
-        })
-    return out
-
-def _filter_range(bars: List[dict], start_iso: str, end_iso: str) -> List[dict]:
-    if not bars: return bars
-    start_dt = _parse_iso(start_iso)
-    end_dt   = _parse_iso(end_iso)
-    return [b for b in bars if start_dt <= _parse_iso(b["t"]) <= end_dt]
-
-def _save_bars_csv(path: str, bars: List[dict]) -> None:
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        w.writerow(["t","o","h","l","c","v"])
-        for b in bars:
-            w.writerow([b["t"], b["o"], b["h"], b["l"], b["c"], b.get("v", 0.0)])
+        return bars
+    return resample(bars, tf_out_min, label="right")
+
+def _filter_range(bars: BarArrays, start_iso: str, end_iso: str) -> BarArrays:
+    # serie ordinata: due ricerche binarie, restituisce una vista
+    if not len(bars): return bars
+    return bars.between(to_ns(start_iso), to_ns(end_iso))
+
+def _save_bars_csv(path: str, bars) -> None:
+    if not isinstance(bars, BarArrays):
+        bars = BarArrays.from_dicts(bars)
+    write_csv_bars(path, bars)
+
+def _load_local(store: BarStore, sym_real: str, variants: List[str], tf_min: int,
+                data_dirs: List[str], start_ns: int, end_ns: int
+                ) -> Tuple[Optional[BarArrays], Optional[int], Optional[str]]:
+    """
+    Cerca le barre per un simbolo: prima al tf richiesto, poi a 1m.
+    Per ciascun tf un CSV trovato nelle data_dirs viene (re)importato nello store se cambiato;
+    la lettura avviene sempre dallo store memory-mapped e solo sul range che serve:
+    se il tf sorgente è diverso si parte da start - tf, così la prima candela
+    aggregata (etichettata a fine finestra) è completa.
+    Ritorna (barre, tf_sorgente, descrizione_sorgente) o (None, None, None).
+    """
+    for tf_try in dict.fromkeys([tf_min, 1]):
+        tf_file, source = None, None
+        for p in _candidate_paths(variants, tf_try, data_dirs):
+            if os.path.isfile(p):
+                tf_file = _infer_tf_from_path(p) or tf_try
+                store.import_csv(p, sym_real, tf_file)
+                source = os.path.relpath(p)
+                break
+        if tf_file is None and store.rows(sym_real, tf_try) > 0:
+            tf_file = tf_try
+            source = os.path.relpath(store.path(sym_real, tf_try))
+        if tf_file is not None:
+            lo_ns = start_ns if tf_file == tf_min else start_ns - tf_min * NS_PER_MIN
+            return store.load(sym_real, tf_file, lo_ns, end_ns), tf_file, source
+    return None, None, None
+
+def open_local_source(store: BarStore, sym: str, timeframe_minutes: int, data_dirs: List[str],
+                      start_ns: int, end_ns: int, allow_download: bool = True
+                      ) -> Tuple[Optional[BarArrays], Optional[int], Optional[str]]:
+    """
+    Barre sorgente (memory-mapped, non ancora aggregate) di un simbolo per [start, end]:
+    importa eventuali CSV nello store e, se consentito, scarica prima gli intervalli mancanti.
+    Ritorna (barre, tf_sorgente, descrizione_sorgente) come _load_local.
+    """
+    sym_norm = _norm_symbol(sym)
+    sym_real = _real_symbol(sym_norm)  # BTC/USD
+    file_sym = _file_symbol(sym_norm)  # BTC-USD
+    variants = [
+        sym_norm.upper(),                   # BTC_USD
+        file_sym,                           # BTC-USD
+        sym_norm.upper().replace("_",""),   # BTCUSD
+    ]
+    # 1) lettura locale (importa eventuali CSV nello store)
+    rows, tf_file, source = _load_local(store, sym_real, variants, timeframe_minutes, data_dirs,
+                                        start_ns, end_ns)
+
+    # 2) se consentito, completa lo store con gli intervalli mancanti
+    if allow_download:
+        tf_sync = tf_file or timeframe_minutes
+        try:
+            got = sync_symbol(sym_real, start_ns, end_ns, tf_sync, store=store)
+        except Exception as e:
+            print(f"[Backtest/DL] ERRORE download {sym_real}: {e}")
+            got = 0
+        if got:
+            print(f"[Backtest/DL] {sym_real}: +{got} barre in {os.path.relpath(store.path(sym_real, tf_sync))}")
+        if got or rows is None:
+            rows, tf_file, source = _load_local(store, sym_real, variants, timeframe_minutes, data_dirs,
+                                                start_ns, end_ns)
+    return rows, tf_file, source
 
 def fetch_local_bars(
     symbols: List[str],
@@ -165,82 +150,36 @@ def fetch_local_bars(
     timeframe_minutes: int,
     data_dirs: Optional[List[str]] = None,
     allow_download: bool = True,
-) -> Dict[str, List[dict]]:
+    store_root: Optional[str] = None,
+) -> Dict[str, BarArrays]:
     """
-    Carica barre DA CSV locali. Se mancano e allow_download=True:
-      - scarica da Alpaca al tf richiesto
-      - salva in data/<TF>m/<SYMBOL>.csv (SYMBOL come BTC-USD)
-      - ricarica e restituisce.
-    Restituisce: { "BTC/USD": [ {t,o,h,l,c,v}, ...], ... }
+    Carica barre dallo store colonnare locale (data/store/<TF>m/<SYMBOL>/, memory-mapped).
+    I CSV nelle data_dirs restano un formato di import: se presenti vengono importati nello store.
+    Se allow_download=True lo store viene prima sincronizzato con Alpaca (bar_sync):
+      - si scaricano solo gli intervalli di [start, end] non ancora presenti su disco
+        (al tf dei dati locali, o al tf richiesto se non c'è nulla)
+      - merge+dedup nello store (data/store/<TF>m/<SYMBOL>/, SYMBOL come BTC-USD)
+      - poi si carica il range richiesto.
+    Restituisce: { "BTC/USD": BarArrays(t,o,h,l,c,v), ... }
     """
     data_dirs = data_dirs or ["data", os.path.join("data", "crypto")]
-    res: Dict[str, List[dict]] = {}
-    missing: List[str] = []           # simboli (formato 'BTC/USD') da scaricare
+    store = BarStore(store_root or STORE_ROOT)
+    start_ns, end_ns = to_ns(start_iso), to_ns(end_iso)
+    res: Dict[str, BarArrays] = {}
 
-    # 1) tenta lettura locale
     for sym in symbols:
-        sym_norm = _norm_symbol(sym)
-        sym_real = _real_symbol(sym_norm)  # BTC/USD
-        file_sym = _file_symbol(sym_norm)  # BTC-USD
-        variants = [
-            sym_norm.upper(),                   # BTC_USD
-            file_sym,                           # BTC-USD
-            sym_norm.upper().replace("_",""),   # BTCUSD
-        ]
-        cands = _candidate_paths(variants, timeframe_minutes, data_dirs)
-        picked = None; tf_file = None
-        for p in cands:
-            if os.path.isfile(p):
-                picked = p
-                tf_file = _infer_tf_from_path(p) or timeframe_minutes
-                break
-
-        if picked:
-            rows = _read_csv_bars(picked)
+        sym_real = _real_symbol(_norm_symbol(sym))  # BTC/USD
+        rows, tf_file, source = open_local_source(store, sym, timeframe_minutes, data_dirs,
+                                                  start_ns, end_ns, allow_download)
+        if rows is not None and len(rows):
             if tf_file != timeframe_minutes:
                 rows = _aggregate_bars(rows, tf_file, timeframe_minutes)
             rows = _filter_range(rows, start_iso, end_iso)
             res[sym_real] = rows
-            print(f"[Backtest/LOCAL] {sym} <- {os.path.relpath(picked)}  bars={len(rows)} (tf={timeframe_minutes}m)")
+            print(f"[Backtest/LOCAL] {sym} <- {source}  bars={len(rows)} (tf={timeframe_minutes}m)")
         else:
-            print(f"[Backtest/LOCAL] CSV non trovato per {sym}. Proverò a scaricare…" if allow_download else
-                  f"[Backtest/LOCAL] CSV non trovato per {sym}.")
-            res[sym_real] = []
-            if allow_download:
-                missing.append(sym_real)
-
-    # 2) se mancano e consentito, scarica e salva
-    if allow_download and missing:
-        print(f"[Backtest/DL] Scarico {timeframe_minutes}m bars per: {missing}")
-        try:
-            bars_remote = fetch_crypto_bars(
-                symbols=missing,                 # formati 'BTC/USD'
-                start_iso=start_iso,
-                end_iso=end_iso,
-                timeframe_minutes=timeframe_minutes,
-                api_key=None,                    # usa env PAPER_API_* o APCA_API_*
-                api_secret=None,
-            )
-        except Exception as e:
-            print(f"[Backtest/DL] ERRORE download: {e}")
-            bars_remote = {}
-
-        for sym_real in missing:
-            arr = bars_remote.get(sym_real, []) or []
-            if not arr:
-                print(f"[Backtest/DL] Nessun dato per {sym_real} dall'API.")
-                continue
-            # normalizza chiavi remote -> locali
-            rows = [{"t": b["t"], "o": b["o"], "h": b["h"], "l": b["l"], "c": b["c"], "v": b.get("v", 0.0)} for b in arr]
-            # salva su data/<TF>m/<SYMBOL>.csv
-            file_sym = sym_real.replace("/", "-")  # BTC-USD
-            out_path = os.path.join("data", f"{timeframe_minutes}m", f"{file_sym}.csv")
-            _save_bars_csv(out_path, rows)
-            print(f"[Backtest/DL] Salvato {len(rows)} barre in {os.path.relpath(out_path)}")
-
-            # carica in memoria (già filtrate per data dall'API, ma filtro comunque)
-            rows = _filter_range(rows, start_iso, end_iso)
-            res[sym_real] = rows
+            print(f"[Backtest/LOCAL] Nessun dato per {sym}.")
+            res[sym_real] = BarArrays.empty()
 
     return res
 
@@ -248,22 +187,46 @@ def fetch_local_bars(
 
 class BacktestStrategyRunner:
     def __init__(self, stock: str, strategy_cls, initial_capital: float,
-                 portfolio: PortfolioManager, bars: List[dict], backtest_log_suffix: str = "backtest"):
+                 portfolio: PortfolioManager, bars: BarArrays, backtest_log_suffix: str = "backtest",
+                 decision_log: str = LOG_TRADES):
         self.stock = stock.lower().replace("/", "_")
         self.portfolio = portfolio
+        # decision_log: off | trades | all ("all" scrive una riga per barra e disattiva il percorso batch)
         self.strategy = strategy_cls(
             self.stock,
             initial_capital,
-            log_path=os.path.join("logs", f"{backtest_log_suffix}_rsi_{self.stock}.csv")
+            log_path=os.path.join("logs", f"{backtest_log_suffix}_rsi_{self.stock}.csv"),
+            log_level=decision_log,
         )
-        self.bars = bars
+        self.bars = bars if isinstance(bars, BarArrays) else BarArrays.from_dicts(bars)
 
     def run(self):
         stock_name = self.stock.upper().replace("_", "/")
         print(f"[{stock_name}] BacktestRunner starting on {len(self.bars)} bars...")
-        for b in self.bars:
-            price = float(b["c"])
-            data = {"symbol": self.stock, "price": price, "timestamp": b.get("t")}
+        if has_batch(self.strategy):
+            self._run_batch()
+        else:
+            self._run_per_bar()
+        print(f"[{stock_name}] BacktestRunner done.")
+
+    def _run_batch(self):
+        # la strategia elabora l'intera serie in un colpo: qui si eseguono solo le barre con un segnale
+        b = self.bars
+        actions, qtys = self.strategy.on_bars(b.t, b.o, b.h, b.l, b.c, b.v)
+        for i in np.flatnonzero(actions).tolist():
+            price = float(b.c[i])
+            if actions[i] == ACTION_BUY:
+                qty = float(qtys[i])
+                if qty > 0:
+                    self.portfolio.book_buy(self.stock, qty, price)
+            elif actions[i] == ACTION_SELL:
+                qty = float(self.portfolio.stock_state.get_quantity(self.stock))
+                if qty > 0:
+                    self.portfolio.book_sell(self.stock, qty, price)
+
+    def _run_per_bar(self):
+        for t, price in zip(self.bars.t.tolist(), self.bars.c.tolist()):
+            data = {"symbol": self.stock, "price": price, "timestamp": t}
             signal = self.strategy.on_data(data)
 
             if signal["action"] == "buy":
@@ -272,17 +235,59 @@ class BacktestStrategyRunner:
                     self.portfolio.book_buy(self.stock, qty, price)
 
             elif signal["action"] == "sell":
-                cur = self.portfolio.stock_state.get_state(self.stock) or {}
-                qty = float(cur.get("quantity", 0))
+                qty = float(self.portfolio.stock_state.get_quantity(self.stock))
                 if qty > 0:
                     self.portfolio.book_sell(self.stock, qty, price)
-        print(f"[{stock_name}] BacktestRunner done.")
+
+# ===================== WORKER (backtest parallelo) =====================
+
+def _run_symbol_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Backtest di un singolo simbolo in un processo worker. Le barre arrivano via shared memory;
+    il portafoglio è locale al worker (stato in memoria, nessun broker) e parte dallo stato del
+    processo padre per quel simbolo. Ritorna stato finale, cash e ledger dei trade.
+    """
+    from trading_system.utils.portfolio_manager import _NoOpTrader
+    from trading_system.utils.stock_state_manager import StockStateManager, MemoryStateBackend
+    from trading_system.utils.shared_bars import attach_bars, release
+
+    s = job["symbol"]
+    shm, bars = attach_bars(job["bars"])
+    try:
+        pm = PortfolioManager(config_path=job["config_path"], broker_enabled=False,
+                              trader=_NoOpTrader(), stock_state=StockStateManager(backend=MemoryStateBackend()))
+        pm.stock_cash = {s: job["cash"]}
+        pm.reinvest_ratio = dict(job["reinvest_ratio"])
+        pm.default_reinvest_ratio = job["default_reinvest_ratio"]
+        if job["state"] is not None:
+            pm.stock_state.set_state(s, job["state"])
+        pm.ledger = []
+
+        strategy_cls = getattr(importlib.import_module(f"trading_system.strategies.{job['module']}"), "Strategy")
+        runner = BacktestStrategyRunner(stock=s, strategy_cls=strategy_cls, initial_capital=job["budget"],
+                                        portfolio=pm, bars=bars, backtest_log_suffix="backtest",
+                                        decision_log=job["decision_log"])
+        runner.run()
+        del runner
+        get_decision_logger().flush()
+        return {
+            "state": pm.stock_state.get_all_states().get(s),
+            "cash": pm.stock_cash.get(s, 0.0),
+            "ledger": pm.ledger,
+        }
+    finally:
+        del bars
+        release(shm)
+
 
 class PortfolioBacktester:
     def __init__(self, portfolio: PortfolioManager, strategies_map: Dict[str, str],
                  timeframe_minutes: int, start_iso: str, end_iso: str,
                  data_dirs: Optional[List[str]] = None,
-                 allow_download: bool = True):
+                 allow_download: bool = True,
+                 workers: Optional[int] = 1,
+                 decision_log: str = LOG_TRADES,
+                 engine: str = "symbol"):
         self.portfolio = portfolio
         self.strategies_map = strategies_map
         self.tf = int(timeframe_minutes)
@@ -290,6 +295,14 @@ class PortfolioBacktester:
         self.end_iso = end_iso
         self.data_dirs = data_dirs or ["data", os.path.join("data", "crypto")]
         self.allow_download = allow_download
+        # workers: 1 = sequenziale nel processo corrente, N > 1 = pool di processi, None/0 = un worker per core
+        self.workers = int(workers) if workers else (os.cpu_count() or 1)
+        self.decision_log = decision_log
+        # engine: "symbol" = un simbolo alla volta (batch/parallelo), "event" = orologio comune
+        # su tutti i simboli con curva di equity (vedi event_engine.py)
+        if engine not in ("symbol", "event"):
+            raise ValueError(f"Engine non valido: {engine} (usa 'symbol' o 'event')")
+        self.engine = engine
 
         self.pnl_log_path = os.path.join("logs", "backtest_pnl.csv")
         os.makedirs("logs", exist_ok=True)
@@ -305,21 +318,8 @@ class PortfolioBacktester:
         with open(self.pnl_log_path, "a", newline="", encoding="utf-8") as f:
             csv.writer(f).writerow([datetime.now(timezone.utc).isoformat(), symbol, total])
 
-    def run(self):
-        # 1) carica (o scarica+salva) i dati
-        symbols = list(self.strategies_map.keys())
-        print(f"[Backtest] Loading {self.tf}m bars for {symbols} from {self.start_iso} to {self.end_iso} ...")
-        bars_by_sym = fetch_local_bars(
-            symbols=symbols,
-            start_iso=self.start_iso,
-            end_iso=self.end_iso,
-            timeframe_minutes=self.tf,
-            data_dirs=self.data_dirs,
-            allow_download=self.allow_download,
-        )
-        print("[Backtest] Data ready.")
-
-        # 2) esecuzione sequenziale delle strategie
+    def _jobs(self, bars_by_sym: Dict[str, BarArrays]):
+        """(stock, sym_norm, module_name, strategy_cls, budget, series) per ogni simbolo eseguibile, in ordine."""
         for stock, module_name in self.strategies_map.items():
             sym_norm = stock.lower().replace("/", "_")
             budget_for_stock = float(self.portfolio.allocations.get(sym_norm, 0.0)) * self.portfolio.initial_budget
@@ -331,23 +331,112 @@ class PortfolioBacktester:
                 print(f"[Backtest] Cannot load strategy {module_name} for {stock}: {e}")
                 continue
 
-            series = bars_by_sym.get(_real_symbol(sym_norm)) or []
-            if not series:
+            series = bars_by_sym.get(_real_symbol(sym_norm))
+            if series is None or not len(series):
                 print(f"[Backtest] No bars for {stock}, skipping.")
                 continue
+            yield stock, sym_norm, module_name, strategy_cls, budget_for_stock, series
 
+    def _run_sequential(self, jobs):
+        for stock, sym_norm, _, strategy_cls, budget_for_stock, series in jobs:
             runner = BacktestStrategyRunner(
                 stock=sym_norm,
                 strategy_cls=strategy_cls,
                 initial_capital=budget_for_stock,
                 portfolio=self.portfolio,
                 bars=series,
-                backtest_log_suffix="backtest"
+                backtest_log_suffix="backtest",
+                decision_log=self.decision_log,
             )
             runner.run()
             self._append_pnl(stock)
 
+    def _run_parallel(self, jobs):
+        """
+        Un task per simbolo su un pool di processi. Cash e stato per simbolo sono indipendenti;
+        l'unico stato condiviso è il PnL pool, che viene ricostruito sommando le quote dei trade
+        nello stesso ordine della run sequenziale (simboli in ordine, trade in ordine):
+        il risultato è identico al bit.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        from trading_system.utils.shared_bars import share_bars, release
+
+        pm = self.portfolio
+        blocks, futures = [], []
+        try:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(jobs))) as ex:
+                for stock, sym_norm, module_name, _, budget_for_stock, series in jobs:
+                    shm, handle = share_bars(series)
+                    blocks.append(shm)
+                    st = pm.stock_state.get_all_states().get(sym_norm)
+                    futures.append((stock, sym_norm, ex.submit(_run_symbol_job, {
+                        "symbol": sym_norm,
+                        "module": module_name,
+                        "budget": budget_for_stock,
+                        "bars": handle,
+                        "config_path": pm.config_path,
+                        "cash": pm.stock_cash.get(sym_norm, 0.0),
+                        "reinvest_ratio": pm.reinvest_ratio,
+                        "default_reinvest_ratio": pm.default_reinvest_ratio,
+                        "state": None if st is None else dict(st),
+                        "decision_log": self.decision_log,
+                    })))
+                # merge nell'ordine dei simboli
+                for stock, sym_norm, fut in futures:
+                    res = fut.result()
+                    if res["state"] is not None:
+                        pm.stock_state.set_state(sym_norm, res["state"])
+                    pm.stock_cash[sym_norm] = res["cash"]
+                    for side, _, _, _, pool_part in res["ledger"]:
+                        if side == "sell":
+                            pm.realized_pnl_pool += pool_part
+                    if pm.ledger is not None:
+                        pm.ledger.extend(res["ledger"])
+                    self._append_pnl(stock)
+        finally:
+            for shm in blocks:
+                release(shm, unlink=True)
+
+    def _run_event(self):
+        from trading_system.backtest.event_engine import EventBacktestEngine
+        EventBacktestEngine(
+            self.portfolio, self.strategies_map, self.tf, self.start_iso, self.end_iso,
+            data_dirs=self.data_dirs, allow_download=self.allow_download, decision_log=self.decision_log,
+        ).run()
+        self._append_pnl("ALL")
+
+    def run(self):
+        if self.engine == "event":
+            # le barre vengono lette in streaming dallo store, niente caricamento completo
+            self._run_event()
+            self._summary()
+            return
+
+        # 1) carica (o scarica+salva) i dati
+        symbols = list(self.strategies_map.keys())
+        print(f"[Backtest] Loading {self.tf}m bars for {symbols} from {self.start_iso} to {self.end_iso} ...")
+        bars_by_sym = fetch_local_bars(
+            symbols=symbols,
+            start_iso=self.start_iso,
+            end_iso=self.end_iso,
+            timeframe_minutes=self.tf,
+            data_dirs=self.data_dirs,
+            allow_download=self.allow_download,
+        )
+        print("[Backtest] Data ready.")
+
+        # 2) esecuzione delle strategie (sequenziale o su pool di processi)
+        jobs = list(self._jobs(bars_by_sym))
+        if self.workers > 1 and len(jobs) > 1:
+            print(f"[Backtest] Running {len(jobs)} symbols on {min(self.workers, len(jobs))} processes ...")
+            self._run_parallel(jobs)
+        else:
+            self._run_sequential(jobs)
+
         # 3) riepilogo
+        self._summary()
+
+    def _summary(self):
         all_states = self.portfolio.stock_state.get_all_states()
         total_realized = sum(float(st.get("realized_pnl", 0.0)) for st in all_states.values())
         print("\n[Backtest] Summary:")
@@ -355,3 +444,4 @@ class PortfolioBacktester:
             print(f"  - {s.upper()}: realized PnL = {float(st.get('realized_pnl', 0.0)):.2f}")
         print(f"  TOTAL realized PnL = {total_realized:.2f}")
         print(f"  PnL log written to: {self.pnl_log_path}")
+        get_decision_logger().flush()
@@ -0,0 +1,162 @@
+# trading_system/backtest/replay.py
+from __future__ import annotations
+import os
+import time
+import heapq
+import threading
+from itertools import repeat
+from typing import Callable, Dict, Iterator, List, Optional
+
+from trading_system.state import PortfolioState
+from trading_system.strategy_manager import StrategyManager
+from trading_system.utils.portfolio_manager import PortfolioManager
+from trading_system.utils.order_pipeline import OrderPipeline
+from trading_system.utils.market_data_hub import MarketDataHub
+from trading_system.utils.alpaca_bars_adapter import to_alpaca_symbol
+from trading_system.utils.sim_trading_interface import SimulatedTradingInterface, SimQuotes
+from trading_system.utils.bar_store import BarStore, STORE_ROOT
+from trading_system.utils.bars import Bar, to_ns
+from trading_system.backtest.event_engine import iter_chunks, CHUNK_ROWS
+from trading_system.backtest.portfolio_backtest import open_local_source
+
+# ===================== SORGENTE DI REPLAY =====================
+
+class BarReplaySource:
+    """
+    Sorgente per MarketDataHub che rilegge le barre 1m dello store locale al posto del
+    websocket: le barre dei simboli sottoscritti vengono fuse in ordine di tempo
+    (heapq.merge, un blocco di CHUNK_ROWS righe per simbolo) e consegnate con lo stesso
+    record Bar di bar_payload(), quindi a valle gira il percorso live reale
+    (hub -> AggregatingBarStream -> StrategyRunner -> PortfolioManager -> OrderPipeline).
+
+    speed = 0: più veloce possibile; speed = k: k volte il tempo reale (60 = un minuto di
+    mercato al secondo).
+    Il replay parte solo con play(), dopo che i runner si sono sottoscritti.
+    """
+    def __init__(self, start_iso: str, end_iso: str, store: Optional[BarStore] = None,
+                 data_dirs: Optional[List[str]] = None, speed: float = 0.0,
+                 chunk_rows: int = CHUNK_ROWS):
+        self.start_ns, self.end_ns = to_ns(start_iso), to_ns(end_iso)
+        self.store = store or BarStore(STORE_ROOT)
+        self.data_dirs = data_dirs or ["data", os.path.join("data", "crypto")]
+        self.speed = float(speed)
+        self.chunk_rows = int(chunk_rows)
+        self.symbols: set = set()
+        self.bars = 0
+        self._on_bar: Optional[Callable[[dict], None]] = None
+        self._stop = threading.Event()
+
+    # ---------- interfaccia sorgente ----------
+    def start(self, on_bar, symbols) -> None:
+        self._on_bar = on_bar
+        self.symbols.update(symbols)
+
+    def subscribe(self, symbols) -> None:
+        self.symbols.update(symbols)
+
+    def unsubscribe(self, symbols) -> None:
+        self.symbols.difference_update(symbols)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    # ---------- replay ----------
+    def _stream(self, sym: str) -> Iterator[tuple]:
+        bars, tf, _ = open_local_source(self.store, sym, 1, self.data_dirs,
+                                        self.start_ns, self.end_ns, allow_download=False)
+        if bars is None or not len(bars) or tf != 1:
+            print(f"[Replay] Nessuna barra 1m per {sym}, skip.")
+            return
+        for part in iter_chunks(bars, 1, 1, self.start_ns, self.end_ns, self.chunk_rows):
+            yield from zip(part.t.tolist(), repeat(sym), part.o.tolist(), part.h.tolist(),
+                           part.l.tolist(), part.c.tolist(), part.v.tolist())
+
+    def play(self) -> int:
+        """Consegna tutte le barre nel thread chiamante; ritorna il numero di barre inviate."""
+        on_bar = self._on_bar
+        if on_bar is None:
+            return 0
+        last_t = None
+        for t, sym, o, h, l, c, v in heapq.merge(*(self._stream(s) for s in sorted(self.symbols))):
+            if self._stop.is_set():
+                break
+            if self.speed > 0 and last_t is not None and t > last_t:
+                time.sleep((t - last_t) / 1e9 / self.speed)
+            last_t = t
+            on_bar(Bar(sym, t, o, h, l, c, v))
+            self.bars += 1
+        return self.bars
+
+# ===================== DRIVER =====================
+
+def _wait(cond: Callable[[], bool], timeout: float) -> bool:
+    end = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def run_replay(start_iso: str, end_iso: str, speed: float = 0.0,
+               strategies_path: str = "config/strategies.yaml",
+               portfolio_path: str = "config/portfolio.yaml",
+               store_root: Optional[str] = None,
+               data_dirs: Optional[List[str]] = None,
+               sim_params: Optional[dict] = None,
+               runtime: Optional[str] = None,
+               settle_timeout: float = 30.0) -> Dict[str, float]:
+    """
+    Replay delle barre locali attraverso StrategyManager/StrategyRunner con il broker
+    simulato e la pipeline ordini: niente rete, stato in memoria. Ritorna le metriche
+    di throughput (barre/s) e di esecuzione (ordini, fill, rifiuti).
+    """
+    store = BarStore(store_root or STORE_ROOT)
+    source = BarReplaySource(start_iso, end_iso, store=store, data_dirs=data_dirs, speed=speed)
+    hub = MarketDataHub(lambda: source)
+    trader = SimulatedTradingInterface(quotes=SimQuotes(store), **(sim_params or {}))
+
+    # polling dei fill alla scala della latenza simulata, non a quella del broker reale
+    pipeline = OrderPipeline(trader, poll_interval=max(0.001, trader.latency_ms / 1000.0))
+    pm = PortfolioManager(portfolio_path, broker_enabled=True, trader=trader, state_backend="memory",
+                          order_pipeline=pipeline)
+    pm.bootstrap()
+    state = PortfolioState()
+    manager = StrategyManager(state, strategies_path, hub=hub, runtime=runtime, trader=trader,
+                              stock_state=pm.stock_state)
+    manager.start_all(pm)
+    expected = {to_alpaca_symbol(s) for s in manager.stock_to_strategy}
+    if not _wait(lambda: expected <= set(hub.symbols()), timeout=10.0):
+        print(f"[Replay] WARN: runner non sottoscritti: {sorted(expected - set(hub.symbols()))}")
+
+    print(f"[Replay] {start_iso} -> {end_iso}, simboli={sorted(hub.symbols())}, speed={speed or 'max'}")
+    t0 = time.perf_counter()
+    bars = source.play()
+    # asyncio: le barre sono in coda ai task finché il loop non le ha consumate
+    _wait(lambda: all(getattr(r, "inbox", None) is None or r.inbox.empty()
+                      for r in manager.runners.values()), timeout=settle_timeout)
+    elapsed = time.perf_counter() - t0
+    _wait(lambda: not pipeline.orders, timeout=settle_timeout)
+
+    for stock in list(manager.runners):
+        manager.send_command(stock, "close_position")
+    pm.close()
+    hub.close()
+    if manager.runtime is not None:
+        manager.runtime.stop()
+
+    summary = {
+        "bars": bars,
+        "seconds": elapsed,
+        "bars_per_sec": bars / elapsed if elapsed > 0 else 0.0,
+        "orders": pipeline.submitted,
+        "filled": pipeline.counts["filled"],
+        "rejected": pipeline.counts["rejected"],
+        "failed": pipeline.counts["failed"],
+        "cash": float(trader.cash),
+        "realized_pnl_pool": pm.realized_pnl_pool,
+    }
+    print(f"[Replay] {bars} barre in {elapsed:.2f}s ({summary['bars_per_sec']:,.0f} barre/s), "
+          f"ordini={summary['orders']} filled={summary['filled']} rejected={summary['rejected']} "
+          f"failed={summary['failed']}")
+    return summary
@@ -0,0 +1,318 @@
+# trading_system/backtest/walk_forward.py
+"""
+Walk-forward optimization: la storia viene divisa in finestre mobili in-sample / out-of-sample;
+su ogni in-sample si ottimizzano i parametri della strategia (stessa spec dello sweep) e il set
+migliore viene valutato sull'out-of-sample successivo. Le curve di equity out-of-sample vengono
+cucite in un'unica curva (logs/walkforward_<strategia>_<ts>_equity.csv), con un riepilogo per
+finestra (logs/walkforward_<strategia>_<ts>.csv).
+
+Riuso fra finestre sovrapposte:
+  - le barre vengono caricate e aggregate una sola volta e condivise in shared memory;
+  - l'RSI viene calcolato una volta per simbolo e per valore distinto di `window` sull'intera
+    serie (rsi_series) e ogni finestra ne usa una fetta: l'indicatore arriva già "caldo"
+    all'inizio di ogni finestra, senza warm-up ripetuti.
+Le finestre girano in parallelo su un pool di processi.
+
+    python -m trading_system.backtest.walk_forward --spec config/walk_forward.yaml --workers 8
+
+Spec (YAML): i campi dello sweep (strategy, symbols, timeframe_minutes, start, end, capital,
+mode, samples, seed, rank_by, params) più
+
+    in_sample_days: 60
+    out_of_sample_days: 15
+    step_days: 15            # default = out_of_sample_days
+"""
+from __future__ import annotations
+import os
+import csv
+import inspect
+import argparse
+import importlib
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from trading_system.strategies.base import has_batch
+from trading_system.utils.bars import BarArrays, NS_PER_MIN, to_ns, ns_to_iso
+from trading_system.utils.decision_log import LOG_OFF
+from trading_system.backtest.portfolio_backtest import fetch_local_bars, _norm_symbol, _real_symbol
+from trading_system.backtest.param_sweep import load_spec, param_sets, account, _signals
+
+WALK_FORWARD_SPEC = os.path.join("config", "walk_forward.yaml")
+NS_PER_DAY = 24 * 60 * NS_PER_MIN
+
+Window = Tuple[int, int, int, int]  # (is_start, is_end, oos_start, oos_end) in ns, estremi finali esclusi
+
+# ===================== FINESTRE =====================
+
+def make_windows(start_ns: int, end_ns: int, in_sample_ns: int, out_of_sample_ns: int,
+                 step_ns: Optional[int] = None) -> List[Window]:
+    """
+    Finestre mobili: la prima in-sample parte da start, ogni finestra avanza di step (default = oos).
+    step < oos farebbe sovrapporre gli out-of-sample (curva cucita con tempi ripetuti): rifiutato.
+    """
+    if in_sample_ns <= 0 or out_of_sample_ns <= 0:
+        raise ValueError("Walk-forward: in-sample e out-of-sample devono essere > 0")
+    if step_ns is None:
+        step_ns = out_of_sample_ns
+    if step_ns <= 0:
+        raise ValueError("Walk-forward: step deve essere > 0")
+    if step_ns < out_of_sample_ns:
+        raise ValueError("Walk-forward: step deve essere >= out-of-sample (finestre out-of-sample sovrapposte)")
+    out: List[Window] = []
+    lo = start_ns
+    while lo + in_sample_ns < end_ns:
+        is_end = lo + in_sample_ns
+        out.append((lo, is_end, is_end, min(is_end + out_of_sample_ns, end_ns)))
+        lo += step_ns
+    return out
+
+
+def _slice(t: np.ndarray, lo_ns: int, hi_ns: int) -> slice:
+    return slice(int(np.searchsorted(t, lo_ns, side="left")), int(np.searchsorted(t, hi_ns, side="left")))
+
+# ===================== VALUTAZIONE =====================
+
+def _window_param(strategy_cls) -> Optional[int]:
+    p = inspect.signature(strategy_cls).parameters.get("window")
+    return None if p is None or p.default is inspect.Parameter.empty else int(p.default)
+
+
+def _evaluate_slice(strategy_cls, params: Dict[str, Any], data: Dict[str, Tuple[BarArrays, Optional[np.ndarray]]],
+                    capital: float, with_equity: bool = False) -> Dict[str, Any]:
+    """Metriche aggregate di un set di parametri su fette di barre (e RSI in cache, se c'è)."""
+    row: Dict[str, Any] = {"pnl": 0.0, "realized_pnl": 0.0, "trades": 0, "wins": 0.0, "max_drawdown_pct": 0.0}
+    sells = 0
+    curves = {}
+    for sym, (bars, rsi) in data.items():
+        strat = strategy_cls(sym, capital, log_level=LOG_OFF, **params)
+        if rsi is not None and has_batch(strat):
+            actions, qtys = strat.on_bars(bars.t, bars.o, bars.h, bars.l, bars.c, bars.v, rsi=rsi)
+        else:
+            actions, qtys = _signals(strat, bars)
+        m = account(bars.c, actions, qtys, capital, with_equity=with_equity)
+        n_sells = int((actions < 0).sum())
+        row["pnl"] += m["pnl"]
+        row["realized_pnl"] += m["realized_pnl"]
+        row["trades"] += m["trades"]
+        row["wins"] += m["win_rate"] * n_sells
+        row["max_drawdown_pct"] = max(row["max_drawdown_pct"], m["max_drawdown_pct"])
+        sells += n_sells
+        if with_equity:
+            curves[sym] = (bars.t, m["equity"])
+    total_capital = capital * max(1, len(data))
+    row["return_pct"] = row["pnl"] / total_capital * 100.0 if total_capital else 0.0
+    row["win_rate"] = row.pop("wins") / sells if sells else 0.0
+    if with_equity:
+        row["curve"] = portfolio_curve(curves, capital)
+    return row
+
+
+def portfolio_curve(curves: Dict[str, Tuple[np.ndarray, np.ndarray]], capital: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Somma delle equity per simbolo sull'unione dei timestamp (ultimo valore noto, capitale prima della prima barra)."""
+    if not curves:
+        return np.empty(0, np.int64), np.empty(0)
+    t_all = np.unique(np.concatenate([t for t, _ in curves.values()]))
+    total = np.zeros(len(t_all))
+    for t, eq in curves.values():
+        k = np.searchsorted(t, t_all, side="right") - 1
+        total += np.where(k >= 0, eq[np.maximum(k, 0)] if len(eq) else capital, capital)
+    return t_all, total
+
+
+def _rank_key(key: str):
+    # max drawdown: più basso è meglio
+    return (lambda r: -r[key]) if key == "max_drawdown_pct" else (lambda r: r[key])
+
+
+def run_window(strategy_cls, sets: List[Dict[str, Any]], bars_by_sym: Dict[str, BarArrays],
+               rsi_cache: Dict[str, Dict[int, np.ndarray]], window: Window, capital: float,
+               rank_by: str = "pnl") -> Dict[str, Any]:
+    """Ottimizza sull'in-sample della finestra e valuta il set migliore sull'out-of-sample."""
+    is_lo, is_hi, oos_lo, oos_hi = window
+    default_w = _window_param(strategy_cls)
+
+    def data_for(params, lo, hi):
+        w = params.get("window", default_w)
+        out = {}
+        for sym, bars in bars_by_sym.items():
+            sl = _slice(bars.t, lo, hi)
+            if sl.stop > sl.start:
+                cache = rsi_cache.get(sym, {}).get(w)
+                out[sym] = (bars[sl], None if cache is None else cache[sl])
+        return out
+
+    key = _rank_key(rank_by)
+    best, best_row = None, None
+    for i, p in enumerate(sets):
+        r = _evaluate_slice(strategy_cls, p, data_for(p, is_lo, is_hi), capital)
+        if best_row is None or key(r) > key(best_row):
+            best, best_row = i, r
+    oos = _evaluate_slice(strategy_cls, sets[best], data_for(sets[best], oos_lo, oos_hi), capital, with_equity=True)
+    return {"window": window, "best": best, "params": sets[best], "in_sample": best_row, "out_of_sample": oos}
+
+# ===================== WORKER =====================
+
+_WORKER: Dict[str, Any] = {}
+
+
+def _detach_worker():
+    _WORKER.pop("bars", None)
+    _WORKER.pop("rsi", None)
+    from trading_system.utils.shared_bars import release
+    for shm in _WORKER.pop("shm", []):
+        release(shm)
+
+
+def _init_worker(handles: Dict[str, dict], rsi_handles: Dict[str, Tuple[List[int], dict]],
+                 strategy: str, sets: List[Dict[str, Any]], capital: float, rank_by: str):
+    from multiprocessing import util
+    from trading_system.utils.shared_bars import attach_bars, attach_array
+    shms, bars, rsi = [], {}, {}
+    for sym, h in handles.items():
+        shm, bars[sym] = attach_bars(h)
+        shms.append(shm)
+    for sym, (windows, h) in rsi_handles.items():
+        shm, block = attach_array(h)
+        shms.append(shm)
+        rsi[sym] = {w: block[k] for k, w in enumerate(windows)}
+    _WORKER.update(shm=shms, bars=bars, rsi=rsi, sets=sets, capital=capital, rank_by=rank_by,
+                   cls=getattr(importlib.import_module(f"trading_system.strategies.{strategy}"), "Strategy"))
+    util.Finalize(None, _detach_worker, exitpriority=10)
+
+
+def _run_window_job(window: Window) -> Dict[str, Any]:
+    w = _WORKER
+    return run_window(w["cls"], w["sets"], w["bars"], w["rsi"], window, w["capital"], w["rank_by"])
+
+# ===================== DRIVER =====================
+
+def build_rsi_cache(strategy: str, sets: List[Dict[str, Any]], bars_by_sym: Dict[str, BarArrays]
+                    ) -> Dict[str, Dict[int, np.ndarray]]:
+    """RSI sull'intera serie per ogni simbolo e ogni valore distinto di `window` (vuoto se la strategia non lo espone)."""
+    mod = importlib.import_module(f"trading_system.strategies.{strategy}")
+    rsi_series = getattr(mod, "rsi_series", None)
+    default_w = _window_param(mod.Strategy)
+    if rsi_series is None or default_w is None:
+        return {}
+    windows = sorted({int(p.get("window", default_w)) for p in sets})
+    return {sym: {w: rsi_series(bars.c, w) for w in windows} for sym, bars in bars_by_sym.items()}
+
+
+def stitch(results: List[Dict[str, Any]], start_equity: float) -> List[Tuple[int, float, int]]:
+    """
+    Cuce le curve out-of-sample: ogni finestra riparte dall'equity finale della precedente.
+    I punti non successivi all'ultimo già cucito vengono scartati (e la finestra ribasata sul
+    punto di taglio), così i tempi restano crescenti e nessun periodo viene contato due volte.
+    """
+    rows, level, last_t = [], float(start_equity), None
+    for k, res in enumerate(results):
+        t, eq = res["out_of_sample"]["curve"]
+        i = 0 if last_t is None else int(np.searchsorted(t, last_t, side="right"))
+        if i >= len(t):
+            continue
+        base = level - (float(eq[i - 1]) if i > 0 else start_equity)
+        rows.extend(zip(t[i:].tolist(), (eq[i:] + base).tolist(), [k] * (len(t) - i)))
+        level = float(eq[-1]) + base
+        last_t = int(t[-1])
+    return rows
+
+
+def run_walk_forward(spec: Dict[str, Any], workers: Optional[int] = None, out_prefix: Optional[str] = None,
+                     store_root: Optional[str] = None, data_dirs: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Esegue il walk-forward e scrive riepilogo + curva cucita. workers: None/0 = un processo per core,
+    1 = nel processo corrente. Ritorna {"windows": [...], "equity": [(t_ns, equity, finestra), ...]}.
+    """
+    sets = param_sets(spec)
+    if not sets:
+        raise ValueError("Spec walk-forward: nessun set di parametri da valutare")
+    tf = int(spec.get("timeframe_minutes", 1))
+    capital = float(spec.get("capital", 1000.0))
+    rank_by = spec.get("rank_by", "pnl")
+    syms = [_norm_symbol(s) for s in spec["symbols"]]
+    start_iso, end_iso = str(spec["start"]), str(spec["end"])
+    is_days = float(spec.get("in_sample_days", 60))
+    oos_days = float(spec.get("out_of_sample_days", 15))
+    windows = make_windows(to_ns(start_iso), to_ns(end_iso), int(is_days * NS_PER_DAY),
+                           int(oos_days * NS_PER_DAY), int(float(spec.get("step_days", oos_days)) * NS_PER_DAY))
+    if not windows:
+        raise ValueError("Walk-forward: intervallo troppo corto per una finestra in-sample + out-of-sample")
+
+    print(f"[WalkForward] Loading {tf}m bars for {syms} from {start_iso} to {end_iso} ...")
+    loaded = fetch_local_bars(syms, start_iso, end_iso, tf, data_dirs=data_dirs,
+                              allow_download=bool(spec.get("allow_download", True)), store_root=store_root)
+    bars_by_sym = {s: loaded[_real_symbol(s)] for s in syms if len(loaded.get(_real_symbol(s), ()))}
+    if not bars_by_sym:
+        raise RuntimeError("[WalkForward] Nessuna barra disponibile per i simboli richiesti")
+    rsi_cache = build_rsi_cache(spec["strategy"], sets, bars_by_sym)
+
+    workers = int(workers) if workers else (os.cpu_count() or 1)
+    workers = max(1, min(workers, len(windows)))
+    print(f"[WalkForward] {len(windows)} finestre × {len(sets)} set × {len(bars_by_sym)} simboli su {workers} processi ...")
+
+    if workers == 1:
+        cls = getattr(importlib.import_module(f"trading_system.strategies.{spec['strategy']}"), "Strategy")
+        results = [run_window(cls, sets, bars_by_sym, rsi_cache, w, capital, rank_by) for w in windows]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        from trading_system.utils.shared_bars import share_bars, share_array, release
+        blocks, handles, rsi_handles = [], {}, {}
+        for s, b in bars_by_sym.items():
+            shm, handles[s] = share_bars(b)
+            blocks.append(shm)
+        for s, by_w in rsi_cache.items():
+            ws = sorted(by_w)
+            shm, h = share_array(np.vstack([by_w[w] for w in ws]))
+            blocks.append(shm)
+            rsi_handles[s] = (ws, h)
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(handles, rsi_handles, spec["strategy"], sets, capital, rank_by)) as ex:
+                results = list(ex.map(_run_window_job, windows))
+        finally:
+            for shm in blocks:
+                release(shm, unlink=True)
+
+    equity = stitch(results, capital * len(bars_by_sym))
+    prefix = out_prefix or os.path.join(
+        "logs", f"walkforward_{spec['strategy']}_{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}")
+    write_results(prefix, results, list(spec["params"].keys()), equity)
+    if equity:
+        print(f"[WalkForward] Equity out-of-sample finale: {equity[-1][1]:.2f} "
+              f"(partenza {capital * len(bars_by_sym):.2f}) -> {prefix}_equity.csv")
+    return {"windows": results, "equity": equity}
+
+
+def write_results(prefix: str, results: List[Dict[str, Any]], param_names: List[str],
+                  equity: List[Tuple[int, float, int]]) -> None:
+    os.makedirs(os.path.dirname(prefix) or ".", exist_ok=True)
+    with open(prefix + ".csv", "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["window", "is_start", "is_end", "oos_start", "oos_end"] + param_names +
+                   ["is_pnl", "is_trades", "oos_pnl", "oos_trades", "oos_win_rate", "oos_max_drawdown_pct"])
+        for k, r in enumerate(results):
+            is_lo, is_hi, oos_lo, oos_hi = r["window"]
+            ins, oos = r["in_sample"], r["out_of_sample"]
+            w.writerow([k, ns_to_iso(is_lo), ns_to_iso(is_hi), ns_to_iso(oos_lo), ns_to_iso(oos_hi)] +
+                       [r["params"].get(p) for p in param_names] +
+                       [ins["pnl"], ins["trades"], oos["pnl"], oos["trades"], oos["win_rate"], oos["max_drawdown_pct"]])
+    with open(prefix + "_equity.csv", "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["bar_ts", "equity", "window"])
+        w.writerows((ns_to_iso(t), eq, k) for t, eq, k in equity)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--spec", default=WALK_FORWARD_SPEC)
+    ap.add_argument("--workers", type=int, default=0, help="processi (0 = tutti i core)")
+    ap.add_argument("--out", default=None, help="prefisso file risultati (default logs/walkforward_<strategia>_<ts>)")
+    args = ap.parse_args(argv)
+    spec = load_spec(args.spec)
+    run_walk_forward(spec, workers=args.workers, out_prefix=args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# trading_system/benchmarks/bench_csv_ingest.py
+"""
+Benchmark ingestione CSV: _read_csv_bars (riga per riga) vs read_csv_bars bulk (vettoriale).
+
+    python -m trading_system.benchmarks.bench_csv_ingest --rows 2000000
+"""
+from __future__ import annotations
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import numpy as np
+
+from trading_system.utils.bars import BarArrays, NS_PER_MIN, to_ns
+from trading_system.utils.bar_csv import read_csv_bars, read_csv_rows, write_csv_bars
+
+
+def make_bars(rows: int, seed: int = 7) -> BarArrays:
+    """Serie 1m sintetica (random walk log-normale) a partire dal 2020-01-01."""
+    rng = np.random.default_rng(seed)
+    t = to_ns("2020-01-01T00:00:00Z") + np.arange(rows, dtype=np.int64) * NS_PER_MIN
+    c = 30_000.0 * np.exp(np.cumsum(rng.normal(0.0, 5e-4, rows)))
+    o = np.concatenate([[c[0]], c[:-1]])
+    h = np.maximum(o, c) * (1.0 + np.abs(rng.normal(0.0, 2e-4, rows)))
+    l = np.minimum(o, c) * (1.0 - np.abs(rng.normal(0.0, 2e-4, rows)))
+    v = rng.lognormal(0.0, 1.0, rows)
+    return BarArrays(t, o, h, l, c, v)
+
+
+def make_csv(path: str, rows: int, seed: int = 7) -> None:
+    write_csv_bars(path, make_bars(rows, seed))
+
+
+def _timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=2_000_000)
+    ap.add_argument("--csv", default=None, help="CSV esistente da usare (altrimenti ne genera uno temporaneo)")
+    ap.add_argument("--skip-legacy", action="store_true", help="non misura il percorso riga per riga")
+    args = ap.parse_args(argv)
+
+    tmp = None
+    path = args.csv
+    if path is None:
+        tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(tmp.name, "BTC-USD.csv")
+        print(f"[Bench] Genero {args.rows:,} righe in {path} ...")
+        make_csv(path, args.rows)
+    size_mb = os.path.getsize(path) / 1e6
+
+    try:
+        bulk, dt_bulk = _timed(read_csv_bars, path)
+        n = len(bulk)
+        print(f"[Bench] file={size_mb:.1f} MB rows={n:,}")
+        print(f"  bulk   : {dt_bulk:8.3f}s  {n / dt_bulk:14,.0f} rows/s")
+        if not args.skip_legacy:
+            legacy, dt_legacy = _timed(read_csv_rows, path)
+            assert len(legacy) == n, "bulk e legacy leggono un numero diverso di righe"
+            print(f"  legacy : {dt_legacy:8.3f}s  {n / dt_legacy:14,.0f} rows/s")
+            print(f"  speedup: x{dt_legacy / dt_bulk:.1f}")
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
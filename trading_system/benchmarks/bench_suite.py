@@ -0,0 +1,265 @@
+# trading_system/benchmarks/bench_suite.py
+"""
+Suite di benchmark offline, su dati generati: throughput di ogni stadio della pipeline
+(barre/s o operazioni/s), salvato in JSON per confrontare run diverse.
+
+    python -m trading_system.benchmarks.bench_suite --rows 500000
+    python -m trading_system.benchmarks.bench_suite --only csv_load,resample
+    python -m trading_system.benchmarks.bench_suite --compare logs/bench/baseline.json --tolerance 0.15
+
+Con --compare il processo esce con codice 1 se uno stadio è più lento del baseline oltre
+la tolleranza (utilizzabile come gate prima del deploy).
+"""
+from __future__ import annotations
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import numpy as np
+
+from trading_system.utils.bars import ns_to_iso
+from trading_system.utils.bar_csv import write_csv_bars
+from trading_system.utils.bar_store import BarStore, STORE_ROOT
+from trading_system.utils.decision_log import LOG_OFF, get_decision_logger
+from trading_system.utils.portfolio_manager import PortfolioManager
+from trading_system.utils.stock_state_manager import StockStateManager
+from trading_system.backtest.portfolio_backtest import PortfolioBacktester, _read_csv_bars, _aggregate_bars
+from trading_system.strategies.rsi_strategy import Strategy as RsiStrategy
+from trading_system.benchmarks.bench_csv_ingest import make_bars
+
+BENCH_DIR = os.path.join("logs", "bench")
+SYMBOL = "BTC/USD"
+
+# ===================== CONTESTO =====================
+
+class BenchContext:
+    """Dati condivisi dagli stadi: barre generate, CSV e cartella di lavoro temporanea."""
+    def __init__(self, workdir: str, rows: int, ticks: int, state_ops: int, seed: int = 7):
+        self.workdir = workdir
+        self.rows = int(rows)
+        self.ticks = min(int(ticks), self.rows)
+        self.state_ops = int(state_ops)
+        self.bars = make_bars(self.rows, seed)
+        self.csv_path = os.path.join(workdir, "data", "1m", "BTC-USD.csv")
+        os.makedirs(os.path.dirname(self.csv_path), exist_ok=True)
+        write_csv_bars(self.csv_path, self.bars)
+        self.portfolio_cfg = os.path.join(workdir, "portfolio.yaml")
+        with open(self.portfolio_cfg, "w", encoding="utf-8") as f:
+            f.write("initial_budget: 10000\nallocations:\n  btc_usd: 1.0\n")
+
+
+@contextmanager
+def _cwd(path: str):
+    prev = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(prev)
+
+# ===================== STADI =====================
+#
+# Ogni stadio fa il proprio setup e ritorna (elementi_processati, secondi_della_sola_parte_misurata).
+
+def bench_csv_load(ctx: BenchContext) -> Tuple[int, float]:
+    t0 = time.perf_counter()
+    bars = _read_csv_bars(ctx.csv_path, bulk=True)
+    return len(bars), time.perf_counter() - t0
+
+
+def bench_resample(ctx: BenchContext) -> Tuple[int, float]:
+    t0 = time.perf_counter()
+    _aggregate_bars(ctx.bars, 1, 15)
+    return ctx.rows, time.perf_counter() - t0
+
+
+def bench_rsi_on_data(ctx: BenchContext) -> Tuple[int, float]:
+    strategy = RsiStrategy("btc_usd", 10_000.0, log_level=LOG_OFF)
+    # tick come li costruiscono i runner live: timestamp epoch-ns della chiusura
+    ticks = [{"symbol": "btc_usd", "price": p, "timestamp": ts}
+             for p, ts in zip(ctx.bars.c[:ctx.ticks].tolist(), ctx.bars.t[:ctx.ticks].tolist())]
+    on_data = strategy.on_data
+    t0 = time.perf_counter()
+    for d in ticks:
+        on_data(d)
+    return len(ticks), time.perf_counter() - t0
+
+
+def bench_rsi_on_bars(ctx: BenchContext) -> Tuple[int, float]:
+    strategy = RsiStrategy("btc_usd", 10_000.0, log_level=LOG_OFF)
+    b = ctx.bars
+    t0 = time.perf_counter()
+    strategy.on_bars(b.t, b.o, b.h, b.l, b.c, b.v)
+    return ctx.rows, time.perf_counter() - t0
+
+
+def bench_book_buy_sell(ctx: BenchContext) -> Tuple[int, float]:
+    pm = PortfolioManager(ctx.portfolio_cfg, broker_enabled=False, state_backend="memory")
+    pm.bootstrap()
+    prices = ctx.bars.c[:ctx.ticks].tolist()
+    t0 = time.perf_counter()
+    for p in prices:
+        pm.book_buy("btc_usd", 0.01, p)
+        pm.book_sell("btc_usd", 0.01, p)
+    return 2 * len(prices), time.perf_counter() - t0
+
+
+def bench_state_persistence(ctx: BenchContext) -> Tuple[int, float]:
+    # backend su file con i default del live (journal + fsync per trade)
+    mgr = StockStateManager(state_file=os.path.join(ctx.workdir, "stock_state.yaml"))
+    t0 = time.perf_counter()
+    for i in range(ctx.state_ops // 2):
+        mgr.update_on_buy("btc_usd", 1, 100.0)
+        mgr.update_on_sell("btc_usd", 1, 101.0)
+    dt = time.perf_counter() - t0
+    mgr.close()
+    return 2 * (ctx.state_ops // 2), dt
+
+
+def bench_backtest_full(ctx: BenchContext) -> Tuple[int, float]:
+    root = os.path.join(ctx.workdir, "backtest")
+    os.makedirs(root, exist_ok=True)
+    with _cwd(root):
+        BarStore(STORE_ROOT).write(SYMBOL, 1, ctx.bars)
+        pm = PortfolioManager(ctx.portfolio_cfg, broker_enabled=False, state_backend="memory")
+        pm.bootstrap()
+        bt = PortfolioBacktester(pm, {"btc_usd": "rsi_strategy"}, 1,
+                                 ns_to_iso(int(ctx.bars.t[0])), ns_to_iso(int(ctx.bars.t[-1])),
+                                 allow_download=False, workers=1, decision_log=LOG_OFF)
+        t0 = time.perf_counter()
+        bt.run()
+        dt = time.perf_counter() - t0
+    return ctx.rows, dt
+
+
+# nome -> (funzione, unità)
+STAGES: Dict[str, Tuple[Callable[[BenchContext], Tuple[int, float]], str]] = {
+    "csv_load": (bench_csv_load, "bars"),
+    "resample": (bench_resample, "bars"),
+    "rsi_on_data": (bench_rsi_on_data, "bars"),
+    "rsi_on_bars": (bench_rsi_on_bars, "bars"),
+    "book_buy_sell": (bench_book_buy_sell, "ops"),
+    "state_persistence": (bench_state_persistence, "ops"),
+    "backtest_full": (bench_backtest_full, "bars"),
+}
+
+# ===================== ESECUZIONE =====================
+
+def _git_rev() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_suite(rows: int = 500_000, ticks: int = 100_000, state_ops: int = 2_000, repeat: int = 3,
+              only: Optional[List[str]] = None) -> dict:
+    """Esegue gli stadi (il migliore di `repeat` tentativi) e ritorna il dizionario dei risultati."""
+    names = list(only or STAGES)
+    unknown = set(names) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Stadi sconosciuti: {sorted(unknown)} (disponibili: {list(STAGES)})")
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git": _git_rev(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "rows": rows, "ticks": ticks, "state_ops": state_ops, "repeat": repeat,
+        },
+        "stages": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        ctx = BenchContext(tmp, rows, ticks, state_ops)
+        for name in names:
+            fn, unit = STAGES[name]
+            best = None
+            for _ in range(max(1, repeat)):
+                n, dt = fn(ctx)
+                if best is None or dt < best[1]:
+                    best = (n, dt)
+            n, dt = best
+            per_sec = n / dt if dt > 0 else float("inf")
+            results["stages"][name] = {"items": n, "seconds": dt, "per_sec": per_sec, "unit": unit}
+            print(f"  {name:<18} {n:>10,} {unit:<4} {dt:9.4f}s {per_sec:16,.0f} {unit}/s")
+        get_decision_logger().flush()
+    return results
+
+
+def write_results(results: dict, path: Optional[str] = None) -> str:
+    if path is None:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        path = os.path.join(BENCH_DIR, f"bench_{stamp}.json")
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    return path
+
+
+def compare(current: dict, baseline: dict, tolerance: float = 0.15) -> List[dict]:
+    """
+    Confronto stadio per stadio sul throughput: ratio = corrente / baseline.
+    Uno stadio è in regressione se ratio < 1 - tolerance; gli stadi presenti in uno solo
+    dei due risultati vengono ignorati.
+    """
+    rows = []
+    for name, cur in current["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if base is None or not base.get("per_sec"):
+            continue
+        ratio = cur["per_sec"] / base["per_sec"]
+        rows.append({"stage": name, "baseline": base["per_sec"], "current": cur["per_sec"],
+                     "ratio": ratio, "regression": ratio < 1.0 - tolerance})
+    return rows
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=500_000, help="barre 1m generate (CSV, resample, batch, backtest)")
+    ap.add_argument("--ticks", type=int, default=100_000, help="chiamate per gli stadi barra per barra")
+    ap.add_argument("--state-ops", type=int, default=2_000, help="aggiornamenti persistiti su file")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--only", default=None, help="lista di stadi separati da virgola")
+    ap.add_argument("--out", default=None, help=f"file JSON (default {BENCH_DIR}/bench_<ts>.json)")
+    ap.add_argument("--compare", default=None, help="JSON di baseline con cui confrontare")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="calo di throughput tollerato (0.15 = 15%%)")
+    args = ap.parse_args(argv)
+
+    print(f"[Bench] rows={args.rows:,} ticks={args.ticks:,} state_ops={args.state_ops:,} repeat={args.repeat}")
+    only = [s.strip() for s in args.only.split(",")] if args.only else None
+    results = run_suite(args.rows, args.ticks, args.state_ops, args.repeat, only)
+    path = write_results(results, args.out)
+    print(f"[Bench] risultati: {path}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, args.tolerance)
+        print(f"[Bench] confronto con {args.compare} (tolleranza {args.tolerance:.0%}):")
+        for r in rows:
+            flag = "REGRESSIONE" if r["regression"] else "ok"
+            print(f"  {r['stage']:<18} {r['baseline']:14,.0f} -> {r['current']:14,.0f}  x{r['ratio']:.2f}  {flag}")
+        if any(r["regression"] for r in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+# trading_system/strategies/async_runtime.py
+from __future__ import annotations
+import asyncio
+import threading
+from typing import Optional
+
+from trading_system.strategies.strategy_runner import StrategyRunner
+from trading_system.utils.latency import TRACER
+
+# ===================== RUNTIME =====================
+
+class AsyncRuntime:
+    """
+    Un solo event loop (in un thread dedicato) che ospita tutti i runner come task.
+    Un runner fermo è un task in attesa sulla propria coda: a riposo la CPU resta piatta
+    anche con centinaia di strategie, e comandi e barre svegliano subito il task.
+    """
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self.loop.run_forever, name="AsyncRuntime", daemon=True)
+        self._thread.start()
+
+    def submit(self, coro):
+        """Schedula una coroutine sul loop; ritorna un concurrent.futures.Future."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call_soon(self, fn, *args) -> None:
+        """Esegue fn(*args) sul loop; chiamabile da qualunque thread."""
+        self.loop.call_soon_threadsafe(fn, *args)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if self._thread is None:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+# ===================== RUNNER =====================
+
+class AsyncStrategyRunner(StrategyRunner):
+    """
+    StrategyRunner come task asyncio: barre e comandi arrivano su un'unica asyncio.Queue.
+    Le callback della sorgente dati (thread del feed) si limitano ad accodare con
+    call_soon_threadsafe; la strategia gira sul loop e gli ordini (I/O verso il broker)
+    in un thread dell'executor, così un ordine lento non blocca gli altri runner.
+    """
+    def __init__(self, *args, runtime: AsyncRuntime, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.runtime = runtime
+        self.inbox: asyncio.Queue = asyncio.Queue()
+
+    # ---------- thread esterni -> loop ----------
+    def on_data(self, data):
+        if self.running:
+            self.runtime.call_soon(self.inbox.put_nowait, ("tick", data))
+
+    def _on_bar_agg(self, bar):
+        if self.running:
+            self.runtime.call_soon(self.inbox.put_nowait, ("bar", bar))
+
+    def send_command(self, cmd) -> None:
+        self.runtime.call_soon(self.inbox.put_nowait, ("cmd", cmd))
+
+    # ---------- task ----------
+    async def run_async(self):
+        stock_name = self.stock.upper().replace("_", "/")
+        print(f"[{stock_name}] AsyncStrategyRunner starting...")
+        self.running = True
+        self._start_stream()
+        self.state.update_status(self.stock, "running")
+        try:
+            while True:
+                kind, item = await self.inbox.get()
+                if kind == "cmd":
+                    if item == "close_position":
+                        print(f"[{stock_name}] Closing strategy runner...")
+                        break
+                    continue
+                rx = None
+                if kind == "bar":
+                    # tick sintetico con la close, come StrategyRunner._on_bar_agg
+                    data = {"symbol": self.stock, "price": item.c, "timestamp": item.end}
+                    rx = item.rx_ns
+                    if rx is not None:
+                        TRACER.record(self.stock, "runner", rx)
+                else:
+                    data = item
+                signal = self.strategy.on_data(data)
+                if rx is not None:
+                    TRACER.record(self.stock, "strategy", rx)
+                if signal["action"] != "hold":
+                    await asyncio.to_thread(self._execute, signal, data["price"], rx)
+        finally:
+            self.running = False
+            self.data_stream.stop()
+            self.state.update_status(self.stock, "completed")
+            print(f"[{stock_name}] AsyncStrategyRunner stopped.")
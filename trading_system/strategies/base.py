@@ -13,9 +13,34 @@ class StrategyBase:
         :param data: dict containing at least:
                      - 'symbol': str
                      - 'price': float
-                     - 'timestamp': float (optional)
+                     - 'timestamp': int epoch-ns of the bar close, or float epoch seconds (optional)
         :return: dict containing:
                  - 'action': 'buy', 'sell', or 'hold'
                  - 'confidence': float between 0.0 and 1.0
         """
         raise NotImplementedError("Strategy must implement the on_data() method.")
+
+    def on_bars(self, t, o, h, l, c, v):
+        """
+        Optional batch entry point used by the backtester: processes a whole series at once.
+        Subclasses that override it must produce exactly the same decisions as calling
+        on_data() bar by bar on the close prices, and leave the strategy in the same state.
+
+        :param t: int64 array of bar timestamps (epoch-ns)
+        :param o, h, l, c, v: float64 arrays of open/high/low/close/volume
+        :return: tuple (actions, quantities):
+                 - actions: int8 array with ACTION_BUY / ACTION_SELL / ACTION_HOLD per bar
+                 - quantities: float64 array with the quantity of each buy/sell (0.0 on hold)
+        """
+        raise NotImplementedError("Strategy does not implement the batch on_bars() method.")
+
+
+# codici azione restituiti da on_bars()
+ACTION_HOLD = 0
+ACTION_BUY = 1
+ACTION_SELL = -1
+
+
+def has_batch(strategy) -> bool:
+    """True se la strategia implementa on_bars() (override di StrategyBase.on_bars)."""
+    return getattr(type(strategy), "on_bars", StrategyBase.on_bars) is not StrategyBase.on_bars
@@ -1,9 +1,12 @@
-from .base import StrategyBase
+from .base import StrategyBase, ACTION_BUY, ACTION_SELL, ACTION_HOLD
 import numpy as np
 from collections import deque
-import os, csv
+import os
 from datetime import datetime, timezone
 
+from trading_system.utils.decision_log import get_decision_logger
+from trading_system.utils.bars import ns_to_iso
+
 class Strategy(StrategyBase):
     def __init__(
         self,
@@ -22,6 +25,7 @@ class Strategy(StrategyBase):
         cooldown_bars=1,
         size_fraction=1.0,
         log_path: str | None = None,     # <-- nuovo: CSV path
+        log_level: str | None = None,    # off | trades | all (default: env DECISION_LOG o "all")
     ):
         super().__init__(stock)
         self.window = int(window)
@@ -57,17 +61,10 @@ class Strategy(StrategyBase):
         # ---------- logging ----------
         fname = f"rsi_{stock}.csv".replace("/", "_")
         self.log_path = log_path or os.path.join("logs", fname)
-        self._ensure_log_header()
+        # scrittura bufferizzata in background (vedi utils/decision_log.py)
+        self._log = get_decision_logger().open(self.log_path, self._log_fields(), log_level)
 
     # ========== utils logging ==========
-    def _ensure_log_header(self):
-        os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
-        need_header = not os.path.exists(self.log_path) or os.path.getsize(self.log_path) == 0
-        if need_header:
-            with open(self.log_path, "a", newline="", encoding="utf-8") as f:
-                w = csv.DictWriter(f, fieldnames=self._log_fields())
-                w.writeheader()
-
     def _log_fields(self):
         return [
             "ts_wall", "bar_ts", "stock", "action", "reason", "price", "rsi", "qty",
@@ -81,6 +78,9 @@ class Strategy(StrategyBase):
     def _to_iso(self, t):
         if t is None:
             return ""
+        if isinstance(t, (int, np.integer)) and abs(t) >= 10**14:
+            # epoch-ns (barre live e backtest)
+            return ns_to_iso(int(t))
         if isinstance(t, (int, float)):
             return datetime.fromtimestamp(float(t), tz=timezone.utc).isoformat()
         if isinstance(t, str):
@@ -89,37 +89,40 @@ class Strategy(StrategyBase):
             return t.astimezone(timezone.utc).isoformat()
         return str(t)
 
+    def _log_row(self, data: dict, action: str, reason: str = "", qty: float | None = None,
+                 trailing_floor: float | None = None, protected_floor: float | None = None, rsi_val: float | None = None):
+        # tupla nello stesso ordine di _log_fields()
+        return (
+            datetime.now(timezone.utc).isoformat(),
+            self._to_iso(data.get("timestamp")),
+            self.stock,
+            action,
+            reason or "",
+            float(data["price"]) if "price" in data and data["price"] is not None else "",
+            "" if rsi_val is None else float(rsi_val),
+            "" if qty is None else float(qty),
+            int(self.position_qty > 0),
+            "" if self.entry_price is None else float(self.entry_price),
+            "" if self.highest_price is None else float(self.highest_price),
+            int(bool(self.armed)),
+            "" if self.min_profitable_price is None else float(self.min_profitable_price),
+            "" if trailing_floor is None else float(trailing_floor),
+            "" if protected_floor is None else float(protected_floor),
+            self.rsi_buy,
+            self.rsi_exit,
+            self.trailing_pct,
+            self.fee_buy_pct,
+            self.fee_sell_pct,
+            self.slippage_pct,
+            self.edge_min_pct,
+            "" if self.hard_tp_pct is None else self.hard_tp_pct,
+            self.window,
+        )
+
     def _write_log(self, data: dict, action: str, reason: str = "", qty: float | None = None,
                    trailing_floor: float | None = None, protected_floor: float | None = None, rsi_val: float | None = None):
-        row = {
-            "ts_wall": datetime.now(timezone.utc).isoformat(),
-            "bar_ts": self._to_iso(data.get("timestamp")),
-            "stock": self.stock,
-            "action": action,
-            "reason": reason or "",
-            "price": float(data["price"]) if "price" in data and data["price"] is not None else "",
-            "rsi": "" if rsi_val is None else float(rsi_val),
-            "qty": "" if qty is None else float(qty),
-            "in_position": int(self.position_qty > 0),
-            "entry_price": "" if self.entry_price is None else float(self.entry_price),
-            "highest_price": "" if self.highest_price is None else float(self.highest_price),
-            "armed": int(bool(self.armed)),
-            "min_profitable_price": "" if self.min_profitable_price is None else float(self.min_profitable_price),
-            "trailing_floor": "" if trailing_floor is None else float(trailing_floor),
-            "protected_floor": "" if protected_floor is None else float(protected_floor),
-            "rsi_buy": self.rsi_buy,
-            "rsi_exit": self.rsi_exit,
-            "trailing_pct": self.trailing_pct,
-            "fee_buy_pct": self.fee_buy_pct,
-            "fee_sell_pct": self.fee_sell_pct,
-            "slippage_pct": self.slippage_pct,
-            "edge_min_pct": self.edge_min_pct,
-            "hard_tp_pct": "" if self.hard_tp_pct is None else self.hard_tp_pct,
-            "window": self.window,
-        }
-        with open(self.log_path, "a", newline="", encoding="utf-8") as f:
-            w = csv.DictWriter(f, fieldnames=self._log_fields())
-            w.writerow(row)
+        if self._log.trades:
+            self._log.write(self._log_row(data, action, reason, qty, trailing_floor, protected_floor, rsi_val))
 
     # ========== RSI Wilder ==========
     def _update_rsi_wilder(self, price):
@@ -152,6 +155,47 @@ class Strategy(StrategyBase):
         rs = self._avg_gain / self._avg_loss
         return float(100 - (100 / (1 + rs)))
 
+    def _rsi_batch(self, c: np.ndarray) -> np.ndarray:
+        """
+        RSI di un'intera serie di close (NaN dove on_data sarebbe ancora in warm-up),
+        continuando dallo stato corrente e lasciandolo come dopo len(c) chiamate a on_data.
+        Il warm-up (poche barre) passa per _update_rsi_wilder per riprodurne esattamente il seed;
+        poi delta/gain/loss sono vettoriali e resta in Python solo la ricorsione di Wilder,
+        nello stesso ordine di operazioni del percorso per-barra (risultati identici al bit).
+        """
+        n = len(c)
+        rsi = np.full(n, np.nan)
+        prices = c.tolist()
+        i = 0
+        while i < n and (self._avg_gain is None or self._avg_loss is None):
+            self.prices.append(prices[i])
+            r = self._update_rsi_wilder(prices[i])
+            if r is not None:
+                rsi[i] = r
+            i += 1
+        if i >= n:
+            return rsi
+
+        d = np.diff(np.concatenate(([self._last_price], c[i:])))
+        gains = np.maximum(d, 0.0).tolist()
+        losses = np.maximum(-d, 0.0).tolist()
+        k = self.window
+        ag, al = float(self._avg_gain), float(self._avg_loss)
+        avg_g = np.empty(n - i)
+        avg_l = np.empty(n - i)
+        for j, (g, l) in enumerate(zip(gains, losses)):
+            ag = (ag * (k - 1) + g) / k
+            al = (al * (k - 1) + l) / k
+            avg_g[j] = ag
+            avg_l[j] = al
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi[i:] = np.where(avg_l == 0, 100.0, 100 - (100 / (1 + avg_g / avg_l)))
+
+        self._avg_gain, self._avg_loss = ag, al
+        self._last_price = prices[-1]
+        self.prices.extend(prices[max(i, n - self.prices.maxlen):])
+        return rsi
+
     def _required_net_edge(self):
         return self.fee_buy_pct + self.fee_sell_pct + 2.0 * self.slippage_pct + self.edge_min_pct
 
@@ -165,7 +209,8 @@ class Strategy(StrategyBase):
 
         rsi = self._update_rsi_wilder(price)
         if rsi is None:
-            self._write_log(data, action="hold", rsi_val=None)   # log anche in warm-up
+            if self._log.all:
+                self._write_log(data, action="hold", rsi_val=None)   # log anche in warm-up
             return {"action": "hold", "confidence": 0.0}
 
         # ===== ENTRY =====
@@ -233,6 +278,123 @@ class Strategy(StrategyBase):
                     return {"action": "sell", "confidence": 1.0, "quantity": qty, "reason": "hard_tp"}
 
         # default: hold
-        self._write_log(data, action="hold", rsi_val=rsi,
-                        trailing_floor=trailing_floor, protected_floor=protected_floor)
+        if self._log.all:
+            self._write_log(data, action="hold", rsi_val=rsi,
+                            trailing_floor=trailing_floor, protected_floor=protected_floor)
         return {"action": "hold", "confidence": 0.0}
+
+    # ========== Batch (backtest) ==========
+    def on_bars(self, t, o, h, l, c, v, rsi=None):
+        """
+        Stesse decisioni di on_data() chiamato barra per barra sui close, ma:
+          - RSI calcolato su tutta la serie (_rsi_batch)
+          - macchina a stati che salta direttamente da un evento al successivo:
+            l'ingresso è il primo indice con RSI < rsi_buy fuori cooldown, l'uscita il primo
+            close >= min(min_profitable_price, hard TP). Il trailing si arma e vende sulla
+            stessa barra (price >= min_profitable_price), quindi "armed" non sopravvive tra barre.
+        Con log_level "all" (una riga per barra) ricade sul percorso per-barra: in backtest
+        usare "trades" oppure "off".
+        rsi: RSI già calcolato per queste barre (es. rsi_series su una serie più lunga, condiviso
+        fra più istanze); in quel caso lo stato RSI interno non viene aggiornato.
+        """
+        c = np.asarray(c, dtype=np.float64)
+        n = len(c)
+        actions = np.zeros(n, dtype=np.int8)
+        qtys = np.zeros(n, dtype=np.float64)
+        if n == 0:
+            return actions, qtys
+        if self._log.all:
+            return self._on_bars_per_bar(t, c, actions, qtys)
+
+        rsi = self._rsi_batch(c) if rsi is None else np.asarray(rsi, dtype=np.float64)
+        if self.notional_per_trade > 0:
+            with np.errstate(invalid="ignore"):
+                entries = np.flatnonzero((rsi < self.rsi_buy) & (c > 0))
+        else:
+            entries = np.empty(0, dtype=np.int64)
+
+        log = self._log.trades
+        rows = []
+        cd, cd_idx = self.cooldown, -1   # cooldown valido dopo la barra cd_idx
+        i = 0
+        while i < n:
+            if self.position_qty > 0:
+                thr = self.min_profitable_price
+                if self.hard_tp_pct is not None:
+                    thr = min(thr, self.entry_price * (1.0 + self.hard_tp_pct))
+                j = _first_at_least(c, i, thr)
+                if j >= n:
+                    self.highest_price = max(self.highest_price, float(c[i:].max()))
+                    break
+                price = float(c[j])
+                self.highest_price = max(self.highest_price, float(c[i:j + 1].max()))
+                trailing_floor = None
+                if price >= self.min_profitable_price:
+                    reason = "trailing_protected"
+                    trailing_floor = self.highest_price * (1.0 - self.trailing_pct)
+                else:
+                    reason = "hard_tp"
+                qty = self.position_qty
+                self.position_qty = 0.0
+                self.entry_price = None
+                self.highest_price = None
+                self.cooldown = self.cooldown_bars
+                self.armed = False
+                self.min_profitable_price = None
+                actions[j], qtys[j] = ACTION_SELL, qty
+                if log:
+                    rows.append(self._log_row({"price": price, "timestamp": int(t[j])}, action="sell",
+                                              reason=reason, qty=qty, trailing_floor=trailing_floor,
+                                              rsi_val=float(rsi[j])))
+            else:
+                k = int(np.searchsorted(entries, max(i, cd_idx + max(cd, 1))))
+                if k >= len(entries):
+                    break
+                j = int(entries[k])
+                price = float(c[j])
+                qty = max(self.notional_per_trade / price, 0.0)
+                self.position_qty = qty
+                self.entry_price = price
+                self.highest_price = price
+                self.cooldown = self.cooldown_bars
+                self.armed = False
+                self.min_profitable_price = self.entry_price * (1.0 + self._required_net_edge())
+                actions[j], qtys[j] = ACTION_BUY, qty
+                if log:
+                    rows.append(self._log_row({"price": price, "timestamp": int(t[j])}, action="buy",
+                                              qty=qty, rsi_val=float(rsi[j])))
+            cd, cd_idx = self.cooldown_bars, j
+            i = j + 1
+
+        # cooldown residuo come dopo l'ultima chiamata a on_data
+        self.cooldown = max(cd - (n - 1 - cd_idx), 0)
+        self._log.write_many(rows)
+        return actions, qtys
+
+    def _on_bars_per_bar(self, t, c, actions, qtys):
+        codes = {"buy": ACTION_BUY, "sell": ACTION_SELL}
+        for i, (ts, price) in enumerate(zip(np.asarray(t).tolist(), c.tolist())):
+            sig = self.on_data({"symbol": self.stock, "price": price, "timestamp": ts})
+            actions[i] = codes.get(sig["action"], ACTION_HOLD)
+            if actions[i]:
+                qtys[i] = float(sig.get("quantity", 0.0))
+        return actions, qtys
+
+
+def rsi_series(c: np.ndarray, window: int = 14) -> np.ndarray:
+    """RSI di Wilder di un'intera serie di close, identico a on_data da stato iniziale (NaN in warm-up)."""
+    from trading_system.utils.decision_log import LOG_OFF
+    return Strategy("_rsi", 0.0, window=window, log_level=LOG_OFF)._rsi_batch(np.asarray(c, dtype=np.float64))
+
+
+def _first_at_least(c: np.ndarray, start: int, thr: float) -> int:
+    """Primo indice >= start con c >= thr (len(c) se non esiste), cercando a blocchi crescenti."""
+    n = len(c)
+    step = 256
+    while start < n:
+        hit = np.flatnonzero(c[start:start + step] >= thr)
+        if hit.size:
+            return start + int(hit[0])
+        start += step
+        step *= 2
+    return n
@@ -1,11 +1,12 @@
-import time
-from trading_system.utils.market_data_stream import MarketDataStream  # lasciato se vuoi fallback in futuro
+from trading_system.utils.market_data_stream import MarketDataStream  # fallback: polling REST del last price
 from trading_system.utils.bar_aggregator_stream import AggregatingBarStream
+from trading_system.utils.latency import TRACER
 
 class StrategyRunner:
     def __init__(self, stock, strategy_cls, strategy_initial_capital,
                  trader, stock_state, command_queue, state, frequency=2.0,
-                 portfolio_manager=None):           # <-- NUOVO
+                 portfolio_manager=None,           # <-- NUOVO
+                 timeframe_minutes=1, hub=None, use_polling=False):
         self.stock = stock
         self.trader = trader
         self.stock_state = stock_state
@@ -14,42 +15,96 @@ class StrategyRunner:
         self.strategy = strategy_cls(stock, strategy_initial_capital)
         self.running = False
         self.portfolio = portfolio_manager            # <-- NUOVO
-
-        self.data_stream = MarketDataStream(
-            stock=stock,
-            on_data_callback=self.on_data,
-            trading_interface=trader,
-            frequency=frequency
-        )
+        self.timeframe_minutes = int(timeframe_minutes)
+        self.frequency = frequency
+
+        if use_polling:
+            self.data_stream = MarketDataStream(
+                stock=stock,
+                on_data_callback=self.on_data,
+                trading_interface=trader,
+                frequency=frequency
+            )
+        else:
+            # candele aggregate dal feed condiviso del processo (MarketDataHub):
+            # nessun thread né connessione per runner
+            self.data_stream = AggregatingBarStream(
+                symbol=stock,
+                timeframe_minutes=self.timeframe_minutes,
+                on_bar_agg=self._on_bar_agg,
+                hub=hub,
+            )
 
     def run(self):
         stock_name = self.stock.upper().replace("_", "/")
         print(f"[{stock_name}] StrategyRunner starting...")
         self.running = True
-        self.data_stream.start()
+        self._start_stream()
         self.state.update_status(self.stock, "running")
 
+        # attesa bloccante sulla coda: il comando sveglia subito il thread, a riposo nessun polling
         while self.running:
-            if not self.command_queue.empty():
-                cmd = self.command_queue.get()
-                if cmd == "close_position":
-                    print(f"[{stock_name}] Closing strategy runner...")
-                    self.running = False
-                    break
-            time.sleep(0.5)
+            cmd = self.command_queue.get()
+            if cmd == "close_position":
+                print(f"[{stock_name}] Closing strategy runner...")
+                self.running = False
+                break
 
         self.data_stream.stop()
         self.state.update_status(self.stock, "completed")
         print(f"[{self.stock.upper()}] StrategyRunner stopped.")
 
+    def _start_stream(self):
+        """Avvia la sorgente dati; se il feed condiviso non parte (es. credenziali) ripiega sul polling."""
+        try:
+            self.data_stream.start()
+        except Exception as e:
+            if isinstance(self.data_stream, MarketDataStream):
+                raise
+            print(f"[{self.stock.upper()}] ERRORE stream barre: {e} -> fallback su polling del last price")
+            self.data_stream = MarketDataStream(
+                stock=self.stock,
+                on_data_callback=self.on_data,
+                trading_interface=self.trader,
+                frequency=self.frequency
+            )
+            self.data_stream.start()
+
     def on_data(self, data):
         if not self.running:
             return
+        self._execute(self.strategy.on_data(data), data["price"])
 
-        signal = self.strategy.on_data(data)
+    # ===== nuovo handler: candela aggregata chiusa =====
+    def _on_bar_agg(self, bar):
+        """
+        bar = Bar aggregata (symbol "BTC/USD", t = inizio, end = fine finestra, o/h/l/c/v, epoch-ns)
+        """
+        if not self.running:
+            return
+
+        # Se vuoi passare tutta la candela alla strategia, puoi:
+        # signal = self.strategy.on_data(bar)
 
+        # Ma la tua RSI usa 'price' -> creiamo un tick sintetico con la close
+        data = {
+            "symbol": self.stock,
+            "price": bar.c,
+            "timestamp": bar.end  # fine finestra = "consuntivo" (epoch-ns)
+        }
+        rx = bar.rx_ns
+        if rx is not None:
+            TRACER.record(self.stock, "runner", rx)
+        signal = self.strategy.on_data(data)
+        if rx is not None:
+            TRACER.record(self.stock, "strategy", rx)
+        self._execute(signal, data["price"], rx)
+
+    def _execute(self, signal, price, rx_ns=None):
+        if rx_ns is not None:
+            # la pipeline ordini legge l'origine della traccia dal thread che accoda
+            TRACER.set_origin(rx_ns)
         if signal["action"] == "buy":
-            price = data["price"]
             qty = signal["quantity"]
 
             if self.portfolio:
@@ -59,63 +114,24 @@ class StrategyRunner:
                 real_symbol = self.stock.upper().replace("_", "/")
                 self.trader.buy(real_symbol, qty)
                 self.stock_state.update_on_buy(self.stock, qty, price * qty)
+            if rx_ns is not None:
+                TRACER.record(self.stock, "book", rx_ns)
 
             print(f"[{self.stock.upper()}] Executed BUY at ${price:.2f}")
 
         elif signal["action"] == "sell":
-            current = self.stock_state.get_state(self.stock)
-            qty = current.get("quantity", 0)
+            stock_state = self.portfolio.stock_state if self.portfolio else self.stock_state
+            qty = stock_state.get_quantity(self.stock)
             if qty > 0:
-                price = data["price"]
-
                 if self.portfolio:
                     self.portfolio.book_sell(self.stock, qty, price)
                 else:
                     real_symbol = self.stock.upper().replace("_", "/")
                     self.trader.sell(real_symbol, qty)
                     self.stock_state.update_on_sell(self.stock, qty, price * qty)
+                if rx_ns is not None:
+                    TRACER.record(self.stock, "book", rx_ns)
 
                 print(f"[{self.stock.upper()}] Executed SELL at ${price:.2f}")
-    
-    # ===== nuovo handler: candela aggregata chiusa =====
-    def _on_bar_agg(self, bar):
-        """
-        bar = {
-          "symbol": "BTC/USD", "timeframe": "5Min",
-          "start": "...", "end": "...",
-          "open":..., "high":..., "low":..., "close":..., "volume":...
-        }
-        """
-        if not self.running:
-            return
-
-        # Se vuoi passare tutta la candela alla strategia, puoi:
-        # signal = self.strategy.on_data(bar)
-
-        # Ma la tua RSI usa 'price' -> creiamo un tick sintetico con la close
-        data = {
-            "symbol": self.stock,
-            "price": float(bar["close"]),
-            "timestamp": bar["end"]  # fine finestra = "consuntivo"
-        }
-        signal = self.strategy.on_data(data)
-
-        if signal["action"] == "buy":
-            price = data["price"]
-            qty = signal["quantity"]
-            real_symbol = self.stock.upper().replace("_", "/")
-            self.trader.buy(real_symbol, qty)
-            self.stock_state.update_on_buy(self.stock, qty, price * qty)
-            print(f"[{self.stock.upper()}] Executed BUY at ${price:.2f}")
-
-        elif signal["action"] == "sell":
-            current = self.stock_state.get_state(self.stock)
-            qty = current.get("quantity", 0)
-            if qty > 0:
-                price = data["price"]
-                real_symbol = self.stock.upper().replace("_", "/")
-                self.trader.sell(real_symbol, qty)
-                self.stock_state.update_on_sell(self.stock, qty, price * qty)
-                print(f"[{self.stock.upper()}] Executed SELL at ${price:.2f}")
-
-    
\ No newline at end of file
+        if rx_ns is not None:
+            TRACER.set_origin(None)
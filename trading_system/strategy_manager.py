@@ -4,12 +4,14 @@ import threading
 import queue
 import importlib
 from .utils.interface_factory import get_trading_interface
-from .utils.stock_state_manager import StockStateManager
+from .utils.stock_state_manager import StockStateManager, make_state_backend
 from .strategies.strategy_runner import StrategyRunner
+from .utils.market_data_hub import get_market_data_hub
 from trading_system.utils.portfolio_manager import PortfolioManager
 
 class StrategyManager:
-    def __init__(self, state, config_path="config/strategies.yaml"):
+    def __init__(self, state, config_path="config/strategies.yaml", hub=None, runtime=None, trader=None,
+                 stock_state=None):
         self.state = state
         self.config_path = config_path
         cfg = self._load_config(config_path)
@@ -17,8 +19,25 @@ class StrategyManager:
         self.timeframes = cfg.get('timeframes', {})  # <-- nuovo
         self.command_queues = {}
         self.threads = {}
-        self.trader = get_trading_interface()
-        self.stock_state = StockStateManager()
+        self.trader = trader if trader is not None else get_trading_interface()
+        # stato delle posizioni: quello del portafoglio (un solo writer sul journal live);
+        # senza, uno stato in memoria creato solo se un runner lo usa davvero
+        self._stock_state = stock_state
+        # feed di mercato unico per tutti i runner (creato al primo start)
+        self.hub = hub
+        # runtime: "threads" = un thread per stock, "asyncio" = task su un unico event loop
+        self.runtime_mode = (runtime or cfg.get('runtime') or "threads").lower()
+        if self.runtime_mode not in ("threads", "asyncio"):
+            raise ValueError(f"Runtime non valido: {self.runtime_mode} (usa 'threads' o 'asyncio')")
+        self.runtime = None
+        self.runners = {}
+        self.tasks = {}
+
+    @property
+    def stock_state(self):
+        if self._stock_state is None:
+            self._stock_state = StockStateManager(backend=make_state_backend("memory"))
+        return self._stock_state
 
     def _load_config(self, path):
         with open(path, 'r') as f:
@@ -39,34 +58,70 @@ class StrategyManager:
             print(f"[Manager] Failed to load strategy {strategy_module_name} for {stock}: {e}")
             return
 
-        cmd_queue = queue.Queue()
-
-        runner = StrategyRunner(
+        timeframe_minutes = int(self.timeframes.get(stock, 1) or 1)
+        self._ensure_hub(portfolio)
+        kwargs = dict(
             stock=stock,
             strategy_cls=strategy_class,
             strategy_initial_capital=initial_capital,
             trader=self.trader,
-            stock_state=self.stock_state,
-            command_queue=cmd_queue,
+            stock_state=getattr(portfolio, "stock_state", None) or self.stock_state,
             state=self.state,
             frequency=3600,
             portfolio_manager=portfolio,   # <-- NUOVO
+            timeframe_minutes=timeframe_minutes,
+            hub=self.hub,
         )
 
+        if self.runtime_mode == "asyncio":
+            from .strategies.async_runtime import AsyncRuntime, AsyncStrategyRunner
+            if self.runtime is None:
+                self.runtime = AsyncRuntime()
+            runner = AsyncStrategyRunner(command_queue=None, runtime=self.runtime, **kwargs)
+            self.runners[stock] = runner
+            self.tasks[stock] = self.runtime.submit(runner.run_async())
+            print(f"[Manager] Started strategy task for {stock.upper()} (TF={timeframe_minutes}m)")
+            return
+
+        cmd_queue = queue.Queue()
+        runner = StrategyRunner(command_queue=cmd_queue, **kwargs)
+
         thread = threading.Thread(target=runner.run, daemon=True)
         thread.start()
 
+        self.runners[stock] = runner
         self.command_queues[stock] = cmd_queue
         self.threads[stock] = thread
 
         print(f"[Manager] Started strategy thread for {stock.upper()} (TF={timeframe_minutes}m)")
 
+    def _ensure_hub(self, portfolio):
+        if self.hub is None:
+            self.hub = get_market_data_hub()
+        # le barre dello stream tengono aggiornati i last price: snapshot/status senza REST
+        for trader in (self.trader, getattr(portfolio, "trader", None)):
+            quotes = getattr(trader, "quotes", None)
+            if quotes is not None:
+                self.hub.add_tap(quotes.on_bar)
+
+    def send_command(self, stock, cmd):
+        """Invia un comando (es. "close_position") al runner dello stock; il runner si sveglia subito."""
+        stock = stock.lower().replace("/", "_")
+        if stock in self.tasks:
+            self.runners[stock].send_command(cmd)
+        elif stock in self.command_queues:
+            self.command_queues[stock].put(cmd)
+        else:
+            print(f"[Manager] Nessuna strategia attiva per {stock.upper()}")
+
     def show_running_threads(self):
         print("\n Active Strategy Threads:")
 
-        for stock, thread in self.threads.items():
+        running = {s: t.is_alive() for s, t in self.threads.items()}
+        running.update({s: not f.done() for s, f in self.tasks.items()})
+        for stock, alive in running.items():
             strategy_module = self.stock_to_strategy.get(stock, "Unknown")
-            is_alive = "Yes" if thread.is_alive() else "No"
+            is_alive = "Yes" if alive else "No"
             real_stock = stock.upper().replace("_", "/")
 
             print(f"- {real_stock}: Strategy = {strategy_module}, Running = {is_alive}")
@@ -0,0 +1,67 @@
+import sys
+import os
+import time
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from trading_system.state import PortfolioState
+from trading_system.strategy_manager import StrategyManager
+from trading_system.utils.portfolio_manager import PortfolioManager, _NoOpTrader
+from trading_system.utils.market_data_hub import MarketDataHub, FakeBarSource
+from trading_system.utils.bars import NS_PER_MIN, ns_to_iso
+
+T0 = 1_735_689_600 * 10**9  # 2025-01-01
+N_SYMBOLS = 300
+
+
+def _wait(cond, timeout=10.0):
+    end = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < end, "timeout"
+        time.sleep(0.005)
+
+
+def test_asyncio_runtime_many_strategies(tmp_path, monkeypatch):
+    syms = [f"s{i:03d}_usd" for i in range(N_SYMBOLS)]
+    (tmp_path / "strategies.yaml").write_text(
+        "runtime: asyncio\nstrategies:\n" + "".join(f"  {s}: rsi_strategy\n" for s in syms))
+    (tmp_path / "portfolio.yaml").write_text(
+        "initial_budget: 3000\nallocations:\n" + "".join(f"  {s}: {1 / N_SYMBOLS}\n" for s in syms))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("DECISION_LOG", "off")
+
+    src = FakeBarSource()
+    state = PortfolioState()
+    threads_before = threading.active_count()
+    manager = StrategyManager(state, str(tmp_path / "strategies.yaml"), hub=MarketDataHub(lambda: src),
+                              trader=_NoOpTrader())
+    pm = PortfolioManager(str(tmp_path / "portfolio.yaml"), broker_enabled=False, trader=_NoOpTrader())
+    pm.bootstrap()
+    manager.start_all(pm)
+    _wait(lambda: list(state.get_status().values()).count("running") == N_SYMBOLS)
+
+    # un solo thread per il loop, nessun thread per runner
+    assert threading.active_count() - threads_before <= 2
+    assert src.connects == 1 and len(src.symbols) == N_SYMBOLS
+
+    for i in range(3):
+        for s in syms[:10]:
+            src.push({"symbol": s.upper().replace("_", "/"), "timestamp": ns_to_iso(T0 + i * NS_PER_MIN),
+                      "open": 1.0, "high": 1.0, "low": 1.0, "close": 1.0 + i, "volume": 1.0})
+    # la candela 1m si chiude alla barra successiva: 2 candele chiuse per simbolo
+    _wait(lambda: all(manager.runners[s].strategy._last_price == 2.0 for s in syms[:10]))
+    assert manager.runners[syms[10]].strategy._last_price is None
+
+    t0 = time.monotonic()
+    manager.send_command(syms[0], "close_position")
+    manager.tasks[syms[0]].result(timeout=1.0)
+    assert time.monotonic() - t0 < 0.2
+    assert state.get_status()[syms[0]] == "completed"
+
+    for s in syms[1:]:
+        manager.send_command(s, "close_position")
+    for s in syms[1:]:
+        manager.tasks[s].result(timeout=5.0)
+    assert src.symbols == set()
+    manager.runtime.stop()
@@ -0,0 +1,80 @@
+import sys
+import os
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import numpy as np
+import pytest
+
+from trading_system.utils.bars import Bar, BarArrays, BAR_DTYPE, NS_PER_MIN, ns_to_iso
+from trading_system.utils.alpaca_bars_adapter import bar_payload
+from trading_system.utils.bar_aggregator_stream import AggregatingBarStream
+from trading_system.utils.market_data_hub import MarketDataHub, FakeBarSource
+from trading_system.strategies.rsi_strategy import Strategy as RsiStrategy
+
+T0 = 1_735_689_600 * 10**9  # 2025-01-01
+
+
+def test_adapter_bar_is_epoch_ns_and_reads_like_the_old_payload():
+    raw = SimpleNamespace(symbol="BTC/USD", timestamp=datetime(2025, 1, 1, tzinfo=timezone.utc),
+                          open=1.0, high=2.0, low=0.5, close=1.5, volume=3.0)
+    bar = bar_payload(raw)
+    assert isinstance(bar, Bar) and bar.t == T0 and bar.end == T0 + NS_PER_MIN
+    assert bar["close"] == 1.5 and bar["timestamp"] == ns_to_iso(T0) and bar["timeframe"] == "1Min"
+    assert "rx_ns" not in bar and bar.get("missing", 7) == 7
+    with pytest.raises(KeyError):
+        bar["missing"]
+    again = Bar.from_dict(bar.to_dict())
+    assert (again.symbol, again.t, again.o, again.h, again.l, again.c, again.v) == \
+           ("BTC/USD", T0, 1.0, 2.0, 0.5, 1.5, 3.0)
+
+
+def test_aggregator_emits_bar_records_from_bars_and_dicts():
+    src = FakeBarSource()
+    hub = MarketDataHub(lambda: src)
+    out = []
+    AggregatingBarStream("btc_usd", 5, out.append, hub=hub).start()
+    for i in range(11):
+        t = T0 + i * NS_PER_MIN
+        if i % 2:
+            src.push(Bar("BTC/USD", t, 100.0 + i, 101.0 + i, 99.0 + i, 100.5 + i, 1.0))
+        else:
+            src.push({"symbol": "BTC/USD", "timestamp": ns_to_iso(t), "open": 100.0 + i,
+                      "high": 101.0 + i, "low": 99.0 + i, "close": 100.5 + i, "volume": 1.0})
+    assert [type(b) for b in out] == [Bar, Bar]
+    first = out[0]
+    assert (first.t, first.end, first.o, first.h, first.l, first.c, first.v) == \
+           (T0, T0 + 5 * NS_PER_MIN, 100.0, 105.0, 99.0, 104.5, 5.0)
+    assert first["start"] == ns_to_iso(T0) and first["timeframe"] == "5Min"
+
+
+def test_structured_records_round_trip_and_size():
+    n = 1000
+    bars = BarArrays(T0 + np.arange(n, dtype=np.int64) * NS_PER_MIN,
+                     *(np.random.default_rng(k).random(n) for k in range(5)))
+    rec = bars.to_records()
+    assert rec.dtype == BAR_DTYPE and rec.nbytes == 48 * n
+    back = BarArrays.from_records(rec)
+    assert all(np.array_equal(getattr(back, k), getattr(bars, k)) for k in BarArrays.COLUMNS)
+    assert np.shares_memory(back.c, rec)
+
+
+def test_strategy_log_timestamp_accepts_epoch_ns():
+    s = RsiStrategy("btc_usd", 1000.0)
+    assert s._to_iso(T0) == ns_to_iso(T0) == s._to_iso(np.int64(T0))
+    assert s._to_iso(1_735_689_600) == "2025-01-01T00:00:00+00:00"
+
+
+def test_chart_buffer_keeps_a_sliding_window_of_records():
+    pytest.importorskip("matplotlib")
+    from datetime import timedelta
+    from trading_system.utils.market_data_stream_bars import _BarBuffer
+    buf = _BarBuffer(window=timedelta(minutes=30))
+    for i in range(500):
+        buf.add_bar(T0 + i * NS_PER_MIN, 1.0, 2.0, 0.5, float(i), 1.0)
+    rec = buf.records()
+    assert len(buf) == 31 and rec["t"][0] == T0 + 469 * NS_PER_MIN and rec["c"][-1] == 499.0
+    ts, o, h, l, c, v = buf.snapshot()
+    assert ts[-1] == datetime(2025, 1, 1, 8, 19, tzinfo=timezone.utc) and c[-1] == 499.0
@@ -0,0 +1,106 @@
+import sys
+import os
+import warnings
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import numpy as np
+
+from trading_system.utils.bars import BarArrays, NS_PER_MIN, to_ns, iso_array_to_ns
+from trading_system.utils.bar_store import BarStore
+from trading_system.utils.bar_csv import write_csv_bars
+from trading_system.backtest.portfolio_backtest import fetch_local_bars
+
+
+def _bars(start_iso: str, n: int) -> BarArrays:
+    t = to_ns(start_iso) + np.arange(n, dtype=np.int64) * NS_PER_MIN
+    c = 100.0 + np.arange(n, dtype=np.float64)
+    return BarArrays(t, c, c + 1, c - 1, c, np.ones(n))
+
+
+def test_store_roundtrip_is_memory_mapped(tmp_path):
+    store = BarStore(str(tmp_path))
+    bars = _bars("2025-01-01T00:00:00Z", 100)
+    store.write("BTC/USD", 1, bars)
+
+    loaded = store.load("btc_usd", 1)
+    assert not loaded.c.flags.writeable and not loaded.c.flags.owndata
+    assert np.array_equal(loaded.t, bars.t)
+    assert np.array_equal(loaded.c, bars.c)
+
+
+def test_store_append_and_merge_dedup(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.write("BTC/USD", 1, _bars("2025-01-01T00:00:00Z", 10))
+    store.append("BTC/USD", 1, _bars("2025-01-01T00:10:00Z", 5))    # coda: append puro
+    store.append("BTC/USD", 1, _bars("2025-01-01T00:05:00Z", 3))    # sovrapposto: merge
+    loaded = store.load("BTC/USD", 1)
+    assert len(loaded) == 15
+    assert np.all(np.diff(loaded.t) == NS_PER_MIN)
+
+
+def test_fetch_local_bars_imports_csv_into_store(tmp_path):
+    data_dir = tmp_path / "data"
+    write_csv_bars(str(data_dir / "1m" / "BTC-USD.csv"), _bars("2025-01-01T00:00:00Z", 60))
+    store_root = str(tmp_path / "store")
+
+    res = fetch_local_bars(["BTC/USD"], "2025-01-01T00:00:00Z", "2025-01-01T00:59:00Z", 5,
+                           data_dirs=[str(data_dir)], allow_download=False, store_root=store_root)
+    bars = res["BTC/USD"]
+    assert BarStore(store_root).rows("BTC/USD", 1) == 60
+    # 12 candele 5m etichettate a fine finestra: l'ultima (00:55-01:00) cade oltre end
+    assert len(bars) == 11
+    assert bars.o[0] == 100.0 and bars.c[0] == 104.0 and bars.v[0] == 5.0
+
+
+def test_bulk_csv_matches_row_by_row(tmp_path):
+    from trading_system.utils.bar_csv import read_csv_bars
+    p = tmp_path / "ETH-USD.csv"
+    p.write_text(
+        "timestamp,Open,High,Low,Close,Volume\n"
+        "2025-01-01T00:02:00Z,3,4,2,3.5,10\n"
+        "2025-01-01T00:00:00Z,1,2,0.5,1.5,\n"
+        "2025-01-01T00:01:00Z,2,3,1,,5\n"
+        "2025-01-01T00:03:00Z,4,5,3,4.5,7\n",
+        encoding="utf-8",
+    )
+    bulk = read_csv_bars(str(p))
+    legacy = read_csv_bars(str(p), bulk=False)
+    for col in BarArrays.COLUMNS:
+        assert np.array_equal(getattr(bulk, col), getattr(legacy, col)), col
+    assert len(bulk) == 3
+
+
+def test_bulk_csv_with_mixed_utc_suffixes(tmp_path):
+    from trading_system.utils.bar_csv import read_csv_bars
+    stamps = ["2025-01-01T00:00:00Z", "2025-01-01T00:01:00+00:00", "2025-01-01T00:02:00Z"]
+    p = tmp_path / "BTC-USD.csv"
+    p.write_text("timestamp,Open,High,Low,Close,Volume\n"
+                 + "".join(f"{ts},1,2,0.5,1.5,1\n" for ts in stamps), encoding="utf-8")
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")     # niente parsing di stringhe con offset da parte di numpy
+        bulk = read_csv_bars(str(p))
+        assert iso_array_to_ns(stamps + ["2025-01-01T01:03:00+01:00"]).tolist() == \
+               [to_ns(ts) for ts in stamps] + [to_ns("2025-01-01T00:03:00Z")]
+    assert bulk.t.tolist() == [to_ns(ts) for ts in stamps]
+
+
+def test_range_load_reads_only_requested_slice(tmp_path):
+    from trading_system.utils.resample import resample
+    store = BarStore(str(tmp_path))
+    full = _bars("2025-01-01T00:00:00Z", 10_000)
+    store.write("BTC/USD", 1, full)
+    s, e = to_ns("2025-01-02T00:00:00Z"), to_ns("2025-01-03T00:00:00Z")
+
+    part = store.load("BTC/USD", 1, s, e)
+    exp = full[(full.t >= s) & (full.t <= e)]
+    assert np.array_equal(part.t, exp.t) and np.array_equal(part.c, exp.c)
+    assert len(store.load("BTC/USD", 1, e + 10**18, None)) == 0
+
+    view = part.between(s + 60 * NS_PER_MIN, s + 120 * NS_PER_MIN)
+    assert len(view) == 61 and np.shares_memory(view.c, part.c)
+
+    # range caricato con margine di un tf: stesso risultato dell'aggregazione su tutto lo storico
+    got = resample(store.load("BTC/USD", 1, s - 15 * NS_PER_MIN, e), 15, label="right").between(s, e)
+    ref = resample(full, 15, label="right").between(s, e)
+    assert np.array_equal(got.t, ref.t) and np.array_equal(got.o, ref.o) and np.array_equal(got.v, ref.v)
@@ -0,0 +1,83 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from trading_system.utils.bars import NS_PER_MIN, to_ns, ns_to_iso
+from trading_system.utils.bar_store import BarStore
+from trading_system.utils.bar_sync import missing_intervals, sync_bars, get_coverage
+
+
+class FakeFetcher:
+    """Finta API: una barra per minuto nel range chiesto, registra le chiamate."""
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, symbols, start_iso, end_iso, timeframe_minutes, **kw):
+        self.calls.append((start_iso, end_iso))
+        s, e = to_ns(start_iso), to_ns(end_iso)
+        tf = timeframe_minutes * NS_PER_MIN
+        t = s + (-s) % tf
+        out = []
+        while t <= e:
+            out.append({"t": ns_to_iso(t).replace("+00:00", "Z"), "o": 1, "h": 1, "l": 1, "c": 1, "v": 1})
+            t += tf
+        return {symbols[0]: out}
+
+
+def test_missing_intervals():
+    m = NS_PER_MIN
+    cov = [(10 * m, 20 * m), (30 * m, 40 * m)]
+    assert missing_intervals(cov, 0, 50 * m) == [(0, 10 * m - 1), (20 * m + 1, 30 * m - 1), (40 * m + 1, 50 * m)]
+    assert missing_intervals(cov, 12 * m, 18 * m) == []
+    # buco più piccolo di una barra 5m: niente da scaricare
+    assert missing_intervals([(0, 5 * m - 1), (5 * m + 30, 20 * m)], 0, 20 * m, 5) == [(5 * m, 5 * m + 29)]
+    assert missing_intervals([(0, 5 * m), (5 * m + 30, 20 * m)], 0, 20 * m, 5) == []
+
+
+def test_sync_fetches_only_missing_intervals(tmp_path):
+    store = BarStore(str(tmp_path))
+    api = FakeFetcher()
+
+    got = sync_bars(["BTC/USD"], "2025-01-01T01:00:00Z", "2025-01-01T02:00:00Z", 1, store=store, fetcher=api)
+    assert got["BTC/USD"] == 61 and len(api.calls) == 1
+
+    # range più ampio: solo testa e coda
+    api.calls.clear()
+    got = sync_bars(["BTC/USD"], "2025-01-01T00:00:00Z", "2025-01-01T03:00:00Z", 1, store=store, fetcher=api)
+    assert len(api.calls) == 2 and got["BTC/USD"] == 120
+    assert store.rows("BTC/USD", 1) == 181
+    assert get_coverage(store, "BTC/USD", 1) == [(to_ns("2025-01-01T00:00:00Z"), to_ns("2025-01-01T03:00:00Z"))]
+
+    # tutto già coperto: nessuna chiamata
+    api.calls.clear()
+    sync_bars(["BTC/USD"], "2025-01-01T00:30:00Z", "2025-01-01T02:30:00Z", 1, store=store, fetcher=api)
+    assert api.calls == []
+
+
+def test_changed_csv_is_merged_and_keeps_synced_bars(tmp_path):
+    import numpy as np
+    from trading_system.utils.bars import BarArrays
+    from trading_system.utils.bar_csv import write_csv_bars
+    store = BarStore(str(tmp_path / "store"))
+    csv_path = str(tmp_path / "BTC-USD.csv")
+    t0 = to_ns("2025-01-01T00:00:00Z")
+
+    def csv(n, close):
+        t = t0 + np.arange(n, dtype=np.int64) * NS_PER_MIN
+        write_csv_bars(csv_path, BarArrays(t, *([np.full(n, close)] * 4), np.ones(n)))
+
+    csv(30, 5.0)
+    store.import_csv(csv_path, "BTC/USD", 1)
+    api = FakeFetcher()
+    sync_bars(["BTC/USD"], "2025-01-01T00:00:00Z", "2025-01-01T02:00:00Z", 1, store=store, fetcher=api)
+    assert store.rows("BTC/USD", 1) == 121
+
+    csv(40, 7.0)                                   # il CSV cambia: merge, non sostituzione
+    os.utime(csv_path, ns=(0, 1))
+    bars = store.import_csv(csv_path, "BTC/USD", 1)
+    assert len(bars) == 121 and bars.c[39] == 7.0 and bars.c[40] == 1.0
+    api.calls.clear()
+    sync_bars(["BTC/USD"], "2025-01-01T00:00:00Z", "2025-01-01T02:00:00Z", 1, store=store, fetcher=api)
+    assert api.calls == []
+    assert get_coverage(store, "BTC/USD", 1) == [(t0, to_ns("2025-01-01T02:00:00Z"))]
@@ -0,0 +1,33 @@
+import sys
+import os
+import json
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from trading_system.benchmarks.bench_suite import STAGES, run_suite, compare, main
+
+
+def test_suite_runs_all_stages_offline(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    res = run_suite(rows=3000, ticks=500, state_ops=20, repeat=1)
+    assert list(res["stages"]) == list(STAGES)
+    for name, st in res["stages"].items():
+        assert st["items"] > 0 and st["per_sec"] > 0, name
+    assert res["meta"]["rows"] == 3000
+
+
+def test_compare_flags_regressions(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    base = {"stages": {"csv_load": {"per_sec": 100.0}, "resample": {"per_sec": 100.0}}}
+    cur = {"stages": {"csv_load": {"per_sec": 90.0}, "resample": {"per_sec": 50.0},
+                      "rsi_on_data": {"per_sec": 1.0}}}
+    rows = {r["stage"]: r for r in compare(cur, base, tolerance=0.15)}
+    assert set(rows) == {"csv_load", "resample"}
+    assert not rows["csv_load"]["regression"] and rows["resample"]["regression"]
+
+    # baseline irraggiungibile: exit code 1
+    (tmp_path / "base.json").write_text(json.dumps({"stages": {"resample": {"per_sec": 1e15}}}))
+    out = tmp_path / "cur.json"
+    code = main(["--rows", "2000", "--repeat", "1", "--only", "resample", "--out", str(out),
+                 "--compare", str(tmp_path / "base.json")])
+    assert code == 1 and json.loads(out.read_text())["stages"]["resample"]["items"] == 2000
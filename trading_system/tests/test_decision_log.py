@@ -0,0 +1,57 @@
+import sys
+import os
+import csv
+import threading
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from trading_system.utils.decision_log import DecisionLogger, resolve_level, LOG_OFF, LOG_TRADES, LOG_ALL
+
+FIELDS = ("i", "thread", "action")
+
+
+def _read(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def test_levels(tmp_path):
+    logger = DecisionLogger(flush_interval=60)
+    off = logger.open(str(tmp_path / "off.csv"), FIELDS, LOG_OFF)
+    trades = logger.open(str(tmp_path / "t.csv"), FIELDS, LOG_TRADES)
+    every = logger.open(str(tmp_path / "a.csv"), FIELDS, LOG_ALL)
+    assert (off.trades, off.all) == (False, False)
+    assert (trades.trades, trades.all) == (True, False)
+    assert (every.trades, every.all) == (True, True)
+    off.write((1, "x", "buy"))
+    logger.close()
+    assert not os.path.exists(tmp_path / "off.csv")
+    assert _read(tmp_path / "t.csv") == [list(FIELDS)]
+    with pytest.raises(ValueError):
+        resolve_level("verbose")
+
+
+def test_background_flush_keeps_order_and_flushes_on_close(tmp_path):
+    logger = DecisionLogger(flush_interval=0.01, max_pending=100)
+    path = str(tmp_path / "log.csv")
+    logs = [logger.open(path, FIELDS, LOG_ALL) for _ in range(4)]
+
+    def work(k):
+        for i in range(2000):
+            logs[k].write((i, k, "hold"))
+
+    threads = [threading.Thread(target=work, args=(k,)) for k in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    logger.close()
+
+    rows = _read(path)
+    assert rows[0] == list(FIELDS)
+    assert len(rows) == 1 + 4 * 2000
+    for k in range(4):
+        seq = [int(r[0]) for r in rows[1:] if r[1] == str(k)]
+        assert seq == list(range(2000))
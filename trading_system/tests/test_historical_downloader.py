@@ -0,0 +1,124 @@
+import sys
+import os
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from trading_system.utils.bars import NS_PER_MIN, to_ns, ns_to_iso
+from trading_system.utils.historical_downloader import fetch_crypto_bars, TokenBucket, BarDownloader
+from trading_system.utils.bar_store import BarStore
+from trading_system.utils.bar_sync import sync_symbol, get_coverage, PENDING_DIR
+
+PAGE = 50
+
+
+class _StubAlpaca(BaseHTTPRequestHandler):
+    """Stub locale di /v1beta3/crypto/us/bars: paginazione, un 429 e un 503 iniziali per simbolo."""
+    failures = {}
+    lock = threading.Lock()
+    flaky = True
+    broken_token = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code, body=None, headers=None):
+        self.send_response(code)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        data = json.dumps(body or {}).encode()
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        q = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        sym = q["symbols"]
+        key = (sym, q["start"], q.get("page_token"))
+        with self.lock:
+            n = self.failures.get(key, 0)
+            self.failures[key] = n + 1
+        if self.broken_token is not None and q.get("page_token") == self.broken_token:
+            return self._send(500)
+        if self.flaky and q.get("page_token") == "1" and n == 0:
+            return self._send(429, headers={"Retry-After": "0"})
+        if self.flaky and q.get("page_token") == "2" and n == 0:
+            return self._send(503)
+        s, e = to_ns(q["start"]), to_ns(q["end"])
+        ts = list(range(s + (-s) % NS_PER_MIN, e + 1, NS_PER_MIN))
+        page = int(q.get("page_token") or 0)
+        chunk = ts[page * PAGE:(page + 1) * PAGE]
+        bars = [{"t": ns_to_iso(t).replace("+00:00", "Z"), "o": 1.0, "h": 2.0, "l": 0.5, "c": 1.5, "v": 3.0}
+                for t in chunk]
+        nxt = str(page + 1) if (page + 1) * PAGE < len(ts) else None
+        self._send(200, {"bars": {sym: bars}, "next_page_token": nxt})
+
+
+def test_parallel_sharded_download_with_retries():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _StubAlpaca)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    try:
+        res = fetch_crypto_bars(
+            ["BTC/USD", "eth_usd"], "2025-01-01T00:00:00Z", "2025-01-01T23:59:00Z", 1,
+            api_key="k", api_secret="s",
+            base_url=f"http://127.0.0.1:{srv.server_address[1]}/v1beta3/crypto/us/bars",
+            max_workers=4, shard_days=0.25, rate_per_minute=60_000, backoff_base=0.001,
+        )
+    finally:
+        srv.shutdown()
+    for sym in ("BTC/USD", "ETH/USD"):
+        ts = [to_ns(b["t"]) for b in res[sym]]
+        assert len(ts) == 1440
+        assert ts == sorted(set(ts))
+
+
+class _BrokenStub(_StubAlpaca):
+    failures = {}
+    flaky = False
+    broken_token = "3"
+
+
+def test_streaming_download_resumes_after_crash(tmp_path):
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _BrokenStub)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    store = BarStore(str(tmp_path / "store"))
+    start, end = to_ns("2025-01-01T00:00:00Z"), to_ns("2025-01-01T23:59:00Z")
+    now = to_ns("2025-02-01T00:00:00Z")
+
+    def dl():
+        return BarDownloader(api_key="k", api_secret="s",
+                             base_url=f"http://127.0.0.1:{srv.server_address[1]}/v1beta3/crypto/us/bars",
+                             max_workers=4, shard_days=0.25, rate_per_minute=60_000, max_retries=0)
+    try:
+        # la pagina 3 di ogni shard fallisce: le prime 3 pagine restano su disco nei segmenti
+        try:
+            sync_symbol("BTC/USD", start, end, 1, store=store, downloader=dl(), now_ns=now)
+            raise AssertionError("il download doveva fallire")
+        except Exception as e:
+            assert "500" in str(e)
+        assert os.listdir(os.path.join(store.root, PENDING_DIR))
+
+        _BrokenStub.broken_token = None
+        got = sync_symbol("BTC/USD", start, end, 1, store=store, downloader=dl(), now_ns=now)
+    finally:
+        srv.shutdown()
+    # riprende: delle 1440 barre si riscaricano solo quelle non ancora persistite
+    assert got == 1440 - 4 * 3 * PAGE
+    bars = store.load("BTC/USD", 1)
+    assert len(bars) == 1440
+    assert bars.t.tolist() == list(range(start, end + 1, NS_PER_MIN))
+    assert get_coverage(store, "BTC/USD", 1)[0][0] <= start
+    assert not os.listdir(os.path.join(store.root, PENDING_DIR))
+
+
+def test_token_bucket_limits_rate():
+    import time
+    bucket = TokenBucket(rate=200.0, capacity=1)
+    t0 = time.monotonic()
+    for _ in range(21):
+        bucket.acquire()
+    assert time.monotonic() - t0 >= 0.09
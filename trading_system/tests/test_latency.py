@@ -0,0 +1,112 @@
+import sys
+import os
+import time
+import queue
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from trading_system.state import PortfolioState
+from trading_system.strategies.strategy_runner import StrategyRunner
+from trading_system.utils.latency import Histogram, LatencyTracer, TRACER, STAGES
+from trading_system.utils.market_data_hub import MarketDataHub, FakeBarSource
+from trading_system.utils.order_pipeline import OrderPipeline
+from trading_system.utils.portfolio_manager import PortfolioManager
+from trading_system.utils.stock_state_manager import StockStateManager, MemoryStateBackend
+from trading_system.utils.bars import NS_PER_MIN, ns_to_iso
+
+T0 = 1_735_689_600 * 10**9  # 2025-01-01
+
+
+def test_histogram_quantiles_and_per_thread_merge():
+    h = Histogram()
+    for ns in range(1, 10_001):
+        h.record(ns)
+    assert h.n == 10_000 and h.max == 10_000
+    assert 5_000 <= h.quantile(0.5) <= 5_000 * 1.125
+    assert 9_900 <= h.quantile(0.99) <= 10_000
+
+    tr = LatencyTracer(enabled=True)
+
+    def work():
+        for _ in range(1000):
+            tr.record("btc_usd", "strategy", time.perf_counter_ns())
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    snap = tr.snapshot()
+    assert snap["BTC/USD"]["strategy"].n == 4000
+    tr.reset()
+    assert tr.snapshot() == {}
+
+
+class _AlwaysBuy:
+    def __init__(self, stock, capital):
+        pass
+
+    def on_data(self, data):
+        return {"action": "buy", "quantity": 1.0}
+
+
+class _Broker:
+    def submit_order(self, symbol, side, qty, client_order_id):
+        time.sleep(0.002)
+        return {"id": client_order_id, "status": "filled", "filled_qty": qty, "filled_avg_price": 1.0}
+
+    def get_order(self, oid):
+        raise AssertionError("ordini già eseguiti all'invio")
+
+
+def _run_bars(tmp_path, n):
+    cfg = tmp_path / "portfolio.yaml"
+    cfg.write_text("initial_budget: 1000\nallocations:\n  btc_usd: 1.0\n")
+    broker = _Broker()
+    pm = PortfolioManager(str(cfg), broker_enabled=True, trader=broker, order_pipeline=OrderPipeline(broker),
+                          stock_state=StockStateManager(backend=MemoryStateBackend()))
+    pm.bootstrap()
+    src = FakeBarSource()
+    cmd = queue.Queue()
+    state = PortfolioState()
+    runner = StrategyRunner("btc_usd", _AlwaysBuy, 1000.0, broker, None, cmd, state,
+                            portfolio_manager=pm, hub=MarketDataHub(lambda: src))
+    th = threading.Thread(target=runner.run, daemon=True)
+    th.start()
+    while state.get_status().get("btc_usd") != "running":
+        time.sleep(0.005)
+    bars = []
+    for i in range(n):
+        bar = {"symbol": "BTC/USD", "timestamp": ns_to_iso(T0 + i * NS_PER_MIN),
+               "open": 1.0, "high": 1.0, "low": 1.0, "close": 1.0, "volume": 1.0}
+        bars.append(bar)
+        src.push(bar)
+    cmd.put("close_position")
+    th.join(timeout=5.0)
+    pm.close()
+    return bars
+
+
+def test_stage_breakdown_through_the_live_path(tmp_path):
+    TRACER.reset()
+    TRACER.enable()
+    try:
+        _run_bars(tmp_path, 6)
+    finally:
+        TRACER.disable()
+    snap = TRACER.snapshot()["BTC/USD"]
+    # 6 barre 1m -> 5 candele chiuse -> 5 ordini
+    assert snap["aggregate"].n == 6
+    assert all(snap[s].n == 5 for s in ("runner", "strategy", "book", "submit"))
+    assert snap["submit"].quantile(0.5) >= 2_000_000 > snap["book"].quantile(0.5)
+    report = TRACER.report("btc_usd")
+    assert all(s in report for s in STAGES[1:])
+    TRACER.reset()
+
+
+def test_disabled_tracer_leaves_bars_untouched(tmp_path):
+    TRACER.reset()
+    bars = _run_bars(tmp_path, 3)
+    assert TRACER.snapshot() == {}
+    assert all("rx_ns" not in b for b in bars)
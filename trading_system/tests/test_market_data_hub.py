@@ -0,0 +1,155 @@
+import sys
+import os
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from trading_system.utils.market_data_hub import MarketDataHub, FakeBarSource
+from trading_system.utils.bar_aggregator_stream import AggregatingBarStream
+from trading_system.utils.bars import NS_PER_MIN, ns_to_iso
+
+T0 = 1_735_689_600 * 10**9  # 2025-01-01
+
+
+def _bar(sym, i, close):
+    return {"symbol": sym, "timestamp": ns_to_iso(T0 + i * NS_PER_MIN), "open": close, "high": close,
+            "low": close, "close": close, "volume": 1.0, "timeframe": "1Min"}
+
+
+def test_single_connection_fan_out_and_runtime_join_leave():
+    src = FakeBarSource()
+    hub = MarketDataHub(lambda: src)
+    got = {"a": [], "b": [], "c": []}
+    ha = hub.subscribe("btc_usd", got["a"].append)
+    hb = hub.subscribe("BTC/USD", got["b"].append)
+    hc = hub.subscribe("eth-usd", got["c"].append)
+    assert src.connects == 1 and src.symbols == {"BTC/USD", "ETH/USD"}
+
+    src.push(_bar("BTC/USD", 0, 1.0))
+    src.push(_bar("ETH/USD", 0, 2.0))
+    src.push(_bar("SOL/USD", 0, 3.0))  # non sottoscritto
+    assert [b["close"] for b in got["a"]] == [1.0] and got["b"] == got["a"]
+    assert [b["close"] for b in got["c"]] == [2.0]
+
+    hub.unsubscribe(ha)
+    src.push(_bar("BTC/USD", 1, 4.0))
+    assert len(got["a"]) == 1 and len(got["b"]) == 2
+    hub.unsubscribe(hb)
+    assert src.symbols == {"ETH/USD"}
+    hub.subscribe("sol_usd", got["a"].append)
+    src.push(_bar("SOL/USD", 1, 5.0))
+    assert got["a"][-1]["close"] == 5.0
+    assert src.connects == 1
+    hub.unsubscribe(hc)
+
+
+def test_subscriber_error_does_not_stop_others():
+    src = FakeBarSource()
+    hub = MarketDataHub(lambda: src)
+    seen = []
+    hub.subscribe("BTC/USD", lambda bar: 1 / 0)
+    hub.subscribe("BTC/USD", seen.append)
+    src.push(_bar("BTC/USD", 0, 1.0))
+    assert len(seen) == 1
+
+
+def test_aggregating_stream_on_hub():
+    src = FakeBarSource()
+    hub = MarketDataHub(lambda: src)
+    out = {"btc_usd": [], "eth_usd": []}
+    streams = [AggregatingBarStream(s, 5, out[s].append, hub=hub) for s in out]
+    for st in streams:
+        st.start()
+    for i in range(12):
+        src.push(_bar("BTC/USD", i, 100.0 + i))
+        src.push(_bar("ETH/USD", i, 10.0 + i))
+    assert src.connects == 1
+    assert [b["close"] for b in out["btc_usd"]] == [104.0, 109.0]
+    assert [b["close"] for b in out["eth_usd"]] == [14.0, 19.0]
+    assert out["btc_usd"][0]["end"] == ns_to_iso(T0 + 5 * NS_PER_MIN)
+    for st in streams:
+        st.stop()
+    assert src.symbols == set()
+
+
+def test_failed_source_start_does_not_leave_orphan_subscribers():
+    src = FakeBarSource()
+    attempts = []
+
+    def factory():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("credenziali mancanti")
+        return src
+
+    hub = MarketDataHub(factory)
+    got = []
+    with pytest.raises(RuntimeError):
+        hub.subscribe("BTC/USD", got.append)
+    assert hub.symbols() == [] and hub.source is None
+
+    hub.subscribe("BTC/USD", got.append)
+    hub.subscribe("ETH/USD", got.append)
+    assert src.symbols == {"BTC/USD", "ETH/USD"} and src.connects == 1
+    src.push(_bar("BTC/USD", 0, 1.0))
+    assert [b["close"] for b in got] == [1.0]
+
+
+def test_stream_credentials_follow_the_live_stack_env(monkeypatch):
+    from trading_system.utils.alpaca_bars_adapter import stream_credentials
+    for k in ("ENVIRONMENT", "PAPER_API_KEY_ID", "PAPER_API_SECRET_KEY", "LIVE_API_KEY_ID",
+              "LIVE_API_SECRET_KEY", "APCA_API_KEY_ID", "APCA_API_SECRET_KEY"):
+        monkeypatch.delenv(k, raising=False)
+    with pytest.raises(RuntimeError):
+        stream_credentials()
+    monkeypatch.setenv("APCA_API_KEY_ID", "a")
+    monkeypatch.setenv("APCA_API_SECRET_KEY", "as")
+    assert stream_credentials() == ("a", "as")
+    monkeypatch.setenv("PAPER_API_KEY_ID", "p")
+    monkeypatch.setenv("PAPER_API_SECRET_KEY", "ps")
+    assert stream_credentials() == ("p", "ps")
+    monkeypatch.setenv("ENVIRONMENT", "live")
+    monkeypatch.setenv("LIVE_API_KEY_ID", "l")
+    monkeypatch.setenv("LIVE_API_SECRET_KEY", "ls")
+    assert stream_credentials() == ("l", "ls")
+
+
+def test_runner_falls_back_to_polling_when_the_feed_cannot_start():
+    import queue
+    import threading
+    import time
+    from trading_system.state import PortfolioState
+    from trading_system.strategies.strategy_runner import StrategyRunner
+    from trading_system.utils.market_data_stream import MarketDataStream
+
+    def broken():
+        raise RuntimeError("API key/secret Alpaca mancanti")
+
+    ticks = []
+
+    class Hold:
+        def __init__(self, stock, capital):
+            pass
+
+        def on_data(self, data):
+            ticks.append(data["price"])
+            return {"action": "hold"}
+
+    class Trader:
+        def get_last_price(self, symbol):
+            return 42.0
+
+    cmd, state = queue.Queue(), PortfolioState()
+    runner = StrategyRunner("btc_usd", Hold, 100.0, Trader(), None, cmd, state, frequency=0.01,
+                            hub=MarketDataHub(broken))
+    th = threading.Thread(target=runner.run, daemon=True)
+    th.start()
+    deadline = time.monotonic() + 2.0
+    while not ticks and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert state.get_status().get("btc_usd") == "running"
+    assert isinstance(runner.data_stream, MarketDataStream) and ticks[0] == 42.0
+    cmd.put("close_position")
+    th.join(timeout=2.0)
+    assert not th.is_alive()
@@ -0,0 +1,138 @@
+import sys
+import os
+import time
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from trading_system.utils.order_pipeline import OrderPipeline, FILLED, FAILED
+from trading_system.utils.portfolio_manager import PortfolioManager
+from trading_system.utils.stock_state_manager import StockStateManager, MemoryStateBackend
+
+
+class _SlowBroker:
+    """Broker finto: invio lento, poi l'ordine si esegue in due fill parziali."""
+    def __init__(self, delay=0.2, fill_price=10.0):
+        self.delay = delay
+        self.fill_price = fill_price
+        self.orders = {}
+        self.polls = {}
+        self.lock = threading.Lock()
+
+    def submit_order(self, symbol, side, qty, client_order_id):
+        time.sleep(self.delay)
+        with self.lock:
+            oid = f"b-{len(self.orders)}"
+            self.orders[oid] = qty
+            self.polls[oid] = 0
+        return {"id": oid, "status": "accepted", "filled_qty": 0, "filled_avg_price": None}
+
+    def get_order(self, oid):
+        with self.lock:
+            self.polls[oid] += 1
+            n, qty = self.polls[oid], self.orders[oid]
+        if n == 1:
+            return {"id": oid, "status": "partially_filled", "filled_qty": qty / 2, "filled_avg_price": self.fill_price}
+        # seconda metà a +2: prezzo medio cumulativo = fill_price + 1
+        return {"id": oid, "status": "filled", "filled_qty": qty, "filled_avg_price": self.fill_price + 1.0}
+
+
+def _portfolio(tmp_path, broker, **kw):
+    cfg = tmp_path / "portfolio.yaml"
+    cfg.write_text("initial_budget: 1000\nallocations:\n  btc_usd: 1.0\n")
+    pipeline = OrderPipeline(broker, poll_interval=0.01, **kw)
+    pm = PortfolioManager(str(cfg), broker_enabled=True, trader=broker, order_pipeline=pipeline,
+                          stock_state=StockStateManager(backend=MemoryStateBackend()))
+    pm.bootstrap()
+    return pm
+
+
+def test_submit_does_not_block_and_fills_reconcile(tmp_path):
+    broker = _SlowBroker(delay=0.2)
+    pm = _portfolio(tmp_path, broker)
+    try:
+        t0 = time.perf_counter()
+        oid = pm.book_buy("BTC/USD", 4.0, 10.0)
+        assert time.perf_counter() - t0 < 0.01
+        assert pm.stock_state.get_quantity("btc_usd") == 0.0   # nessun fill ancora
+
+        assert pm.orders.wait(oid, timeout=5.0)
+        ticket = pm.orders.get(oid)
+        assert ticket.status == FILLED and ticket.broker_id == "b-0"
+        # due fill: 2 @ 10 e 2 @ 12 -> 44 investiti
+        assert pm.stock_state.get_quantity("btc_usd") == 4.0
+        assert abs(pm.stock_state.get_position("btc_usd").money_invested - 44.0) < 1e-9
+        assert abs(pm.stock_cash["btc_usd"] - 956.0) < 1e-9
+    finally:
+        pm.close()
+
+
+def test_workers_send_concurrently_and_pending_sells_are_reserved(tmp_path):
+    broker = _SlowBroker(delay=0.2)
+    pm = _portfolio(tmp_path, broker, workers=4)
+    try:
+        ids = [pm.book_buy("BTC/USD", 1.0, 10.0) for _ in range(4)]
+        t0 = time.perf_counter()
+        assert all(pm.orders.wait(i, timeout=5.0) for i in ids)
+        assert time.perf_counter() - t0 < 0.6             # 4 invii da 0.2s in parallelo
+        assert pm.stock_state.get_quantity("btc_usd") == 4.0
+
+        first = pm.book_sell("BTC/USD", 4.0, 12.0)
+        assert pm.book_sell("BTC/USD", 4.0, 12.0) is None  # quantità già impegnata
+        assert pm.orders.wait(first, timeout=5.0)
+        assert pm.stock_state.get_quantity("btc_usd") == 0.0
+    finally:
+        pm.close()
+
+
+def test_plain_trader_and_failures():
+    calls = []
+
+    class Plain:
+        def buy(self, symbol, qty):
+            calls.append((symbol, qty))
+
+        def sell(self, symbol, qty):
+            raise ConnectionError("down")
+
+    fills = []
+    pipe = OrderPipeline(Plain(), on_fill=lambda t, q, p: fills.append((t.side, q, p)), workers=1)
+    try:
+        ok = pipe.submit("BTC/USD", "buy", 1.5, 20.0)
+        ko = pipe.submit("BTC/USD", "sell", 1.0, 20.0)
+        assert pipe.wait(ok, 2.0) and pipe.wait(ko, 2.0)
+    finally:
+        pipe.close()
+    assert calls == [("BTC/USD", 1.5)]
+    assert fills == [("buy", 1.5, 20.0)]
+    assert pipe.get(ko).status == FAILED and "down" in pipe.get(ko).error
+
+
+def test_final_orders_leave_the_open_index_and_full_queue_rejects():
+    entered, release = threading.Event(), threading.Event()
+
+    class Gate:
+        def submit_order(self, symbol, side, qty, client_order_id):
+            entered.set()
+            release.wait(5.0)
+            return {"id": client_order_id, "status": "filled", "filled_qty": qty, "filled_avg_price": 1.0}
+
+        def get_order(self, oid):
+            raise AssertionError("ordini eseguiti all'invio")
+
+    pipe = OrderPipeline(Gate(), workers=1, max_queue=1, history_size=2)
+    try:
+        a = pipe.submit("BTC/USD", "sell", 1.0)
+        assert entered.wait(2.0)
+        b = pipe.submit("BTC/USD", "sell", 2.0)
+        c = pipe.submit("BTC/USD", "sell", 4.0)            # coda piena: rifiutato, nessuna eccezione
+        assert pipe.get(c).status == FAILED and pipe.pending_qty("BTC/USD", "sell") == 3.0
+        release.set()
+        assert pipe.wait(a, 2.0) and pipe.wait(b, 2.0)
+        assert pipe.pending_qty("BTC/USD", "sell") == 0.0 and not pipe.orders
+        # storico limitato: il primo ordine chiuso (c) è uscito
+        assert pipe.get(c) is None and pipe.get(b).status == FILLED
+        assert pipe.submitted == 3 and pipe.counts == {FILLED: 2, FAILED: 1}
+    finally:
+        release.set()
+        pipe.close()
@@ -0,0 +1,55 @@
+import sys
+import os
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from trading_system.utils.bars import BarArrays, NS_PER_MIN, ns_to_iso
+from trading_system.utils.bar_store import BarStore, STORE_ROOT
+from trading_system.utils.portfolio_manager import PortfolioManager
+from trading_system.utils.stock_state_manager import STATE_FILE, JOURNAL_SUFFIX
+from trading_system.backtest.portfolio_backtest import PortfolioBacktester
+
+SYMBOLS = ["btc_usd", "eth_usd", "sol_usd", "ltc_usd"]
+T0 = 1_735_689_600 * 10**9  # 2025-01-01
+
+
+def _setup(root):
+    os.makedirs(root / "config")
+    os.makedirs(root / "data")
+    with open(root / "config" / "portfolio.yaml", "w") as f:
+        f.write("initial_budget: 1000\nallocations:\n")
+        f.writelines(f"  {s}: 0.25\n" for s in SYMBOLS)
+        f.write("reinvest:\n  default: 1.0\n  per_asset:\n    btc_usd: 0.7\n    sol_usd: 0.3\n")
+    store = BarStore(str(root / STORE_ROOT))
+    for i, s in enumerate(SYMBOLS):
+        rng = np.random.default_rng(i)
+        n = 4000
+        c = 50.0 * (i + 1) * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+        t = T0 + np.arange(n, dtype=np.int64) * NS_PER_MIN
+        store.write(s.upper().replace("_", "/"), 1, BarArrays(t, c, c, c, c, np.ones(n)))
+
+
+def _run(root, workers):
+    _setup(root)
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        pm = PortfolioManager(broker_enabled=False)
+        pm.bootstrap()
+        PortfolioBacktester(pm, {s: "rsi_strategy" for s in SYMBOLS}, 1, ns_to_iso(T0),
+                            ns_to_iso(T0 + 4000 * NS_PER_MIN), allow_download=False, workers=workers).run()
+        # backend in memoria: il file di stato live non viene toccato
+        assert not os.path.exists(STATE_FILE) and not os.path.exists(STATE_FILE + JOURNAL_SUFFIX)
+        return pm.stock_state.get_all_states(), pm.stock_cash, pm.realized_pnl_pool
+    finally:
+        os.chdir(cwd)
+
+
+def test_parallel_matches_sequential(tmp_path):
+    seq = _run(tmp_path / "seq", workers=1)
+    par = _run(tmp_path / "par", workers=3)
+    assert any(st.get("realized_pnl") for st in seq[0].values())
+    assert seq[2] != 0.0
+    assert seq == par
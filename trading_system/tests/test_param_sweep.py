@@ -0,0 +1,58 @@
+import sys
+import os
+import csv
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from trading_system.utils.bars import BarArrays, NS_PER_MIN, ns_to_iso
+from trading_system.utils.bar_store import BarStore
+from trading_system.backtest.param_sweep import expand_grid, sample_random, account, run_sweep
+
+T0 = 1_735_689_600 * 10**9  # 2025-01-01
+
+
+def test_expand_grid_and_random():
+    grid = expand_grid({"window": [7, 14], "rsi_buy": {"min": 20, "max": 30, "step": 5},
+                        "trailing_pct": {"min": 0.1, "max": 0.3, "step": 0.1}, "hard_tp_pct": None})
+    assert len(grid) == 2 * 3 * 3
+    assert {g["trailing_pct"] for g in grid} == {0.1, 0.2, 0.3}
+    assert all(g["hard_tp_pct"] is None for g in grid)
+    spec = {"window": {"min": 5, "max": 30}, "rsi_buy": {"min": 20.0, "max": 40.0}, "cooldown_bars": [0, 3]}
+    a, b = sample_random(spec, 50, seed=1), sample_random(spec, 50, seed=1)
+    assert a == b
+    assert all(isinstance(p["window"], int) and 5 <= p["window"] <= 30 for p in a)
+
+
+def test_account_drawdown():
+    c = np.array([10.0, 10.0, 8.0, 12.0, 12.0])
+    actions = np.array([1, 0, 0, -1, 0], dtype=np.int8)
+    qtys = np.array([10.0, 0, 0, 0, 0])
+    m = account(c, actions, qtys, 100.0)
+    assert m["pnl"] == 20.0 and m["realized_pnl"] == 20.0
+    assert m["trades"] == 2 and m["win_rate"] == 1.0
+    assert abs(m["max_drawdown_pct"] - 20.0) < 1e-12
+
+
+def test_sweep_parallel_matches_serial(tmp_path):
+    store = BarStore(str(tmp_path / "store"))
+    n = 3000
+    for i, sym in enumerate(("BTC/USD", "ETH/USD")):
+        c = 100.0 * np.exp(np.cumsum(np.random.default_rng(i).normal(0, 0.004, n)))
+        store.write(sym, 1, BarArrays(T0 + np.arange(n, dtype=np.int64) * NS_PER_MIN, c, c, c, c, np.ones(n)))
+    spec = {
+        "strategy": "rsi_strategy", "symbols": ["btc_usd", "eth_usd"], "timeframe_minutes": 1,
+        "start": ns_to_iso(T0), "end": ns_to_iso(T0 + n * NS_PER_MIN), "capital": 1000,
+        "allow_download": False, "params": {"window": [7, 14], "rsi_buy": [25, 35], "hard_tp_pct": [None, 0.01]},
+    }
+    kw = dict(store_root=store.root, data_dirs=[str(tmp_path)])
+    serial = run_sweep(spec, workers=1, out_path=str(tmp_path / "s.csv"), **kw)
+    parallel = run_sweep(spec, workers=3, out_path=str(tmp_path / "p.csv"), **kw)
+    assert len(serial) == 8
+    assert serial == parallel
+    assert [r["rank"] for r in serial] == list(range(1, 9))
+    assert all(a["pnl"] >= b["pnl"] for a, b in zip(serial, serial[1:]))
+    with open(tmp_path / "p.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert rows[0]["rank"] == "1" and "pnl_btc_usd" in rows[0]
@@ -0,0 +1,59 @@
+import sys
+import os
+import time
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from trading_system.utils.profiling import SamplingProfiler, MemorySnapshots
+
+
+def _busy_strategy(stop):
+    x = 0
+    while not stop.is_set():
+        x += sum(range(200))
+
+
+def test_sampling_profiler_writes_folded_stacks_for_all_threads(tmp_path):
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_strategy, args=(stop,), name="StrategyThread-btc_usd", daemon=True)
+    worker.start()
+    prof = SamplingProfiler(interval=0.002, out_dir=str(tmp_path))
+    prof.start()
+    time.sleep(0.3)
+    path, summ = prof.stop()
+    stop.set()
+    worker.join()
+
+    assert not prof.running and summ["samples"] > 10
+    lines = open(path, encoding="utf-8").read().splitlines()
+    stacks = {}
+    for line in lines:
+        stack, n = line.rsplit(" ", 1)
+        stacks[stack] = int(n)
+    ours = [s for s in stacks if s.startswith("StrategyThread-btc_usd;")]
+    assert ours and all("_busy_strategy (test_profiling.py:" in s for s in ours)
+    assert summ["threads"]["StrategyThread-btc_usd"] == sum(stacks[s] for s in ours)
+    # il thread del profiler non campiona se stesso; si può ripartire senza ricreare l'oggetto
+    assert not any(s.startswith("SamplingProfiler;") for s in stacks)
+    prof.start()
+    prof.stop(str(tmp_path / "again.folded"))
+
+
+def _leak(store):
+    for _ in range(2000):
+        store.append(bytearray(512))
+
+
+def test_memory_snapshots_report_growth(tmp_path):
+    mem = MemorySnapshots(out_dir=str(tmp_path))
+    assert mem.snap() is None and mem.active
+    held = []
+    _leak(held)
+    path = mem.snap(top=5)
+    mem.stop()
+    assert not mem.active
+    report = open(path, encoding="utf-8").read()
+    growth = report.split("=== top 5 crescite")[1].split("=== top 5 allocazioni")[0]
+    assert "test_profiling.py" in growth.splitlines()[2]   # la riga di _leak è la prima crescita
+    assert len(held) == 2000
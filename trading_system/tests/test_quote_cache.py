@@ -0,0 +1,101 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from trading_system.utils.quote_cache import QuoteCache
+from trading_system.utils.market_data_hub import MarketDataHub, FakeBarSource
+from trading_system.utils.portfolio_manager import PortfolioManager
+
+
+class _Clock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+class _Fetcher:
+    def __init__(self):
+        self.calls = []
+        self.fail = False
+
+    def __call__(self, symbols):
+        self.calls.append(list(symbols))
+        if self.fail:
+            raise ConnectionError("down")
+        return {s: float(len(s)) + len(self.calls) for s in symbols}
+
+
+def test_batched_refresh_and_ttl():
+    clock, fetch = _Clock(), _Fetcher()
+    qc = QuoteCache(fetch, ttl=5.0, max_stale=60.0, clock=clock)
+    prices = qc.get_last_prices(["btc_usd", "ETH/USD", "AAPL", "msft", "BTC/USD"])
+    assert sorted(map(sorted, fetch.calls)) == [["AAPL", "MSFT"], ["BTC/USD", "ETH/USD"]]
+    assert set(prices) == {"BTC/USD", "ETH/USD", "AAPL", "MSFT"}
+
+    clock.t = 4.0
+    assert qc.get_last_prices(["btc_usd", "aapl"]) == {"BTC/USD": prices["BTC/USD"], "AAPL": prices["AAPL"]}
+    assert len(fetch.calls) == 2
+
+    clock.t = 6.0
+    qc.get_last_price("BTC/USD")
+    assert fetch.calls[-1] == ["BTC/USD"]
+
+
+def test_stale_policy():
+    clock, fetch = _Clock(), _Fetcher()
+    qc = QuoteCache(fetch, ttl=1.0, max_stale=30.0, clock=clock)
+    p = qc.get_last_price("BTC/USD")
+    fetch.fail = True
+    clock.t = 20.0
+    assert qc.get_last_price("BTC/USD") == p      # refresh fallito: servito il valore scaduto
+    clock.t = 40.0
+    assert qc.get_last_price("BTC/USD") is None   # troppo vecchio
+
+
+def test_fed_by_stream_and_snapshot_without_requests(tmp_path):
+    clock, fetch = _Clock(), _Fetcher()
+    qc = QuoteCache(fetch, ttl=5.0, clock=clock)
+    src = FakeBarSource()
+    hub = MarketDataHub(lambda: src)
+    hub.add_tap(qc.on_bar)
+    hub.subscribe("BTC/USD", lambda bar: None)
+    hub.subscribe("ETH/USD", lambda bar: None)
+    src.push({"symbol": "BTC/USD", "close": 100.0})
+    src.push({"symbol": "ETH/USD", "close": 10.0})
+
+    class Trader:
+        def get_last_prices(self, symbols):
+            return qc.get_last_prices(symbols)
+
+    cfg = tmp_path / "portfolio.yaml"
+    cfg.write_text("initial_budget: 100\nallocations:\n  btc_usd: 0.5\n  eth_usd: 0.5\n")
+    pm = PortfolioManager(str(cfg), broker_enabled=False, trader=Trader())
+    pm.bootstrap()
+    rows = pm.snapshot()["rows"]
+    assert rows["btc_usd"]["last_price"] == 100.0 and rows["eth_usd"]["last_price"] == 10.0
+    assert fetch.calls == []
+
+
+def test_bar_fed_quotes_stay_fresh_between_bars():
+    from trading_system.utils.bars import Bar, NS_PER_MIN
+    clock, fetch = _Clock(), _Fetcher()
+    qc = QuoteCache(fetch, ttl=5.0, clock=clock, bar_grace=15.0)
+    t0 = 1_735_689_600 * 10**9
+    for minute in range(3):
+        clock.t = 60.0 * minute
+        qc.on_bar(Bar("BTC/USD", t0 + minute * NS_PER_MIN, 1.0, 1.0, 1.0, 100.0 + minute))
+        for dt in (10.0, 30.0, 59.0):             # tra una barra e la successiva: nessuna REST
+            clock.t = 60.0 * minute + dt
+            assert qc.get_last_price("btc_usd") == 100.0 + minute
+    assert fetch.calls == []
+    clock.t = 120.0 + 76.0                         # barra mancata oltre durata + grace: refresh
+    qc.get_last_price("btc_usd")
+    assert fetch.calls == [["BTC/USD"]]
+    # i prezzi non da barra seguono ancora il ttl
+    qc.put("ETH/USD", 10.0)
+    clock.t += 6.0
+    qc.get_last_price("ETH/USD")
+    assert fetch.calls[-1] == ["ETH/USD"]
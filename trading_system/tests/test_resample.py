@@ -0,0 +1,61 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import numpy as np
+
+from trading_system.utils.bars import BarArrays, NS_PER_MIN, to_ns
+from trading_system.utils.resample import resample, resample_many, BarBucketer
+
+
+def _random_1m(n: int, seed: int = 1) -> BarArrays:
+    rng = np.random.default_rng(seed)
+    t = to_ns("2025-03-01T00:00:00Z") + np.arange(n, dtype=np.int64) * NS_PER_MIN
+    t = t[rng.random(n) > 0.1]                       # minuti mancanti
+    c = 100 + np.cumsum(rng.normal(0, 1, len(t)))
+    o = c + rng.normal(0, 0.1, len(t))
+    return BarArrays(t, o, np.maximum(o, c) + 0.5, np.minimum(o, c) - 0.5, c, rng.random(len(t)))
+
+
+def _naive(bars: BarArrays, tf: int) -> BarArrays:
+    out = {}
+    for t, o, h, l, c, v in zip(bars.t.tolist(), bars.o, bars.h, bars.l, bars.c, bars.v):
+        k = t - t % (tf * NS_PER_MIN)
+        if k not in out:
+            out[k] = [o, h, l, c, v]
+        else:
+            b = out[k]; b[1] = max(b[1], h); b[2] = min(b[2], l); b[3] = c; b[4] += v
+    keys = sorted(out)
+    return BarArrays(keys, *zip(*(out[k] for k in keys)))
+
+
+def test_resample_matches_naive_for_odd_timeframes():
+    bars = _random_1m(3 * 1440)
+    for tf in (5, 7, 90, 240, 1440):
+        got, exp = resample(bars, tf), _naive(bars, tf)
+        assert np.array_equal(got.t, exp.t), tf
+        for col in ("o", "h", "l", "c"):
+            assert np.array_equal(getattr(got, col), getattr(exp, col)), (tf, col)
+        assert np.allclose(got.v, exp.v)
+
+
+def test_resample_many_equals_individual_and_labels():
+    bars = _random_1m(2 * 1440)
+    many = resample_many(bars, [5, 15, 60, 90, 240, 1440], label="right")
+    for tf, got in many.items():
+        exp = resample(bars, tf, label="right")
+        assert np.array_equal(got.t, exp.t) and np.array_equal(got.c, exp.c) and np.allclose(got.v, exp.v)
+    assert many[1440].t[0] == to_ns("2025-03-02T00:00:00Z")
+
+
+def test_streaming_bucketer_matches_batch():
+    bars = _random_1m(1440)
+    exp = resample(bars, 90)
+    b = BarBucketer(90)
+    closed = [b.add(*row) for row in zip(bars.t.tolist(), bars.o.tolist(), bars.h.tolist(),
+                                         bars.l.tolist(), bars.c.tolist(), bars.v.tolist())]
+    closed = [x for x in closed if x is not None] + [b.flush()]
+    assert [x[0] for x in closed] == exp.t.tolist()
+    assert [x[4] for x in closed] == exp.c.tolist()
+    assert [x[2] for x in closed] == exp.h.tolist()
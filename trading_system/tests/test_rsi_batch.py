@@ -0,0 +1,93 @@
+import sys
+import os
+import csv
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from trading_system.strategies.base import has_batch, StrategyBase, ACTION_BUY, ACTION_SELL
+from trading_system.strategies.rsi_strategy import Strategy
+from trading_system.utils.bars import NS_PER_MIN, ns_to_iso
+from trading_system.utils.decision_log import get_decision_logger
+
+
+def _series(n, seed):
+    rng = np.random.default_rng(seed)
+    c = 100.0 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    # qualche prezzo ripetuto (delta nullo)
+    for i in np.sort(rng.integers(1, n, n // 50)):
+        c[i] = c[i - 1]
+    t = 1_735_689_600 * 10**9 + np.arange(n, dtype=np.int64) * NS_PER_MIN
+    return t, c
+
+
+def _per_bar(strategy, t, c):
+    actions, qtys = [], []
+    for ts, price in zip(t.tolist(), c.tolist()):
+        sig = strategy.on_data({"symbol": strategy.stock, "price": price, "timestamp": ns_to_iso(ts)})
+        actions.append({"buy": ACTION_BUY, "sell": ACTION_SELL}.get(sig["action"], 0))
+        qtys.append(float(sig.get("quantity", 0.0)) if sig["action"] != "hold" else 0.0)
+    return np.array(actions, dtype=np.int8), np.array(qtys)
+
+
+def _state(s):
+    return (s.position_qty, s.entry_price, s.highest_price, s.cooldown, s.armed, s.min_profitable_price,
+            s._avg_gain, s._avg_loss, s._last_price, list(s.prices))
+
+
+def _trades(path):
+    get_decision_logger().flush()
+    with open(path, newline="", encoding="utf-8") as f:
+        return [{k: v for k, v in r.items() if k != "ts_wall"} for r in csv.DictReader(f) if r["action"] != "hold"]
+
+
+@pytest.mark.parametrize("kw", [
+    {},
+    {"window": 7, "cooldown_bars": 0, "rsi_buy": 40},
+    {"window": 21, "cooldown_bars": 5, "hard_tp_pct": 0.0015, "rsi_buy": 35},
+    {"window": 14, "hard_tp_pct": 0.02, "edge_min_pct": 0.01, "max_buffer": 10},
+])
+def test_on_bars_matches_on_data(tmp_path, kw):
+    t, c = _series(5000, seed=len(kw))
+    a = Strategy("btc_usd", 10_000, log_path=str(tmp_path / "a.csv"), log_level="trades", **kw)
+    b = Strategy("btc_usd", 10_000, log_path=str(tmp_path / "b.csv"), log_level="trades", **kw)
+
+    act_a, qty_a = _per_bar(a, t, c)
+    act_b, qty_b = b.on_bars(t, c, c, c, c, np.zeros(len(c)))
+
+    assert (act_a != 0).sum() > 4
+    assert np.array_equal(act_a, act_b)
+    assert np.array_equal(qty_a, qty_b)
+    assert _state(a) == _state(b)
+    assert _trades(a.log_path) == _trades(b.log_path)
+
+
+def test_on_bars_continues_from_state(tmp_path):
+    t, c = _series(3000, seed=7)
+    a = Strategy("eth_usd", 5_000, log_path=str(tmp_path / "a.csv"), log_level="off", cooldown_bars=3)
+    b = Strategy("eth_usd", 5_000, log_path=str(tmp_path / "b.csv"), log_level="off", cooldown_bars=3)
+    act_a, qty_a = _per_bar(a, t, c)
+    parts = [b.on_bars(t[s:e], c[s:e], c[s:e], c[s:e], c[s:e], c[s:e]) for s, e in ((0, 5), (5, 1234), (1234, 3000))]
+    assert np.array_equal(act_a, np.concatenate([p[0] for p in parts]))
+    assert np.array_equal(qty_a, np.concatenate([p[1] for p in parts]))
+    assert _state(a) == _state(b)
+
+
+def test_has_batch(tmp_path):
+    assert has_batch(Strategy("x", 1, log_path=str(tmp_path / "x.csv")))
+    assert not has_batch(StrategyBase("x"))
+
+
+def test_on_bars_full_log_falls_back_to_per_bar(tmp_path):
+    t, c = _series(1500, seed=3)
+    a = Strategy("btc_usd", 1_000, log_path=str(tmp_path / "a.csv"), log_level="all")
+    b = Strategy("btc_usd", 1_000, log_path=str(tmp_path / "b.csv"), log_level="off")
+    act_a, qty_a = a.on_bars(t, c, c, c, c, c)
+    act_b, qty_b = b.on_bars(t, c, c, c, c, c)
+    assert np.array_equal(act_a, act_b) and np.array_equal(qty_a, qty_b)
+    get_decision_logger().flush()
+    with open(a.log_path, newline="", encoding="utf-8") as f:
+        assert len(list(csv.DictReader(f))) == len(c)
+    assert not os.path.exists(b.log_path)
@@ -0,0 +1,109 @@
+import sys
+import os
+import math
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import numpy as np
+import pytest
+
+from trading_system.utils.bars import BarArrays, NS_PER_MIN, ns_to_iso
+from trading_system.utils.bar_store import BarStore
+from trading_system.utils.interface_factory import get_trading_interface
+from trading_system.utils.sim_trading_interface import SimulatedTradingInterface, SimQuotes, RateLimitError
+from trading_system.backtest.replay import run_replay
+
+T0 = 1_735_689_600 * 10**9  # 2025-01-01
+
+
+class _Clock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+def _bars(n, phase=0.0):
+    t = T0 + np.arange(n, dtype=np.int64) * NS_PER_MIN
+    c = 100.0 + 10.0 * np.sin(np.arange(n) / 15.0 + phase)
+    return BarArrays(t, c, c + 0.5, c - 0.5, c, np.ones(n))
+
+
+def _sim(tmp_path, **params):
+    store = BarStore(str(tmp_path / "store"))
+    store.write("BTC/USD", 1, _bars(10))
+    clock = _Clock()
+    params.setdefault("latency_ms", 100.0)
+    params.setdefault("slippage_bps", 10.0)
+    return SimulatedTradingInterface(quotes=SimQuotes(store), seed=1, clock=clock, cash=10_000.0, **params), clock
+
+
+def test_latency_slippage_and_store_prices(tmp_path):
+    sim, clock = _sim(tmp_path)
+    last = sim.get_last_price("BTC/USD")
+    assert last == pytest.approx(float(_bars(10).c[-1]))
+
+    o = sim.submit_order("BTC/USD", "buy", 2.0)
+    assert o["status"] == "accepted"
+    clock.t = 0.05
+    assert sim.get_order(o["id"])["status"] == "accepted"
+    clock.t = 0.1
+    o = sim.get_order(o["id"])
+    assert o["status"] == "filled" and o["filled_qty"] == 2.0
+    assert o["filled_avg_price"] == pytest.approx(last * 1.001)
+    assert sim.get_position("btc_usd").qty == 2.0
+    assert sim.get_account().cash == pytest.approx(10_000.0 - 2.0 * last * 1.001)
+
+    # vendita oltre la posizione: rifiutata
+    o = sim.submit_order("BTC/USD", "sell", 5.0)
+    clock.t = 1.0
+    assert sim.get_order(o["id"])["status"] == "rejected"
+
+
+def test_partial_fills_rejects_and_rate_limit(tmp_path):
+    sim, clock = _sim(tmp_path, partial_prob=1.0, rate_limit=2)
+    o = sim.submit_order("BTC/USD", "buy", 1.0)
+    clock.t = 0.1
+    o = sim.get_order(o["id"])
+    assert o["status"] == "partially_filled" and 0.2 <= o["filled_qty"] <= 0.8
+    clock.t = 0.2
+    assert sim.get_order(o["id"])["status"] == "filled"
+
+    sim.submit_order("BTC/USD", "buy", 1.0)
+    with pytest.raises(RateLimitError):
+        sim.submit_order("BTC/USD", "buy", 1.0)
+    clock.t = 61.0
+    sim.submit_order("BTC/USD", "buy", 1.0)
+
+    sim.reject_prob = 1.0
+    sim.rate_limit = 0
+    assert sim.submit_order("BTC/USD", "buy", 1.0)["status"] == "rejected"
+
+
+def test_factory_selects_simulator(monkeypatch):
+    monkeypatch.setenv("TRADING_PROVIDER", "sim")
+    monkeypatch.setenv("SIM_LATENCY_MS", "7")
+    trader = get_trading_interface()
+    assert isinstance(trader, SimulatedTradingInterface) and trader.latency_ms == 7.0
+
+
+def test_replay_through_strategy_runners(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("DECISION_LOG", "off")
+    store = BarStore(str(tmp_path / "store"))
+    n = 3000
+    store.write("BTC/USD", 1, _bars(n))
+    store.write("ETH/USD", 1, _bars(n, phase=1.0))
+    (tmp_path / "strategies.yaml").write_text("strategies:\n  btc_usd: rsi_strategy\n  eth_usd: rsi_strategy\n")
+    (tmp_path / "portfolio.yaml").write_text("initial_budget: 10000\nallocations:\n  btc_usd: 0.5\n  eth_usd: 0.5\n")
+
+    out = run_replay(ns_to_iso(T0), ns_to_iso(T0 + n * NS_PER_MIN), speed=0.0,
+                     strategies_path=str(tmp_path / "strategies.yaml"),
+                     portfolio_path=str(tmp_path / "portfolio.yaml"),
+                     store_root=str(tmp_path / "store"), data_dirs=[str(tmp_path / "none")],
+                     sim_params={"latency_ms": 1.0})
+    assert out["bars"] == 2 * n
+    assert out["orders"] > 0 and out["failed"] == 0
+    assert out["filled"] + out["rejected"] == out["orders"]
+    assert out["bars_per_sec"] > 0
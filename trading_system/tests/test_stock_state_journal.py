@@ -0,0 +1,101 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from trading_system.utils.stock_state_manager import StockStateManager, MemoryStateBackend
+
+
+def _trade(m, i):
+    s = f"sym_{i % 7}"
+    if i % 3 == 2:
+        m.update_on_sell(s, 0.5, 10.0 + i)
+    else:
+        m.update_on_buy(s, 1.0, 9.0 + i * 0.1)
+
+
+def test_replay_snapshot_plus_journal(tmp_path):
+    path = str(tmp_path / "data" / "stock_state.yaml")
+    m = StockStateManager(path, compact_every=25)
+    for i in range(110):
+        _trade(m, i)
+    expected = m.get_all_states()
+    # 4 compattazioni (100 record nello snapshot), 10 record ancora solo nel journal
+    with open(path) as f:
+        assert f.readline().strip() == "# seq: 100"
+    assert sum(1 for _ in open(path + ".journal")) == 10
+
+    again = StockStateManager(path, compact_every=25)
+    assert again.get_all_states() == expected
+    assert again.backend.seq == 110
+
+
+def test_torn_record_is_discarded(tmp_path):
+    path = str(tmp_path / "stock_state.yaml")
+    m = StockStateManager(path)
+    for i in range(20):
+        _trade(m, i)
+    expected = m.get_all_states()
+    with open(path + ".journal", "ab") as f:
+        f.write(b'{"seq":21,"stock":"sym_0","state":{"money_inv')  # crash a metà record
+
+    again = StockStateManager(path)
+    assert again.get_all_states() == expected
+    again.update_on_buy("sym_0", 1.0, 5.0)
+    expected = again.get_all_states()
+    assert StockStateManager(path).get_all_states() == expected
+
+
+def test_legacy_snapshot_without_seq(tmp_path):
+    path = tmp_path / "stock_state.yaml"
+    path.write_text("btc_usd:\n  money_invested: 100.0\n  quantity: 2\n")
+    m = StockStateManager(str(path))
+    m.update_on_sell("btc_usd", 1, 80.0)
+    st = StockStateManager(str(path)).get_state("btc_usd")
+    assert st == {"money_invested": 50.0, "quantity": 1, "realized_pnl": 30.0}
+
+
+def test_memory_backend_does_not_touch_disk(tmp_path):
+    from trading_system.utils.portfolio_manager import PortfolioManager
+    cfg = tmp_path / "portfolio.yaml"
+    cfg.write_text("initial_budget: 100\nallocations:\n  btc_usd: 1.0\n")
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        pm = PortfolioManager(str(cfg), broker_enabled=False)
+        pm.bootstrap()
+        pm.book_buy("BTC/USD", 2.0, 10.0)
+        pm.book_sell("BTC/USD", 1.0, 15.0)
+        assert isinstance(pm.stock_state.backend, MemoryStateBackend)
+        assert pm.stock_state.get_quantity("btc_usd") == 1.0
+        assert pm.stock_state.get_position("btc_usd").realized_pnl == 5.0
+        assert not os.path.exists("data")
+    finally:
+        os.chdir(cwd)
+
+
+def test_portfolio_close_compacts_the_journal(tmp_path):
+    from trading_system.utils.portfolio_manager import PortfolioManager
+    cfg = tmp_path / "portfolio.yaml"
+    cfg.write_text("initial_budget: 100\nallocations:\n  btc_usd: 1.0\n")
+    path = str(tmp_path / "stock_state.yaml")
+    pm = PortfolioManager(str(cfg), broker_enabled=False, stock_state=StockStateManager(path))
+    pm.bootstrap()
+    pm.book_buy("BTC/USD", 2.0, 10.0)
+    assert sum(1 for _ in open(path + ".journal")) == 1
+    pm.close()
+    assert os.path.getsize(path + ".journal") == 0
+    assert StockStateManager(path).get_quantity("btc_usd") == 2.0
+
+
+def test_strategy_manager_never_opens_the_live_journal(tmp_path, monkeypatch):
+    from trading_system.state import PortfolioState
+    from trading_system.strategy_manager import StrategyManager
+    (tmp_path / "strategies.yaml").write_text("strategies:\n  btc_usd: rsi_strategy\n")
+    monkeypatch.chdir(tmp_path)
+    shared = StockStateManager(backend=MemoryStateBackend())
+    assert StrategyManager(PortfolioState(), "strategies.yaml", trader=object(),
+                           stock_state=shared).stock_state is shared
+    own = StrategyManager(PortfolioState(), "strategies.yaml", trader=object())
+    assert isinstance(own.stock_state.backend, MemoryStateBackend)
+    assert not os.path.exists("data")
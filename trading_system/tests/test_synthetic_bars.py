@@ -0,0 +1,81 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import numpy as np
+
+from trading_system.utils.bars import NS_PER_MIN, to_ns
+from trading_system.utils.synthetic_bars import (SyntheticMarket, write_synthetic, default_symbols,
+                                                 US_SESSION, MIN_PER_DAY)
+from trading_system.backtest.portfolio_backtest import fetch_local_bars
+
+
+def _series(**kw):
+    m = SyntheticMarket(default_symbols(3), seed=11, **kw)
+    out = {}
+    for chunk in m.generate("2024-01-01", "2024-01-31", chunk_days=7):
+        for s, b in chunk.items():
+            out.setdefault(s, []).append(b)
+    return out
+
+
+def test_deterministic_and_independent_of_workers():
+    a, b = _series(workers=1), _series(workers=3)
+    for s in a:
+        for x, y in zip(a[s], b[s]):
+            assert np.array_equal(x.t, y.t) and np.array_equal(x.c, y.c) and np.array_equal(x.v, y.v)
+
+
+def test_correlation_missing_and_ohlc_consistency():
+    m = SyntheticMarket(default_symbols(2), seed=3, corr=0.6, missing=0.01, jump_rate=0.0, workers=1)
+    (chunk,) = list(m.generate("2024-01-01", "2024-01-31", chunk_days=30))
+    a, b = chunk["SYN000/USD"], chunk["SYN001/USD"]
+    n = 30 * MIN_PER_DAY
+    assert 0.98 * n < len(a) < 0.995 * n                   # ~1% di barre mancanti
+    assert np.all(np.diff(a.t) > 0) and np.all(a.t % NS_PER_MIN == 0)
+    assert np.all(a.h >= np.maximum(a.o, a.c)) and np.all(a.l <= np.minimum(a.o, a.c))
+
+    common, ia, ib = np.intersect1d(a.t, b.t, return_indices=True)
+    ra, rb = np.log(a.c[ia] / a.o[ia]), np.log(b.c[ib] / b.o[ib])
+    # correlazione a coppie = prodotto dei caricamenti sul fattore di mercato (attorno a corr)
+    assert abs(np.corrcoef(ra, rb)[0, 1] - m.load[0] * m.load[1]) < 0.03
+    assert 0.6 * 0.8 ** 2 <= m.load[0] * m.load[1] <= 0.6 * 1.2 ** 2
+
+
+def test_us_session_has_overnight_gaps():
+    m = SyntheticMarket(["AAA/USD"], seed=5, session="us", missing=0.0, workers=1)
+    chunks = [c["AAA/USD"] for c in m.generate("2024-01-01", "2024-01-15")]
+    bars = np.concatenate([b.t for b in chunks])
+    o = np.concatenate([b.o for b in chunks])
+    c = np.concatenate([b.c for b in chunks])
+    minute = (bars // NS_PER_MIN) % MIN_PER_DAY
+    weekday = (bars // (MIN_PER_DAY * NS_PER_MIN) + 3) % 7
+    assert np.all((minute >= US_SESSION[0]) & (minute < US_SESSION[1]) & (weekday < 5))
+    assert len(bars) == 10 * (US_SESSION[1] - US_SESSION[0])   # 10 giorni lavorativi
+    # l'open della prima barra di sessione si stacca dalla close precedente, in continuo no
+    jump = np.abs(np.log(o[1:] / c[:-1]))
+    opens = np.diff(bars) > NS_PER_MIN
+    assert np.all(jump[~opens] < 1e-9) and np.all(jump[opens] > 1e-6)
+
+
+def test_written_series_are_read_by_fetch_local_bars(tmp_path):
+    syms = ["AAA/USD", "BBB/USD"]
+    root = tmp_path / "data"
+    write_synthetic(syms, "2024-01-01", "2024-01-05", fmt="csv", root=str(root), timeframe_minutes=5,
+                    chunk_days=1, seed=2, workers=1)
+    assert (root / "5m" / "AAA-USD.csv").exists()
+    csv_bars = fetch_local_bars(syms, "2024-01-01T00:00:00Z", "2024-01-05T00:00:00Z", 5,
+                                data_dirs=[str(root)], allow_download=False, store_root=str(tmp_path / "store"))
+
+    out = write_synthetic(syms, "2024-01-01", "2024-01-05", fmt="store", root=str(tmp_path / "store2"),
+                          timeframe_minutes=5, chunk_days=1, seed=2, workers=1)
+    store_bars = fetch_local_bars(syms, "2024-01-01T00:00:00Z", "2024-01-05T00:00:00Z", 5,
+                                  data_dirs=[str(tmp_path / "none")], allow_download=False,
+                                  store_root=str(tmp_path / "store2"))
+    for s in syms:
+        assert 0.99 * 4 * 288 <= len(store_bars[s]) <= 4 * 288
+        assert np.array_equal(csv_bars[s].t, store_bars[s].t)
+        assert np.allclose(csv_bars[s].c, store_bars[s].c)
+        assert int(store_bars[s].t[0]) == to_ns("2024-01-01T00:00:00Z")
+    assert out["rows"] == sum(len(b) for b in store_bars.values())
@@ -0,0 +1,84 @@
+import sys
+import os
+import csv
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from trading_system.utils.bars import BarArrays, NS_PER_MIN, ns_to_iso
+from trading_system.utils.bar_store import BarStore
+from trading_system.strategies.rsi_strategy import Strategy, rsi_series
+from trading_system.backtest.walk_forward import make_windows, run_walk_forward, stitch, NS_PER_DAY
+
+T0 = 1_735_689_600 * 10**9  # 2025-01-01
+
+
+def test_make_windows():
+    w = make_windows(0, 10 * NS_PER_DAY, 4 * NS_PER_DAY, 2 * NS_PER_DAY)
+    assert [x[0] // NS_PER_DAY for x in w] == [0, 2, 4]
+    assert all(is_hi == oos_lo for _, is_hi, oos_lo, _ in w)
+    assert w[-1][3] == 10 * NS_PER_DAY
+    assert make_windows(0, 3 * NS_PER_DAY, 4 * NS_PER_DAY, NS_PER_DAY) == []
+
+
+def test_make_windows_rejects_bad_step():
+    for step in (0, -NS_PER_DAY):
+        with pytest.raises(ValueError):
+            make_windows(0, 10 * NS_PER_DAY, 4 * NS_PER_DAY, 2 * NS_PER_DAY, step)
+    with pytest.raises(ValueError):
+        make_windows(0, 10 * NS_PER_DAY, 4 * NS_PER_DAY, 2 * NS_PER_DAY, NS_PER_DAY)
+    assert len(make_windows(0, 10 * NS_PER_DAY, 4 * NS_PER_DAY, 2 * NS_PER_DAY, 3 * NS_PER_DAY)) == 2
+
+
+def test_stitch_drops_overlapping_points():
+    def res(t, eq):
+        return {"out_of_sample": {"curve": (np.array(t, dtype=np.int64), np.array(eq, dtype=float))}}
+    # la seconda finestra ripete t=2,3: conta solo la variazione dopo t=3 (103 -> 107)
+    rows = stitch([res([1, 2, 3], [101.0, 102.0, 104.0]),
+                   res([2, 3, 4, 5], [99.0, 103.0, 107.0, 108.0]),
+                   res([4, 5], [100.0, 100.0])], 100.0)
+    assert [r[0] for r in rows] == [1, 2, 3, 4, 5]
+    assert [r[1] for r in rows] == [101.0, 102.0, 104.0, 108.0, 109.0]
+    assert [r[2] for r in rows] == [0, 0, 0, 1, 1]
+
+
+def test_on_bars_with_cached_rsi():
+    c = 100.0 * np.exp(np.cumsum(np.random.default_rng(5).normal(0, 0.004, 4000)))
+    t = T0 + np.arange(len(c), dtype=np.int64) * NS_PER_MIN
+    a = Strategy("x", 1000, window=9, log_level="off")
+    b = Strategy("x", 1000, window=9, log_level="off")
+    act_a, qty_a = a.on_bars(t, c, c, c, c, c)
+    act_b, qty_b = b.on_bars(t, c, c, c, c, c, rsi=rsi_series(c, 9))
+    assert np.array_equal(act_a, act_b) and np.array_equal(qty_a, qty_b)
+    assert (act_a != 0).sum() > 4
+
+
+def test_walk_forward_parallel_matches_serial(tmp_path):
+    store = BarStore(str(tmp_path / "store"))
+    n = 12 * 24 * 60 // 5
+    for i, sym in enumerate(("BTC/USD", "ETH/USD")):
+        c = 100.0 * np.exp(np.cumsum(np.random.default_rng(i).normal(0, 0.004, n)))
+        store.write(sym, 5, BarArrays(T0 + np.arange(n, dtype=np.int64) * 5 * NS_PER_MIN, c, c, c, c, np.ones(n)))
+    spec = {
+        "strategy": "rsi_strategy", "symbols": ["btc_usd", "eth_usd"], "timeframe_minutes": 5,
+        "start": ns_to_iso(T0), "end": ns_to_iso(T0 + 12 * NS_PER_DAY), "capital": 1000,
+        "in_sample_days": 3, "out_of_sample_days": 2, "allow_download": False,
+        "params": {"window": [7, 14], "rsi_buy": [25, 35], "hard_tp_pct": [None, 0.01]},
+    }
+    kw = dict(store_root=store.root, data_dirs=[str(tmp_path)])
+    serial = run_walk_forward(spec, workers=1, out_prefix=str(tmp_path / "s"), **kw)
+    parallel = run_walk_forward(spec, workers=3, out_prefix=str(tmp_path / "p"), **kw)
+
+    assert len(serial["windows"]) == 5
+    assert [w["params"] for w in serial["windows"]] == [w["params"] for w in parallel["windows"]]
+    assert serial["equity"] == parallel["equity"]
+    # curva cucita: timestamp crescenti, solo periodi out-of-sample
+    ts = [t for t, _, _ in serial["equity"]]
+    assert ts == sorted(ts) and ts[0] >= T0 + 3 * NS_PER_DAY
+    with open(tmp_path / "s.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 5 and sum(int(r["oos_trades"]) for r in rows) > 0
+    with open(tmp_path / "s_equity.csv", newline="") as f:
+        assert len(list(csv.DictReader(f))) == len(ts)
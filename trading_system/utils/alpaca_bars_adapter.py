@@ -1,12 +1,16 @@
 # alpaca_bars_adapter.py
 import os
 import threading
-from datetime import datetime, timezone
-from typing import Callable, Optional
+from time import perf_counter_ns, time_ns
+from datetime import datetime
+from typing import Callable, Optional, Tuple
 
 # pip install alpaca-py
 from alpaca.data.live.crypto import CryptoDataStream  # type: ignore
 
+from trading_system.utils.bars import Bar, NS_PER_MIN, dt_to_ns, to_ns
+from trading_system.utils.latency import TRACER
+
 
 def to_alpaca_symbol(sym: str) -> str:
     s = sym.strip().upper().replace("-", "/").replace("_", "/")
@@ -15,28 +19,70 @@ def to_alpaca_symbol(sym: str) -> str:
     return s
 
 
+def stream_credentials(api_key: Optional[str] = None,
+                       api_secret: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Credenziali per il websocket dati, come il resto dello stack live: PAPER_API_* (o
+    LIVE_API_* con ENVIRONMENT=live), poi APCA_API_* come fallback.
+    """
+    prefix = "LIVE" if os.getenv("ENVIRONMENT", "paper").lower() == "live" else "PAPER"
+    key = api_key or os.getenv(f"{prefix}_API_KEY_ID") or os.getenv("APCA_API_KEY_ID", "")
+    secret = api_secret or os.getenv(f"{prefix}_API_SECRET_KEY") or os.getenv("APCA_API_SECRET_KEY", "")
+    if not key or not secret:
+        raise RuntimeError(f"API key/secret Alpaca mancanti per lo stream (env {prefix}_API_* o APCA_API_*).")
+    return key, secret
+
+
+def bar_payload(bar, default_symbol: Optional[str] = None) -> Bar:
+    """alpaca.data.models.Bar -> Bar 1m (epoch-ns) usata da stream, hub e strategie."""
+    ts = getattr(bar, "timestamp", None)
+    if isinstance(ts, datetime):
+        t = dt_to_ns(ts)
+    elif isinstance(ts, str):
+        t = to_ns(ts)
+    else:
+        t = time_ns() // NS_PER_MIN * NS_PER_MIN
+
+    return Bar(
+        getattr(bar, "symbol", None) or default_symbol,
+        t,
+        float(getattr(bar, "open", 0.0)),
+        float(getattr(bar, "high", 0.0)),
+        float(getattr(bar, "low", 0.0)),
+        float(getattr(bar, "close", 0.0)),
+        float(getattr(bar, "volume", 0.0)),
+    )
+
+
+def _traced_payload(bar, default_symbol: Optional[str] = None) -> Bar:
+    """bar_payload() con il timestamp d'arrivo (rx_ns) se il tracing delle latenze è attivo."""
+    if not TRACER.enabled:
+        return bar_payload(bar, default_symbol)
+    rx = perf_counter_ns()
+    payload = bar_payload(bar, default_symbol)
+    payload.rx_ns = rx
+    TRACER.record(payload.symbol or "", "adapter", rx)
+    return payload
+
+
 class AlpacaBars1mAdapter:
     """
-    Sottoscrive le **minute bars (1m)** crypto di Alpaca e chiama on_bar_callback(dict).
+    Sottoscrive le **minute bars (1m)** crypto di Alpaca e chiama on_bar_callback(Bar).
     Implementazione thread-based, senza event loop personalizzati.
     """
     def __init__(
         self,
         symbol: str,
-        on_bar_callback: Callable[[dict], None],
+        on_bar_callback: Callable[[Bar], None],
         api_key: Optional[str] = None,
         api_secret: Optional[str] = None,
         feed: str = "us",
     ):
         self.symbol = to_alpaca_symbol(symbol)
         self.on_bar_callback = on_bar_callback
-        self.api_key = api_key or os.environ.get("APCA_API_KEY_ID", "")
-        self.api_secret = api_secret or os.environ.get("APCA_API_SECRET_KEY", "")
+        self.api_key, self.api_secret = stream_credentials(api_key, api_secret)
         self.feed = feed
 
-        if not self.api_key or not self.api_secret:
-            raise RuntimeError("Manca APCA_API_KEY_ID o APCA_API_SECRET_KEY (env o parametri).")
-
         self._stream: Optional[CryptoDataStream] = None
         self._thread: Optional[threading.Thread] = None
         self._running = False
@@ -47,25 +93,7 @@ class AlpacaBars1mAdapter:
         stream = CryptoDataStream(api_key=self.api_key, secret_key=self.api_secret)
 
         async def handle_bar(bar):
-            # bar: alpaca.data.models.Bar
-            ts = getattr(bar, "timestamp", None)
-            if isinstance(ts, str):
-                ts = datetime.fromisoformat(ts.replace("Z", "+00:00"))
-            elif not isinstance(ts, datetime):
-                ts = datetime.now(timezone.utc)
-
-            payload = {
-                "symbol": getattr(bar, "symbol", None) or self.symbol,
-                "timestamp": ts.astimezone(timezone.utc).isoformat(),
-                "open": float(getattr(bar, "open", 0.0)),
-                "high": float(getattr(bar, "high", 0.0)),
-                "low":  float(getattr(bar, "low", 0.0)),
-                "close": float(getattr(bar, "close", 0.0)),
-                "volume": float(getattr(bar, "volume", 0.0)),
-                "timeframe": "1Min",
-                "source": "alpaca_ws",
-            }
-            self.on_bar_callback(payload)
+            self.on_bar_callback(_traced_payload(bar, self.symbol))
 
         # subscribe alle **minute bars**
         stream.subscribe_bars(handle_bar, self.symbol)
@@ -108,3 +136,64 @@ class AlpacaBars1mAdapter:
             self._thread.join(timeout=timeout)
         with self._lock:
             self._running = False
+
+
+class AlpacaBarSource:
+    """
+    Sorgente multi-simbolo per MarketDataHub: UN solo CryptoDataStream (una connessione,
+    un thread) per tutte le minute bars. I simboli si aggiungono/rimuovono a stream aperto
+    con subscribe/unsubscribe, senza riconnettersi.
+    """
+    def __init__(self, api_key: Optional[str] = None, api_secret: Optional[str] = None):
+        self.api_key, self.api_secret = stream_credentials(api_key, api_secret)
+        self._stream: Optional[CryptoDataStream] = None
+        self._thread: Optional[threading.Thread] = None
+        self._on_bar: Optional[Callable[[Bar], None]] = None
+        self._lock = threading.Lock()
+
+    async def _handle_bar(self, bar):
+        cb = self._on_bar
+        if cb is not None:
+            cb(_traced_payload(bar))
+
+    def start(self, on_bar: Callable[[Bar], None], symbols) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._on_bar = on_bar
+            self._stream = CryptoDataStream(api_key=self.api_key, secret_key=self.api_secret)
+            if symbols:
+                self._stream.subscribe_bars(self._handle_bar, *[to_alpaca_symbol(s) for s in symbols])
+
+            def _runner():
+                try:
+                    self._stream.run()
+                except Exception as e:
+                    print(f"[AlpacaBarSource] stream.run() exception: {e}")
+
+            self._thread = threading.Thread(target=_runner, name="AlpacaBarSourceThread", daemon=True)
+            self._thread.start()
+
+    def subscribe(self, symbols) -> None:
+        if self._stream is not None:
+            self._stream.subscribe_bars(self._handle_bar, *[to_alpaca_symbol(s) for s in symbols])
+
+    def unsubscribe(self, symbols) -> None:
+        if self._stream is not None:
+            try:
+                self._stream.unsubscribe_bars(*[to_alpaca_symbol(s) for s in symbols])
+            except KeyError:
+                pass
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._lock:
+            stream, thread = self._stream, self._thread
+            self._stream = self._thread = None
+            self._on_bar = None
+        try:
+            if stream:
+                stream.stop()
+        except Exception:
+            pass
+        if thread:
+            thread.join(timeout=timeout)
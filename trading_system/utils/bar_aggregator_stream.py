@@ -1,105 +1,77 @@
 # trading_system/utils/bar_aggregator_stream.py
 from __future__ import annotations
 import threading
-from datetime import datetime, timedelta, timezone
-from typing import Callable, Optional, Dict, Any, List
+from typing import Callable, Optional
 
-from trading_system.utils.alpaca_bars_adapter import AlpacaBars1mAdapter
-
-def _floor_to_minute(dt: datetime) -> datetime:
-    return dt.replace(second=0, microsecond=0)
-
-def _parse_ts(ts_iso: str) -> datetime:
-    # supporta ...Z o +00:00
-    return datetime.fromisoformat(ts_iso.replace("Z", "+00:00")).astimezone(timezone.utc)
+from trading_system.utils.market_data_hub import MarketDataHub, get_market_data_hub
+from trading_system.utils.bars import Bar
+from trading_system.utils.resample import BarBucketer
+from trading_system.utils.latency import TRACER
 
 class AggregatingBarStream:
     """
-    Riceve barre 1m via AlpacaBars1mAdapter e aggrega in barre di N minuti.
-    Chiama `on_bar_agg( dict )` alla CHIUSURA della candela aggregata.
+    Riceve barre 1m dal MarketDataHub del processo (una connessione condivisa da tutti i
+    simboli) e aggrega in barre di N minuti.
+    Chiama `on_bar_agg( Bar )` alla CHIUSURA della candela aggregata (t = inizio, end = fine).
     """
     def __init__(
         self,
         symbol: str,
         timeframe_minutes: int,
-        on_bar_agg: Callable[[Dict[str, Any]], None],
+        on_bar_agg: Callable[[Bar], None],
         api_key: Optional[str] = None,
         api_secret: Optional[str] = None,
+        hub: Optional[MarketDataHub] = None,
     ):
         if timeframe_minutes < 1:
             raise ValueError("timeframe_minutes deve essere >= 1")
 
         self.symbol = symbol
+        self._symbol = symbol.upper().replace("_", "/")
         self.tf = timeframe_minutes
         self.on_bar_agg = on_bar_agg
 
-        self._adapter = AlpacaBars1mAdapter(
-            symbol=symbol,
-            on_bar_callback=self._on_bar_1m,
-            api_key=api_key,
-            api_secret=api_secret,
-        )
+        # api_key/api_secret: solo per compatibilità, le credenziali sono quelle della sorgente dell'hub
+        self._hub = hub
+        self._handle = None
 
         self._lock = threading.Lock()
-        self._bucket_start: Optional[datetime] = None
-        self._o = self._h = self._l = self._c = None
-        self._v = 0.0
+        # stessa bucket math del resampler del backtest (bucket allineati all'epoch UTC)
+        self._bucketer = BarBucketer(timeframe_minutes)
 
     def start(self):
-        self._adapter.start()
+        if self._handle is None:
+            hub = self._hub or get_market_data_hub()
+            self._handle = hub.subscribe(self.symbol, self._on_bar_1m)
+            self._hub = hub
 
     def stop(self):
-        self._adapter.stop()
+        if self._handle is not None:
+            self._hub.unsubscribe(self._handle)
+            self._handle = None
 
     # ---- handler interno su barre 1m Alpaca ----
-    def _on_bar_1m(self, bar: Dict[str, Any]):
+    def _on_bar_1m(self, bar):
         """
-        bar: {"timestamp": iso, "open":..., "high":..., "low":..., "close":..., "volume":...}
+        bar: Bar 1m dall'hub (o dict {"timestamp": iso, "open":..., ..., "volume":...}).
         """
-        ts = _parse_ts(bar["timestamp"])
-        o = float(bar["open"]); h = float(bar["high"])
-        l = float(bar["low"]);  c = float(bar["close"]); v = float(bar.get("volume", 0.0))
-
-        # bucket di aggregazione: floor all'inizio minuto, poi blocchi da tf minuti
-        t0 = _floor_to_minute(ts)
-        bucket_start = t0 - timedelta(minutes=(t0.minute % self.tf))
+        if not isinstance(bar, Bar):
+            bar = Bar.from_dict(bar)
+        rx = bar.rx_ns
+        if rx is not None:
+            TRACER.record(self.symbol, "aggregate", rx)
 
         with self._lock:
-            # se cambiamo bucket, chiudiamo il precedente (se esiste)
-            if self._bucket_start is not None and bucket_start != self._bucket_start:
-                self._emit_current_locked(end_time=self._bucket_start + timedelta(minutes=self.tf))
-
-                # reset per nuovo bucket
-                self._bucket_start = bucket_start
-                self._o = o; self._h = h; self._l = l; self._c = c; self._v = v
-            else:
-                # stesso bucket (o primo)
-                if self._bucket_start is None:
-                    self._bucket_start = bucket_start
-                    self._o = o; self._h = h; self._l = l; self._c = c; self._v = v
-                else:
-                    self._h = max(self._h, h)
-                    self._l = min(self._l, l)
-                    self._c = c
-                    self._v += v
-
-            # NOTA: qui NON emettiamo ancora; emettiamo alla PRIMA 1m bar del bucket successivo
+            # la candela precedente si chiude alla PRIMA 1m bar del bucket successivo
             # (quindi la candela è "consuntivata"). In alternativa potresti usare timer.
-
-    def _emit_current_locked(self, end_time: datetime):
-        if self._bucket_start is None:
-            return
-        payload = {
-            "symbol": self.symbol.upper().replace("_","/"),
-            "timeframe": f"{self.tf}Min",
-            "start": self._bucket_start.isoformat(),
-            "end": end_time.isoformat(),
-            "open": self._o,
-            "high": self._h,
-            "low": self._l,
-            "close": self._c,
-            "volume": self._v,
-        }
+            closed = self._bucketer.add(bar.t, bar.o, bar.h, bar.l, bar.c, bar.v)
+            if closed is not None:
+                self._emit_locked(closed, rx)
+
+    def _emit_locked(self, closed, rx_ns=None):
+        start, o, h, l, c, v = closed
+        # la candela parte quando arriva la 1m che la chiude: la traccia è quella barra
+        payload = Bar(self._symbol, start, o, h, l, c, v, tf_ns=self._bucketer.tf_ns, rx_ns=rx_ns)
         # callback utente
         try:
             self.on_bar_agg(payload)
@@ -109,6 +81,6 @@ class AggregatingBarStream:
     # opzionale: chiama per flush finale quando stoppi lo stream
     def flush(self):
         with self._lock:
-            if self._bucket_start is not None:
-                self._emit_current_locked(self._bucket_start + timedelta(minutes=self.tf))
-                self._bucket_start = None
+            closed = self._bucketer.flush()
+            if closed is not None:
+                self._emit_locked(closed)
@@ -0,0 +1,175 @@
+# trading_system/utils/bar_csv.py
+from __future__ import annotations
+import os
+import csv
+from typing import Dict, List
+
+import numpy as np
+
+from trading_system.utils.bars import BarArrays, parse_iso, to_ns, iso_array_to_ns, ns_array_to_iso
+
+# ===================== CSV (formato di import/export) =====================
+
+def read_csv_rows(path: str) -> List[dict]:
+    """Lettura riga per riga -> [{t: iso, o, h, l, c, v}, ...] ordinata per t."""
+    bars: List[dict] = []
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        rdr = csv.DictReader(f)
+        def pick(row: dict, keys: List[str], default=None):
+            for k in keys:
+                if k in row and row[k] not in (None, ""):
+                    return row[k]
+            return default
+        for row in rdr:
+            t = pick(row, ["t","timestamp","time","datetime","date"])
+            o = pick(row, ["o","open","Open"])
+            h = pick(row, ["h","high","High"])
+            l = pick(row, ["l","low","Low"])
+            c = pick(row, ["c","close","Close","adj_close"])
+            v = pick(row, ["v","volume","Volume"], "0")
+            if t is None or o is None or h is None or l is None or c is None:
+                continue
+            try:
+                bars.append({
+                    "t": parse_iso(str(t)).isoformat(),
+                    "o": float(o), "h": float(h), "l": float(l), "c": float(c), "v": float(v or 0.0)
+                })
+            except Exception:
+                continue
+    bars.sort(key=lambda x: x["t"])
+    return bars
+
+
+# chiavi accettate per ciascuna colonna, in ordine di priorità
+_KEYS = {
+    "t": ["t","timestamp","time","datetime","date"],
+    "o": ["o","open","Open"],
+    "h": ["h","high","High"],
+    "l": ["l","low","Low"],
+    "c": ["c","close","Close","adj_close"],
+    "v": ["v","volume","Volume"],
+}
+
+
+def _detect_layout(path: str) -> Dict[str, str]:
+    """Legge solo l'intestazione e sceglie (una volta per file) la colonna sorgente di t/o/h/l/c/v."""
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        header = next(csv.reader(f), [])
+    layout: Dict[str, str] = {}
+    for col, keys in _KEYS.items():
+        for k in keys:
+            if k in header:
+                layout[col] = k
+                break
+    missing = [c for c in ("t","o","h","l","c") if c not in layout]
+    if missing:
+        raise ValueError(f"CSV {path}: colonne mancanti {missing} (header={header})")
+    return layout
+
+
+def _read_columns_pandas(path: str, layout: Dict[str, str]) -> Dict[str, np.ndarray]:
+    import pandas as pd
+    src = list(dict.fromkeys(layout.values()))
+    # i numerici li converte direttamente il parser C; t resta stringa
+    df = pd.read_csv(path, usecols=src, dtype={layout["t"]: str}, engine="c")
+    t_col = df[layout["t"]]
+    cols: Dict[str, np.ndarray] = {}
+    try:
+        if t_col.isna().any():
+            raise ValueError("timestamp mancanti")
+        # caso tipico (tutti UTC con 'Z' o '+00:00'): parsing numpy a larghezza fissa
+        cols["t"] = iso_array_to_ns(t_col.to_numpy(dtype=str))
+        cols["_t_ok"] = np.ones(len(t_col), dtype=bool)
+    except Exception:
+        try:
+            ts = pd.to_datetime(t_col, utc=True, errors="coerce", format="ISO8601")
+        except (TypeError, ValueError):
+            ts = pd.to_datetime(t_col, utc=True, errors="coerce")
+        ts = ts.dt.tz_convert(None).to_numpy(dtype="datetime64[ns]")
+        cols["t"] = ts.view(np.int64)
+        cols["_t_ok"] = ~np.isnat(ts)
+    for col in ("o","h","l","c","v"):
+        if col in layout:
+            s = df[layout[col]]
+            if s.dtype != np.float64:
+                s = pd.to_numeric(s, errors="coerce")
+            cols[col] = s.to_numpy(dtype=np.float64)
+    return cols
+
+
+def _read_columns_numpy(path: str, layout: Dict[str, str]) -> Dict[str, np.ndarray]:
+    # senza pandas: una sola passata di csv.reader sulle colonne scelte, poi conversioni vettoriali
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        rdr = csv.reader(f)
+        header = next(rdr)
+        idx = {col: header.index(k) for col, k in layout.items()}
+        order = list(idx)
+        raw = list(zip(*(tuple(row[idx[c]] if idx[c] < len(row) else "" for c in order) for row in rdr)))
+    if not raw:
+        raw = [() for _ in order]
+    data = dict(zip(order, raw))
+    t_str = np.asarray(data["t"], dtype=str)
+    t_ok = np.char.str_len(t_str) > 0
+    cols = {"t": np.zeros(len(t_str), dtype=np.int64), "_t_ok": t_ok}
+    try:
+        cols["t"][t_ok] = iso_array_to_ns(t_str[t_ok])
+    except Exception:
+        # timestamp non ISO: ricade sul parsing tollerante, riga per riga
+        for i in np.flatnonzero(t_ok):
+            try:
+                cols["t"][i] = to_ns(str(t_str[i]))
+            except Exception:
+                t_ok[i] = False
+    for col in ("o","h","l","c","v"):
+        if col in data:
+            s = np.asarray(data[col], dtype=str)
+            out = np.full(len(s), np.nan)
+            ok = np.char.str_len(s) > 0
+            try:
+                out[ok] = s[ok].astype(np.float64)
+            except ValueError:
+                for i in np.flatnonzero(ok):
+                    try:
+                        out[i] = float(s[i])
+                    except ValueError:
+                        pass
+            cols[col] = out
+    return cols
+
+
+def read_csv_bars(path: str, bulk: bool = True) -> BarArrays:
+    """
+    CSV -> BarArrays (colonne ordinate per timestamp).
+    bulk=True: layout delle colonne rilevato una volta dall'intestazione, parsing vettoriale
+    (pandas se installato, altrimenti numpy), nessun oggetto Python per riga.
+    Le righe con t/o/h/l/c mancanti o non validi vengono scartate, v mancante vale 0.
+    bulk=False: vecchio percorso riga per riga (read_csv_rows).
+    """
+    if not bulk:
+        return BarArrays.from_dicts(read_csv_rows(path))
+    layout = _detect_layout(path)
+    try:
+        cols = _read_columns_pandas(path, layout)
+    except ImportError:
+        cols = _read_columns_numpy(path, layout)
+    ok = cols.pop("_t_ok")
+    for col in ("o","h","l","c"):
+        ok &= ~np.isnan(cols[col])
+    v = cols.get("v")
+    v = np.zeros(len(ok)) if v is None else np.nan_to_num(v, nan=0.0)
+    bars = BarArrays(cols["t"][ok], cols["o"][ok], cols["h"][ok], cols["l"][ok], cols["c"][ok], v[ok])
+    return bars.sorted()
+
+
+def write_csv_bars(path: str, bars: BarArrays, append: bool = False) -> None:
+    """BarArrays -> CSV con intestazione t,o,h,l,c,v (t ISO UTC); append=True accoda senza intestazione."""
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    ts = ns_array_to_iso(bars.t).tolist()
+    append = append and os.path.exists(path)
+    with open(path, "a" if append else "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        if not append:
+            w.writerow(["t","o","h","l","c","v"])
+        w.writerows(zip(ts, bars.o.tolist(), bars.h.tolist(), bars.l.tolist(), bars.c.tolist(), bars.v.tolist()))
@@ -0,0 +1,219 @@
+# trading_system/utils/bar_store.py
+from __future__ import annotations
+import os
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from trading_system.utils.bars import BarArrays, merge_bars, time_bounds
+
+STORE_ROOT = os.path.join("data", "store")
+
+_DTYPES = {"t": np.dtype("<i8"), "o": np.dtype("<f8"), "h": np.dtype("<f8"),
+           "l": np.dtype("<f8"), "c": np.dtype("<f8"), "v": np.dtype("<f8")}
+_EXT = {"t": "i8", "o": "f8", "h": "f8", "l": "f8", "c": "f8", "v": "f8"}
+
+
+def store_symbol(sym: str) -> str:
+    # nome cartella: BTC-USD (accetta BTC/USD, btc_usd, BTC-USD)
+    return sym.strip().upper().replace("/", "-").replace("_", "-")
+
+
+def _fsync_dir(path: str) -> None:
+    if os.name == "nt":
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class BarStore:
+    """
+    Store locale colonnare delle barre, una cartella per simbolo/timeframe:
+
+        data/store/<TF>m/<SYMBOL>/meta.json
+        data/store/<TF>m/<SYMBOL>/{t,o,h,l,c,v}.<gen>.{i8,f8}
+
+    Ogni colonna è un file binario little-endian (int64 epoch-ns per t, float64 per o/h/l/c/v)
+    letto con np.memmap: il caricamento non copia nulla, le pagine vengono lette dal SO
+    solo quando servono. meta.json è l'unico punto di commit (scritto con replace atomico):
+    contiene il numero di righe valide e la "generazione" corrente dei file colonna, quindi
+    un crash a metà scrittura lascia sempre visibile l'ultima versione consistente.
+    """
+    def __init__(self, root: str = STORE_ROOT):
+        self.root = root
+
+    # ---------- path / meta ----------
+    def path(self, symbol: str, timeframe_minutes: int) -> str:
+        return os.path.join(self.root, f"{int(timeframe_minutes)}m", store_symbol(symbol))
+
+    def _col_path(self, base: str, col: str, gen: int) -> str:
+        return os.path.join(base, f"{col}.{gen}.{_EXT[col]}")
+
+    def read_meta(self, symbol: str, timeframe_minutes: int) -> Optional[dict]:
+        p = os.path.join(self.path(symbol, timeframe_minutes), "meta.json")
+        if not os.path.isfile(p):
+            return None
+        with open(p, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_meta(self, base: str, meta: dict) -> None:
+        tmp = os.path.join(base, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(base, "meta.json"))
+        _fsync_dir(base)
+
+    def update_meta(self, symbol: str, timeframe_minutes: int, **fields) -> None:
+        """Aggiorna campi accessori del meta (es. sorgente CSV) senza toccare i dati."""
+        base = self.path(symbol, timeframe_minutes)
+        meta = self.read_meta(symbol, timeframe_minutes)
+        if meta is None:
+            raise FileNotFoundError(f"Store non trovato: {base}")
+        meta.update(fields)
+        self._write_meta(base, meta)
+
+    def exists(self, symbol: str, timeframe_minutes: int) -> bool:
+        return self.read_meta(symbol, timeframe_minutes) is not None
+
+    def rows(self, symbol: str, timeframe_minutes: int) -> int:
+        meta = self.read_meta(symbol, timeframe_minutes)
+        return int(meta["rows"]) if meta else 0
+
+    def symbols(self, timeframe_minutes: int) -> List[str]:
+        d = os.path.join(self.root, f"{int(timeframe_minutes)}m")
+        if not os.path.isdir(d):
+            return []
+        return sorted(s for s in os.listdir(d) if os.path.isfile(os.path.join(d, s, "meta.json")))
+
+    # ---------- lettura ----------
+    def load(self, symbol: str, timeframe_minutes: int,
+             start_ns: Optional[int] = None, end_ns: Optional[int] = None) -> BarArrays:
+        """
+        Mappa in memoria le colonne (read-only, zero-copy). Store assente -> BarArrays vuoto.
+        Con start_ns/end_ns (estremi inclusi) la selezione è fatta con due ricerche binarie sulla
+        colonna t e ogni colonna viene mappata solo sul range di byte necessario.
+        """
+        meta = self.read_meta(symbol, timeframe_minutes)
+        if not meta or int(meta["rows"]) == 0:
+            return BarArrays.empty()
+        base = self.path(symbol, timeframe_minutes)
+        n, gen = int(meta["rows"]), int(meta["gen"])
+        lo, hi = 0, n
+        if start_ns is not None or end_ns is not None:
+            t_all = np.memmap(self._col_path(base, "t", gen), dtype=_DTYPES["t"], mode="r", shape=(n,))
+            lo, hi = time_bounds(t_all, start_ns, end_ns)
+            del t_all
+            if hi <= lo:
+                return BarArrays.empty()
+        cols: Dict[str, np.ndarray] = {}
+        for col, dt in _DTYPES.items():
+            cols[col] = np.memmap(self._col_path(base, col, gen), dtype=dt, mode="r",
+                                  offset=lo * dt.itemsize, shape=(hi - lo,))
+        return BarArrays(**cols)
+
+    # ---------- scrittura ----------
+    def write(self, symbol: str, timeframe_minutes: int, bars: BarArrays, **meta_fields) -> None:
+        """Sostituisce il contenuto (nuova generazione di file + commit atomico del meta)."""
+        bars = bars.sorted()
+        base = self.path(symbol, timeframe_minutes)
+        os.makedirs(base, exist_ok=True)
+        old = self.read_meta(symbol, timeframe_minutes)
+        gen = int(old["gen"]) + 1 if old else 0
+        for col, dt in _DTYPES.items():
+            with open(self._col_path(base, col, gen), "wb") as f:
+                f.write(np.ascontiguousarray(getattr(bars, col), dtype=dt).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        meta = {k: v for k, v in (old or {}).items() if k not in ("rows", "gen")}
+        meta.update(meta_fields)
+        meta.update({"version": 1, "symbol": store_symbol(symbol), "timeframe_minutes": int(timeframe_minutes),
+                     "rows": len(bars), "gen": gen})
+        self._write_meta(base, meta)
+        if old:
+            self._remove_gen(base, int(old["gen"]))
+
+    def append(self, symbol: str, timeframe_minutes: int, bars: BarArrays) -> None:
+        """
+        Aggiunge barre in coda. Se sono tutte successive all'ultima salvata scrive solo i byte nuovi
+        in append; altrimenti fa merge+dedup e riscrive una nuova generazione.
+        """
+        if not len(bars):
+            return
+        bars = bars.sorted()
+        meta = self.read_meta(symbol, timeframe_minutes)
+        if not meta or int(meta["rows"]) == 0:
+            self.write(symbol, timeframe_minutes, bars)
+            return
+        cur = self.load(symbol, timeframe_minutes)
+        if int(bars.t[0]) <= int(cur.t[-1]):
+            merged = merge_bars(cur, bars)
+            del cur
+            self.write(symbol, timeframe_minutes, merged)
+            return
+        del cur
+        base = self.path(symbol, timeframe_minutes)
+        n, gen = int(meta["rows"]), int(meta["gen"])
+        for col, dt in _DTYPES.items():
+            with open(self._col_path(base, col, gen), "r+b") as f:
+                # eventuali byte orfani di un append interrotto vengono sovrascritti
+                f.truncate(n * dt.itemsize)
+                f.seek(n * dt.itemsize)
+                f.write(np.ascontiguousarray(getattr(bars, col), dtype=dt).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        meta["rows"] = n + len(bars)
+        self._write_meta(base, meta)
+
+    def merge(self, symbol: str, timeframe_minutes: int, bars: BarArrays) -> None:
+        self.append(symbol, timeframe_minutes, bars)
+
+    def _remove_gen(self, base: str, gen: int) -> None:
+        for col in _DTYPES:
+            try:
+                os.remove(self._col_path(base, col, gen))
+            except OSError:
+                # su Windows un file ancora mappato non si può cancellare: verrà ignorato
+                pass
+
+    # ---------- import / export CSV ----------
+    def import_csv(self, csv_path: str, symbol: str, timeframe_minutes: int) -> BarArrays:
+        """Importa un CSV nello store (solo se il CSV è cambiato dall'ultimo import), in merge con i dati presenti."""
+        st = os.stat(csv_path)
+        source = {"path": os.path.abspath(csv_path), "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+        meta = self.read_meta(symbol, timeframe_minutes)
+        if meta and meta.get("source") == source:
+            return self.load(symbol, timeframe_minutes)
+        from trading_system.utils.bar_csv import read_csv_bars
+        from trading_system.utils.bar_sync import merge_intervals
+        bars = read_csv_bars(csv_path)
+        # merge con quanto già nello store (es. barre scaricate da bar_sync): a parità di
+        # timestamp vince il CSV, la coverage è l'unione di quella salvata e del file
+        coverage = [(int(bars.t[0]), int(bars.t[-1]))] if len(bars) else []
+        if meta and int(meta.get("rows", 0)) > 0:
+            cur = self.load(symbol, timeframe_minutes)
+            if "coverage" in meta:
+                coverage += [(int(a), int(b)) for a, b in meta["coverage"]]
+            else:
+                coverage.append((int(cur.t[0]), int(cur.t[-1])))
+            bars = merge_bars(cur, bars).copy()
+            del cur
+        elif meta:
+            coverage += [(int(a), int(b)) for a, b in meta.get("coverage", [])]
+        self.write(symbol, timeframe_minutes, bars, source=source,
+                   coverage=[list(x) for x in merge_intervals(coverage)])
+        return self.load(symbol, timeframe_minutes)
+
+    def export_csv(self, symbol: str, timeframe_minutes: int, csv_path: str) -> int:
+        from trading_system.utils.bar_csv import write_csv_bars
+        bars = self.load(symbol, timeframe_minutes)
+        write_csv_bars(csv_path, bars)
+        return len(bars)
@@ -0,0 +1,325 @@
+# trading_system/utils/bar_sync.py
+"""
+Sincronizzazione incrementale dello storico locale (BarStore) con Alpaca.
+
+Per ogni simbolo/timeframe il meta dello store tiene la lista degli intervalli temporali
+già scaricati ("coverage", estremi inclusi in epoch-ns). Una sync chiede all'API solo
+i buchi tra la coverage e il range richiesto, fa merge+dedup nello store e aggiorna la coverage:
+un refresh notturno scarica solo la coda nuova.
+
+Il download è in streaming: ogni pagina ricevuta viene scritta subito su disco in un segmento
+per shard (data/store/_pending/...), con la coverage del segmento aggiornata pagina per pagina.
+Quando tutti gli shard di un simbolo sono completi i segmenti vengono fusi nello store principale
+in un'unica append/merge. Un download interrotto lascia i segmenti già scritti: alla sync successiva
+vengono recuperati e si scarica solo il resto.
+
+    python -m trading_system.utils.bar_sync --symbols BTC/USD ETH/USD --tf 1 --days 30
+"""
+from __future__ import annotations
+import os
+import time
+import shutil
+import argparse
+import threading
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+from trading_system.utils.bars import BarArrays, NS_PER_MIN, to_ns, ns_to_iso, concat_bars
+from trading_system.utils.bar_store import BarStore, STORE_ROOT, store_symbol
+
+Interval = Tuple[int, int]
+
+
+# ===================== ARITMETICA INTERVALLI (chiusi, int ns) =====================
+
+def merge_intervals(intervals: List[Interval]) -> List[Interval]:
+    """Unisce intervalli sovrapposti o adiacenti (a distanza di 1 ns)."""
+    out: List[Interval] = []
+    for s, e in sorted((int(s), int(e)) for s, e in intervals if e >= s):
+        if out and s <= out[-1][1] + 1:
+            out[-1] = (out[-1][0], max(out[-1][1], e))
+        else:
+            out.append((s, e))
+    return out
+
+
+def missing_intervals(covered: List[Interval], start_ns: int, end_ns: int,
+                      timeframe_minutes: int = 1) -> List[Interval]:
+    """
+    Parti di [start_ns, end_ns] non coperte. I buchi che non contengono alcun inizio
+    di barra del timeframe (es. pochi secondi) vengono ignorati: non c'è nulla da scaricare.
+    """
+    tf_ns = int(timeframe_minutes) * NS_PER_MIN
+    gaps: List[Interval] = []
+    cur = start_ns
+    for s, e in merge_intervals(covered):
+        if e < cur:
+            continue
+        if s > end_ns:
+            break
+        if s > cur:
+            gaps.append((cur, s - 1))
+        cur = max(cur, e + 1)
+    if cur <= end_ns:
+        gaps.append((cur, end_ns))
+    # tiene solo i buchi che contengono un multiplo di tf
+    return [(s, e) for s, e in gaps if e - e % tf_ns >= s]
+
+
+# ===================== COVERAGE NELLO STORE =====================
+
+def get_coverage(store: BarStore, symbol: str, timeframe_minutes: int) -> List[Interval]:
+    """
+    Coverage salvata nel meta; per store senza coverage (es. importati da CSV)
+    si assume coperto l'intervallo tra la prima e l'ultima barra presenti.
+    """
+    meta = store.read_meta(symbol, timeframe_minutes)
+    if not meta or int(meta.get("rows", 0)) == 0:
+        return [(int(s), int(e)) for s, e in (meta or {}).get("coverage", [])]
+    if "coverage" in meta:
+        return [(int(s), int(e)) for s, e in meta["coverage"]]
+    bars = store.load(symbol, timeframe_minutes)
+    return [(int(bars.t[0]), int(bars.t[-1]))]
+
+
+def add_coverage(store: BarStore, symbol: str, timeframe_minutes: int, interval: Interval) -> None:
+    cov = merge_intervals(get_coverage(store, symbol, timeframe_minutes) + [interval])
+    store.update_meta(symbol, timeframe_minutes, coverage=[list(x) for x in cov])
+
+
+def _ensure_store(store: BarStore, symbol: str, timeframe_minutes: int) -> None:
+    if not store.exists(symbol, timeframe_minutes):
+        store.write(symbol, timeframe_minutes, BarArrays.empty(), coverage=[])
+
+
+# ===================== SEGMENTI DI DOWNLOAD (streaming su disco) =====================
+
+PENDING_DIR = "_pending"
+
+
+def _segment_prefix(symbol: str, timeframe_minutes: int) -> str:
+    return f"{store_symbol(symbol)}_{int(timeframe_minutes)}m_"
+
+
+def _segment_store(store: BarStore, symbol: str, timeframe_minutes: int, start_ns: int) -> BarStore:
+    # ogni shard ha il suo mini-store: data/store/_pending/<SYM>_<TF>m_<start_ns>/<TF>m/<SYM>/
+    name = f"{_segment_prefix(symbol, timeframe_minutes)}{int(start_ns)}"
+    return BarStore(os.path.join(store.root, PENDING_DIR, name))
+
+
+def _pending_segments(store: BarStore, symbol: str, timeframe_minutes: int) -> List[BarStore]:
+    d = os.path.join(store.root, PENDING_DIR)
+    prefix = _segment_prefix(symbol, timeframe_minutes)
+    if not os.path.isdir(d):
+        return []
+    names = [n for n in os.listdir(d) if n.startswith(prefix) and n[len(prefix):].isdigit()]
+    names.sort(key=lambda n: int(n[len(prefix):]))
+    return [BarStore(os.path.join(d, n)) for n in names]
+
+
+def commit_segments(store: BarStore, symbol: str, timeframe_minutes: int,
+                    segments: Optional[List[BarStore]] = None) -> int:
+    """
+    Fonde i segmenti di un simbolo nello store principale (una sola append, o merge se si
+    sovrappongono a dati esistenti), aggiunge la loro coverage e li rimuove.
+    Idempotente: un crash a metà lascia segmenti che verranno rifusi (dedup) la volta dopo.
+    Ritorna il numero di barre fuse.
+    """
+    if segments is None:
+        segments = _pending_segments(store, symbol, timeframe_minutes)
+    segments = [seg for seg in segments if seg.exists(symbol, timeframe_minutes)]
+    if not segments:
+        return 0
+    _ensure_store(store, symbol, timeframe_minutes)
+    n = sum(seg.rows(symbol, timeframe_minutes) for seg in segments)
+    bars = concat_bars([seg.load(symbol, timeframe_minutes) for seg in segments])
+    if len(bars):
+        store.append(symbol, timeframe_minutes, bars)
+    cov = get_coverage(store, symbol, timeframe_minutes)
+    for seg in segments:
+        cov += get_coverage(seg, symbol, timeframe_minutes)
+    store.update_meta(symbol, timeframe_minutes, coverage=[list(x) for x in merge_intervals(cov)])
+    del bars
+    for seg in segments:
+        shutil.rmtree(seg.root, ignore_errors=True)
+    return n
+
+
+def recover_pending(store: BarStore, symbol: str, timeframe_minutes: int) -> int:
+    """Recupera i segmenti lasciati da un download interrotto. Ritorna le barre recuperate."""
+    segments = _pending_segments(store, symbol, timeframe_minutes)
+    if not segments:
+        return 0
+    n = commit_segments(store, symbol, timeframe_minutes, segments)
+    print(f"[Sync] {symbol} {timeframe_minutes}m: recuperate {n} barre da {len(segments)} segmenti interrotti")
+    return n
+
+
+class StoreSink:
+    """
+    Sink per BarDownloader.run_tasks: scrive ogni pagina nel segmento del suo shard appena arriva
+    (append in coda + commit del meta) e ne estende la coverage fino all'ultima barra ricevuta,
+    dato che le pagine di un singolo simbolo arrivano in ordine temporale. A fine shard la coverage
+    del segmento diventa l'intero shard; quando tutti gli shard di un simbolo sono chiusi i segmenti
+    vengono fusi nello store principale. In memoria resta solo la pagina corrente di ogni worker.
+    """
+    def __init__(self, store: BarStore, timeframe_minutes: int, tasks: List[Tuple[List[str], str, str]]):
+        self.store = store
+        self.tf = int(timeframe_minutes)
+        self.received: Dict[str, int] = Counter()
+        self._remaining = Counter(sym for syms, _, _ in tasks for sym in syms)
+        self._segments: Dict[str, List[Tuple[int, BarStore]]] = {}
+        self._lock = threading.Lock()
+
+    def _segment(self, symbol: str, start_iso: str) -> BarStore:
+        return _segment_store(self.store, symbol, self.tf, to_ns(start_iso))
+
+    def on_page(self, task, bars_by_symbol: Dict[str, list], next_page_token: Optional[str]) -> None:
+        syms, start_iso, _ = task
+        for sym in syms:
+            arr = bars_by_symbol.get(sym) or []
+            if not arr:
+                continue
+            b = BarArrays.from_dicts(arr)
+            seg = self._segment(sym, start_iso)
+            seg.append(sym, self.tf, b)
+            seg.update_meta(sym, self.tf, coverage=[[to_ns(start_iso), int(b.t[-1])]])
+            with self._lock:
+                self.received[sym] += len(b)
+
+    def on_task_done(self, task) -> None:
+        syms, start_iso, end_iso = task
+        for sym in syms:
+            seg = self._segment(sym, start_iso)
+            # shard completo (anche vuoto: es. mercato fermo) -> coperto per intero
+            _ensure_store(seg, sym, self.tf)
+            seg.update_meta(sym, self.tf, coverage=[[to_ns(start_iso), to_ns(end_iso)]])
+            with self._lock:
+                self._segments.setdefault(sym, []).append((to_ns(start_iso), seg))
+                self._remaining[sym] -= 1
+                done = self._remaining[sym] == 0
+            if done:
+                segs = [seg for _, seg in sorted(self._segments.pop(sym), key=lambda x: x[0])]
+                commit_segments(self.store, sym, self.tf, segs)
+
+
+def _default_downloader(**kwargs):
+    from trading_system.utils.historical_downloader import BarDownloader, DownloadProgress
+    kwargs.setdefault("progress", DownloadProgress())
+    return BarDownloader(**kwargs)
+
+
+def download_to_store(
+    tasks: List[Tuple[List[str], str, str]],
+    timeframe_minutes: int,
+    store: Optional[BarStore] = None,
+    downloader=None,
+) -> Dict[str, int]:
+    """Esegue i task di download scrivendo pagina per pagina nello store. Ritorna {simbolo: barre ricevute}."""
+    store = store or BarStore(STORE_ROOT)
+    downloader = downloader or _default_downloader()
+    sink = StoreSink(store, timeframe_minutes, tasks)
+    downloader.run_tasks(tasks, timeframe_minutes, sink)
+    return dict(sink.received)
+
+
+# ===================== SYNC =====================
+
+def sync_symbol(
+    symbol: str,
+    start_ns: int,
+    end_ns: int,
+    timeframe_minutes: int,
+    store: Optional[BarStore] = None,
+    fetcher: Optional[Callable[..., Dict[str, List[dict]]]] = None,
+    now_ns: Optional[int] = None,
+    downloader=None,
+) -> int:
+    """
+    Porta lo store di `symbol` a coprire [start_ns, end_ns] scaricando solo gli intervalli mancanti.
+    La candela ancora aperta (bucket corrente) non viene mai marcata come coperta, così la
+    prossima sync la riscarica chiusa. Ritorna il numero di barre ricevute dall'API.
+
+    Di default il download è in streaming su disco (BarDownloader + StoreSink); con `fetcher`
+    (funzione stile fetch_crypto_bars che ritorna tutto in memoria) ogni buco viene scaricato e fuso in blocco.
+    """
+    store = store or BarStore(STORE_ROOT)
+    recover_pending(store, symbol, timeframe_minutes)
+    tf_ns = int(timeframe_minutes) * NS_PER_MIN
+    now_ns = time.time_ns() if now_ns is None else now_ns
+    end_ns = min(end_ns, now_ns - now_ns % tf_ns - 1)
+    if end_ns < start_ns:
+        return 0
+
+    gaps = missing_intervals(get_coverage(store, symbol, timeframe_minutes), start_ns, end_ns, timeframe_minutes)
+    if not gaps:
+        return 0
+    print(f"[Sync] {symbol} {timeframe_minutes}m: {len(gaps)} intervalli mancanti "
+          f"({', '.join(f'{ns_to_iso(s)} -> {ns_to_iso(e)}' for s, e in gaps[:3])}{' …' if len(gaps) > 3 else ''})")
+
+    # all'API si chiedono solo gli inizi di barra interni al buco
+    ranges = [(ns_to_iso(s + (-s) % tf_ns), ns_to_iso(e - e % tf_ns)) for s, e in gaps]
+
+    if fetcher is None:
+        downloader = downloader or _default_downloader()
+        from trading_system.utils.historical_downloader import shard_range, _norm_symbol
+        sym = _norm_symbol(symbol)
+        tasks = [([sym], a, b) for s, e in ranges for a, b in shard_range(s, e, downloader.shard_days)]
+        got = download_to_store(tasks, timeframe_minutes, store=store, downloader=downloader)
+        return sum(got.values())
+
+    _ensure_store(store, symbol, timeframe_minutes)
+    received = 0
+    for (s, e), (s_iso, e_iso) in zip(gaps, ranges):
+        res = fetcher(symbols=[symbol], start_iso=s_iso, end_iso=e_iso, timeframe_minutes=timeframe_minutes)
+        arr = next((v for k, v in (res or {}).items() if k.replace("-", "/").upper() == symbol.upper()), []) or []
+        if arr:
+            store.merge(symbol, timeframe_minutes, BarArrays.from_dicts(arr))
+            received += len(arr)
+        # intervallo chiesto e ricevuto (anche vuoto: es. mercato fermo) -> coperto
+        add_coverage(store, symbol, timeframe_minutes, (s, e))
+    return received
+
+
+def sync_bars(
+    symbols: List[str],
+    start_iso: str,
+    end_iso: str,
+    timeframe_minutes: int,
+    store: Optional[BarStore] = None,
+    fetcher: Optional[Callable[..., Dict[str, List[dict]]]] = None,
+    downloader=None,
+) -> Dict[str, int]:
+    """Sync di più simboli sullo stesso range. Ritorna {simbolo: barre ricevute}."""
+    store = store or BarStore(STORE_ROOT)
+    if fetcher is None and downloader is None:
+        downloader = _default_downloader()
+    start_ns, end_ns = to_ns(start_iso), to_ns(end_iso)
+    return {
+        sym: sync_symbol(sym, start_ns, end_ns, timeframe_minutes, store=store, fetcher=fetcher,
+                         downloader=downloader)
+        for sym in symbols
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--symbols", nargs="+", required=True)
+    ap.add_argument("--tf", type=int, default=1, help="timeframe in minuti")
+    ap.add_argument("--start", default=None, help="ISO start (default: ora - days)")
+    ap.add_argument("--end", default=None, help="ISO end (default: ora)")
+    ap.add_argument("--days", type=int, default=7)
+    ap.add_argument("--store", default=STORE_ROOT)
+    args = ap.parse_args(argv)
+
+    now = time.time_ns()
+    start = args.start or ns_to_iso(now - args.days * 1440 * NS_PER_MIN)
+    end = args.end or ns_to_iso(now)
+    got = sync_bars([s.upper().replace("_", "/") for s in args.symbols], start, end, args.tf,
+                    store=BarStore(args.store))
+    for sym, n in got.items():
+        print(f"[Sync] {sym}: +{n} barre")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+# trading_system/utils/bars.py
+from __future__ import annotations
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+# ===================== TIMESTAMP (epoch-ns int64) =====================
+
+NS_PER_SEC = 1_000_000_000
+NS_PER_MIN = 60 * NS_PER_SEC
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def parse_iso(ts: str) -> datetime:
+    """Parsing ISO tollerante (Z, offset, 'YYYY-MM-DD HH:MM:SS', 'YYYY-MM-DD') -> datetime UTC."""
+    ts = ts.strip()
+    if ts.endswith("Z"):
+        ts = ts[:-1] + "+00:00"
+    try:
+        dt = datetime.fromisoformat(ts)
+    except Exception:
+        dt = None
+        for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
+            try:
+                dt = datetime.strptime(ts, fmt)
+                break
+            except Exception:
+                dt = None
+        if dt is None:
+            raise
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def dt_to_ns(dt: datetime) -> int:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    delta = dt - _EPOCH
+    return (delta.days * 86_400 + delta.seconds) * NS_PER_SEC + delta.microseconds * 1_000
+
+
+def to_ns(value) -> int:
+    """Converte str ISO / datetime / int ns in epoch-ns int."""
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, datetime):
+        return dt_to_ns(value)
+    return dt_to_ns(parse_iso(str(value)))
+
+
+def ns_to_dt(ns: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=int(ns) // 1_000)
+
+
+def ns_to_iso(ns: int) -> str:
+    # stesso formato di datetime.isoformat() in UTC: 2025-01-01T00:00:00+00:00
+    return ns_to_dt(ns).isoformat()
+
+
+def iso_array_to_ns(values: Sequence[str]) -> np.ndarray:
+    """
+    Parsing vettoriale di timestamp ISO -> int64 epoch-ns.
+    Gestisce il suffisso 'Z' / '+00:00' (tipico di Alpaca e dei nostri CSV) senza oggetti datetime per riga;
+    per offset diversi ricade sul parsing riga per riga.
+    """
+    arr = np.asarray(values, dtype=str)
+    if arr.size == 0:
+        return np.empty(0, dtype=np.int64)
+    arr = np.char.strip(arr)
+    z = np.char.endswith(arr, "Z")
+    utc = np.char.endswith(arr, "+00:00")
+    if np.all(z) or np.all(utc):
+        suffix = 1 if z[0] else 6
+        lens = np.char.str_len(arr)
+        if lens.min() == lens.max():
+            # larghezza fissa: basta troncare il dtype, niente copie per stringa
+            arr = arr.astype(f"U{int(lens[0]) - suffix}")
+        else:
+            arr = np.char.replace(arr, "Z" if z[0] else "+00:00", "")
+    elif np.all(z | utc):
+        # CSV misti 'Z' / '+00:00': entrambi sono UTC, si normalizzano senza uscire dal vettoriale
+        arr = np.char.replace(np.char.replace(arr, "+00:00", ""), "Z", "")
+    elif np.any(z | utc) or np.any(np.char.rfind(arr, "+") > 0) or np.any(np.char.rfind(arr, "-") > 10):
+        # offset non UTC: numpy li scarterebbe con un warning, serve il parsing riga per riga
+        return np.fromiter((to_ns(s) for s in values), dtype=np.int64, count=len(values))
+    try:
+        return arr.astype("datetime64[ns]").astype(np.int64)
+    except ValueError:
+        return np.fromiter((to_ns(s) for s in values), dtype=np.int64, count=len(values))
+
+
+def ns_array_to_iso(t: np.ndarray) -> np.ndarray:
+    """int64 epoch-ns -> array di stringhe ISO UTC ('...+00:00'), vettoriale."""
+    t = np.asarray(t, dtype=np.int64)
+    unit = "s" if t.size == 0 or not np.any(t % NS_PER_SEC) else "us"
+    s = np.datetime_as_string(t.view("datetime64[ns]"), unit=unit)
+    return np.char.add(s, "+00:00")
+
+
+def time_bounds(t: np.ndarray, start_ns: Optional[int] = None, end_ns: Optional[int] = None):
+    """Indici [lo, hi) di start_ns <= t <= end_ns su una colonna ordinata: due ricerche binarie."""
+    lo = 0 if start_ns is None else int(np.searchsorted(t, start_ns, side="left"))
+    hi = len(t) if end_ns is None else int(np.searchsorted(t, end_ns, side="right"))
+    return lo, max(lo, hi)
+
+
+# ===================== CONTENITORE COLONNARE =====================
+
+class BarArrays:
+    """
+    Serie di barre OHLCV in formato colonnare: un int64 epoch-ns per il timestamp
+    e un float64 per ciascuna colonna o/h/l/c/v. Le colonne possono essere viste
+    su file memory-mapped (vedi BarStore): nessuna copia finché non si modifica.
+    """
+    __slots__ = ("t", "o", "h", "l", "c", "v")
+
+    COLUMNS = ("t", "o", "h", "l", "c", "v")
+
+    def __init__(self, t, o, h, l, c, v=None):
+        self.t = np.asarray(t, dtype=np.int64)
+        self.o = np.asarray(o, dtype=np.float64)
+        self.h = np.asarray(h, dtype=np.float64)
+        self.l = np.asarray(l, dtype=np.float64)
+        self.c = np.asarray(c, dtype=np.float64)
+        self.v = np.zeros(len(self.t), dtype=np.float64) if v is None else np.asarray(v, dtype=np.float64)
+
+    @classmethod
+    def empty(cls) -> "BarArrays":
+        return cls(np.empty(0, np.int64), *(np.empty(0, np.float64) for _ in range(5)))
+
+    @classmethod
+    def from_dicts(cls, rows: Iterable[dict]) -> "BarArrays":
+        """Da lista di dict {t,o,h,l,c,v} (t ISO o ns), es. risposta Alpaca v1beta3."""
+        rows = list(rows)
+        if not rows:
+            return cls.empty()
+        t_raw = [r["t"] for r in rows]
+        if isinstance(t_raw[0], (int, np.integer)):
+            t = np.asarray(t_raw, dtype=np.int64)
+        else:
+            t = iso_array_to_ns(t_raw)
+        n = len(rows)
+        return cls(
+            t,
+            np.fromiter((r["o"] for r in rows), np.float64, n),
+            np.fromiter((r["h"] for r in rows), np.float64, n),
+            np.fromiter((r["l"] for r in rows), np.float64, n),
+            np.fromiter((r["c"] for r in rows), np.float64, n),
+            np.fromiter((r.get("v") or 0.0 for r in rows), np.float64, n),
+        )
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        return {k: getattr(self, k) for k in self.COLUMNS}
+
+    def __len__(self) -> int:
+        return len(self.t)
+
+    def __bool__(self) -> bool:
+        return len(self.t) > 0
+
+    def __getitem__(self, idx) -> "BarArrays":
+        # slice -> viste, maschera/indici -> copia (semantica numpy)
+        return BarArrays(self.t[idx], self.o[idx], self.h[idx], self.l[idx], self.c[idx], self.v[idx])
+
+    def __iter__(self) -> Iterator[dict]:
+        # compatibilità con il vecchio formato list-of-dict (lento: usare le colonne)
+        return iter(self.to_dicts())
+
+    def to_dicts(self) -> List[dict]:
+        ts = ns_array_to_iso(self.t).tolist()
+        return [
+            {"t": t, "o": o, "h": h, "l": l, "c": c, "v": v}
+            for t, o, h, l, c, v in zip(ts, self.o.tolist(), self.h.tolist(), self.l.tolist(),
+                                        self.c.tolist(), self.v.tolist())
+        ]
+
+    def bounds(self, start_ns: Optional[int] = None, end_ns: Optional[int] = None):
+        """Indici [lo, hi) delle barre con start_ns <= t <= end_ns."""
+        return time_bounds(self.t, start_ns, end_ns)
+
+    def between(self, start_ns: Optional[int] = None, end_ns: Optional[int] = None) -> "BarArrays":
+        """Sotto-intervallo temporale [start_ns, end_ns] come vista (nessuna copia)."""
+        lo, hi = self.bounds(start_ns, end_ns)
+        return self[lo:hi]
+
+    def copy(self) -> "BarArrays":
+        return BarArrays(*(np.array(getattr(self, k)) for k in self.COLUMNS))
+
+    def is_sorted(self) -> bool:
+        return len(self.t) < 2 or bool(np.all(self.t[1:] >= self.t[:-1]))
+
+    def sorted(self) -> "BarArrays":
+        if self.is_sorted():
+            return self
+        return self[np.argsort(self.t, kind="stable")]
+
+    def to_records(self) -> np.ndarray:
+        """Copia in un array strutturato BAR_DTYPE (48 byte per barra, righe contigue)."""
+        rec = np.empty(len(self.t), dtype=BAR_DTYPE)
+        for k in self.COLUMNS:
+            rec[k] = getattr(self, k)
+        return rec
+
+    @classmethod
+    def from_records(cls, rec: np.ndarray) -> "BarArrays":
+        """Da array strutturato BAR_DTYPE: le colonne sono viste sul buffer, nessuna copia."""
+        return cls(*(rec[k] for k in cls.COLUMNS))
+
+# ===================== BARRA SINGOLA (percorso live) =====================
+
+# una barra come record: stesso layout di BarArrays riga per riga (t int64 epoch-ns, o/h/l/c/v float64)
+BAR_DTYPE = np.dtype([("t", np.int64), ("o", np.float64), ("h", np.float64),
+                      ("l", np.float64), ("c", np.float64), ("v", np.float64)])
+
+
+class Bar:
+    """
+    Barra OHLCV del percorso live (adapter -> hub -> aggregatore -> runner): record a slot
+    con timestamp epoch-ns, senza dict né stringhe ISO per barra.
+
+    `t` è l'inizio della barra e `tf_ns` la sua durata (`end` = fine finestra). `rx_ns` è
+    l'istante d'arrivo per il tracing delle latenze (vedi latency.py), None se disattivo.
+    Per i consumer scritti sul vecchio payload dict la barra si legge anche per chiave
+    (bar["close"], bar.get("timestamp"), ...): le chiavi temporali sono formattate in ISO
+    solo su richiesta.
+    """
+    __slots__ = ("symbol", "t", "o", "h", "l", "c", "v", "tf_ns", "rx_ns")
+
+    def __init__(self, symbol: Optional[str], t: int, o: float, h: float, l: float, c: float,
+                 v: float = 0.0, tf_ns: int = NS_PER_MIN, rx_ns: Optional[int] = None):
+        self.symbol = symbol
+        self.t = t
+        self.o = o
+        self.h = h
+        self.l = l
+        self.c = c
+        self.v = v
+        self.tf_ns = tf_ns
+        self.rx_ns = rx_ns
+
+    @property
+    def end(self) -> int:
+        return self.t + self.tf_ns
+
+    @classmethod
+    def from_dict(cls, bar: dict) -> "Bar":
+        """Dal payload dict storico ({"timestamp"|"start", "open", ..., "volume"})."""
+        return cls(bar.get("symbol"), to_ns(bar.get("timestamp") or bar["start"]),
+                   float(bar["open"]), float(bar["high"]), float(bar["low"]), float(bar["close"]),
+                   float(bar.get("volume") or 0.0), rx_ns=bar.get("rx_ns"))
+
+    # ---------- compatibilità con il payload dict ----------
+    _KEYS = {"symbol": "symbol", "open": "o", "high": "h", "low": "l", "close": "c",
+             "volume": "v", "rx_ns": "rx_ns"}
+
+    def __getitem__(self, key: str):
+        attr = Bar._KEYS.get(key)
+        if attr is not None:
+            return getattr(self, attr)
+        if key in ("timestamp", "start"):
+            return ns_to_iso(self.t)
+        if key == "end":
+            return ns_to_iso(self.t + self.tf_ns)
+        if key == "timeframe":
+            return f"{self.tf_ns // NS_PER_MIN}Min"
+        raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        try:
+            value = self[key]
+        except KeyError:
+            return default
+        return default if value is None else value
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def to_dict(self) -> dict:
+        d = {k: self[k] for k in ("symbol", "timestamp", "open", "high", "low", "close", "volume",
+                                  "timeframe")}
+        if self.rx_ns is not None:
+            d["rx_ns"] = self.rx_ns
+        return d
+
+    def __repr__(self) -> str:
+        return (f"Bar({self.symbol!r}, {ns_to_iso(self.t)}, o={self.o}, h={self.h}, l={self.l}, "
+                f"c={self.c}, v={self.v})")
+
+
+def concat_bars(parts: Sequence[BarArrays]) -> BarArrays:
+    parts = [p for p in parts if len(p)]
+    if not parts:
+        return BarArrays.empty()
+    if len(parts) == 1:
+        return parts[0]
+    return BarArrays(*(np.concatenate([getattr(p, k) for p in parts]) for k in BarArrays.COLUMNS))
+
+
+def merge_bars(old: BarArrays, new: BarArrays) -> BarArrays:
+    """Unisce due serie, ordina per timestamp e deduplica (a parità di t vince `new`)."""
+    if not len(old):
+        return new.sorted()
+    if not len(new):
+        return old
+    merged = concat_bars([old, new])
+    merged = merged[np.argsort(merged.t, kind="stable")]
+    keep = np.empty(len(merged), dtype=bool)
+    keep[:-1] = merged.t[1:] != merged.t[:-1]
+    keep[-1] = True
+    return merged if keep.all() else merged[keep]
@@ -15,3 +15,7 @@ class TradingInterface(ABC):
 
     @abstractmethod
     def get_account(self): pass
+
+    def get_last_prices(self, symbols):
+        # default: una richiesta per simbolo; le implementazioni reali fanno una richiesta batch
+        return {s.upper(): self.get_last_price(s) for s in symbols}
@@ -0,0 +1,189 @@
+# trading_system/utils/decision_log.py
+from __future__ import annotations
+import os
+import csv
+import atexit
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# ===================== LIVELLI =====================
+#
+#   off    -> nessuna riga (nemmeno l'header): le strategie controllano un attributo e saltano tutto
+#   trades -> solo buy/sell
+#   all    -> ogni barra (anche hold e warm-up), come il vecchio _write_log
+
+LOG_OFF = "off"
+LOG_TRADES = "trades"
+LOG_ALL = "all"
+LEVELS = (LOG_OFF, LOG_TRADES, LOG_ALL)
+
+# livello di default quando la strategia non lo specifica
+DEFAULT_LEVEL_ENV = "DECISION_LOG"
+
+
+def resolve_level(level: Optional[str] = None) -> str:
+    lvl = (level or os.getenv(DEFAULT_LEVEL_ENV) or LOG_ALL).strip().lower()
+    if lvl not in LEVELS:
+        raise ValueError(f"Livello decision log non valido: {lvl} (usa {', '.join(LEVELS)})")
+    return lvl
+
+
+class DecisionLog:
+    """
+    Canale verso un file CSV con header fisso. `trades` / `all` sono bool da controllare
+    prima di costruire la riga: con livello off il costo è un accesso ad attributo.
+    """
+    __slots__ = ("path", "fields", "level", "trades", "all", "_logger")
+
+    def __init__(self, logger: "DecisionLogger", path: str, fields: Sequence[str], level: str):
+        self._logger = logger
+        self.path = path
+        self.fields = tuple(fields)
+        self.level = level
+        self.trades = level != LOG_OFF
+        self.all = level == LOG_ALL
+
+    def write(self, row: Sequence) -> None:
+        """Accoda una riga (tupla nello stesso ordine di `fields`)."""
+        if self.trades:
+            self._logger._push(self, [row])
+
+    def write_many(self, rows: List[Sequence]) -> None:
+        if self.trades and rows:
+            self._logger._push(self, rows)
+
+
+class DecisionLogger:
+    """
+    Logger condiviso dalle strategie: le righe vengono accodate in memoria e scritte
+    a blocchi da un thread in background (un open/append per file per ciclo di flush,
+    invece di uno per barra). Il buffer è a doppio slot: il flusher si prende tutte le
+    righe pendenti con uno swap sotto lock e scrive fuori dal lock.
+
+    Oltre `max_pending` righe il flusher viene svegliato subito; oltre il doppio scrive
+    direttamente il chiamante (backpressure: nessuna riga viene persa).
+    Alla chiusura del processo (atexit) tutto ciò che è pendente viene scritto.
+    """
+    def __init__(self, flush_interval: float = 0.5, max_pending: int = 50_000):
+        self.flush_interval = float(flush_interval)
+        self.max_pending = int(max_pending)
+        self._cond = threading.Condition(threading.Lock())
+        self._flush_lock = threading.Lock()
+        self._pending: List[Tuple[DecisionLog, List[Sequence]]] = []
+        self._n_pending = 0
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._headers: set = set()
+
+    # ---------- canali ----------
+    def open(self, path: str, fields: Sequence[str], level: Optional[str] = None) -> DecisionLog:
+        log = DecisionLog(self, path, fields, resolve_level(level))
+        if log.trades:
+            self._ensure_header(path, log.fields)
+        return log
+
+    def _ensure_header(self, path: str, fields: Tuple[str, ...]) -> None:
+        with self._flush_lock:
+            if path in self._headers:
+                return
+            d = os.path.dirname(path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            if not os.path.exists(path) or os.path.getsize(path) == 0:
+                with open(path, "a", newline="", encoding="utf-8") as f:
+                    csv.writer(f).writerow(fields)
+            self._headers.add(path)
+
+    # ---------- accodamento ----------
+    def _push(self, log: DecisionLog, rows: List[Sequence]) -> None:
+        with self._cond:
+            if self._closed:
+                pending = None
+            else:
+                self._pending.append((log, rows))
+                self._n_pending += len(rows)
+                pending = self._n_pending
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="DecisionLogger", daemon=True)
+                    self._thread.start()
+                if pending >= self.max_pending:
+                    self._cond.notify()
+        if pending is None:
+            # logger già chiuso (shutdown): scrittura sincrona
+            self._write([(log, rows)])
+        elif pending >= 2 * self.max_pending:
+            self.flush()
+
+    # ---------- scrittura ----------
+    def _take(self) -> List[Tuple[DecisionLog, List[Sequence]]]:
+        with self._cond:
+            batch, self._pending, self._n_pending = self._pending, [], 0
+        return batch
+
+    def _write(self, batch: List[Tuple[DecisionLog, List[Sequence]]]) -> None:
+        # raggruppa per file mantenendo l'ordine di arrivo
+        by_path: Dict[str, List[Sequence]] = {}
+        for log, rows in batch:
+            by_path.setdefault(log.path, []).extend(rows)
+        for path, rows in by_path.items():
+            try:
+                with open(path, "a", newline="", encoding="utf-8") as f:
+                    csv.writer(f).writerows(rows)
+            except OSError as e:
+                print(f"[DecisionLog] ERRORE scrittura {path}: {e}")
+
+    def flush(self) -> None:
+        """Scrive subito tutte le righe pendenti (sincrono)."""
+        with self._flush_lock:
+            batch = self._take()
+            if batch:
+                self._write(batch)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._closed and self._n_pending < self.max_pending:
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            t = self._thread
+        if t is not None and t is not threading.current_thread():
+            t.join()
+        self.flush()
+
+
+# ===================== ISTANZA CONDIVISA =====================
+
+_LOGGER: Optional[DecisionLogger] = None
+_LOGGER_LOCK = threading.Lock()
+
+
+def get_decision_logger() -> DecisionLogger:
+    global _LOGGER
+    with _LOGGER_LOCK:
+        if _LOGGER is None:
+            _LOGGER = DecisionLogger()
+            atexit.register(_LOGGER.close)
+            # i worker di multiprocessing escono senza atexit: chiusura anche via Finalize
+            from multiprocessing import util
+            util.Finalize(None, _LOGGER.close, exitpriority=20)
+        return _LOGGER
+
+
+def _reset_after_fork() -> None:
+    # il figlio non eredita il thread di flush: riparte con un logger nuovo
+    # (le righe pendenti ereditate le scrive il padre)
+    global _LOGGER, _LOGGER_LOCK
+    _LOGGER = None
+    _LOGGER_LOCK = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
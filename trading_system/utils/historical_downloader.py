@@ -2,17 +2,294 @@
 from __future__ import annotations
 import os
 import time
+import random
+import threading
 import requests
-from typing import Dict, List, Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+from trading_system.utils.bars import NS_PER_MIN, to_ns, ns_to_iso
 
 ALPACA_DATA_BASE = "https://data.alpaca.markets/v1beta3/crypto/us/bars"
 
+# quota piano base Alpaca market data: 200 richieste/minuto
+DEFAULT_RATE_PER_MINUTE = 200
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# task di download: (simboli, start_iso, end_iso)
+Task = Tuple[List[str], str, str]
+
 def _norm_symbol(sym: str) -> str:
     s = sym.strip().upper().replace("_", "/").replace("-", "/")
     if "/" not in s and len(s) >= 6:
         s = f"{s[:3]}/{s[3:]}"
     return s
 
+def _alpaca_timeframe(timeframe_minutes: int) -> str:
+    tf = int(timeframe_minutes)
+    if tf % 1440 == 0:
+        return f"{tf // 1440}Day"
+    if tf % 60 == 0:
+        return f"{tf // 60}Hour"
+    return f"{tf}Min"
+
+# ===================== RATE LIMIT =====================
+
+class TokenBucket:
+    """Token bucket thread-safe: `rate` token al secondo, al massimo `capacity` accumulabili."""
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n: float = 1.0) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return
+                wait = (n - self._tokens) / self.rate
+            time.sleep(wait)
+
+# ===================== PROGRESS =====================
+
+class DownloadProgress:
+    """Contatori condivisi fra i worker; stampa un riepilogo al massimo ogni `every` secondi."""
+    def __init__(self, total_tasks: int = 0, every: float = 5.0, printer: Callable[[str], None] = print):
+        self.total_tasks = total_tasks
+        self.every = every
+        self.printer = printer
+        self.tasks_done = self.pages = self.bars = self.retries = 0
+        self._t0 = time.monotonic()
+        self._last_print = 0.0
+        self._lock = threading.Lock()
+
+    def on_page(self, n_bars: int) -> None:
+        with self._lock:
+            self.pages += 1
+            self.bars += n_bars
+        self._maybe_print()
+
+    def on_retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def on_task_done(self) -> None:
+        with self._lock:
+            self.tasks_done += 1
+        self._maybe_print(force=self.tasks_done == self.total_tasks)
+
+    def _maybe_print(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_print < self.every:
+            return
+        self._last_print = now
+        el = max(now - self._t0, 1e-9)
+        self.printer(f"[DL] task {self.tasks_done}/{self.total_tasks}  pagine={self.pages}  "
+                     f"barre={self.bars:,}  retry={self.retries}  ({self.bars / el:,.0f} barre/s)")
+
+# ===================== ENGINE =====================
+
+_SESSION: Optional[requests.Session] = None
+_SESSION_LOCK = threading.Lock()
+
+def _shared_session(pool_size: int) -> requests.Session:
+    # una sola Session per processo: keep-alive e connessioni riusate fra chiamate e thread
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            s = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=max(4, pool_size))
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _SESSION = s
+        return _SESSION
+
+def shard_range(start_iso: str, end_iso: str, shard_days: Optional[float]) -> List[Tuple[str, str]]:
+    """Spezza [start, end] in sotto-range consecutivi di shard_days giorni (estremi inclusi)."""
+    if not shard_days:
+        return [(start_iso, end_iso)]
+    s, e = to_ns(start_iso), to_ns(end_iso)
+    step = int(shard_days * 1440) * NS_PER_MIN
+    out = []
+    while s <= e:
+        nxt = s + step
+        out.append((ns_to_iso(s), ns_to_iso(min(nxt - 1_000, e))))
+        s = nxt
+    return out
+
+class BarDownloader:
+    """
+    Downloader paginato delle barre Alpaca v1beta3:
+      - Session HTTP condivisa con pool di connessioni (keep-alive)
+      - task paralleli per simbolo × shard temporale (ThreadPoolExecutor)
+      - token bucket sulla quota API, condiviso da tutti i worker
+      - retry con backoff esponenziale (+jitter, rispetta Retry-After) su 429/5xx/errori di rete:
+        la pagina fallita viene richiesta di nuovo con lo stesso page_token, quindi si riprende
+        esattamente da dove ci si era fermati
+      - progress reporting
+    base_url è configurabile (es. server stub locale nei test).
+    """
+    def __init__(
+        self,
+        api_key: str | None = None,
+        api_secret: str | None = None,
+        base_url: str = ALPACA_DATA_BASE,
+        max_workers: int = 8,
+        rate_per_minute: float = DEFAULT_RATE_PER_MINUTE,
+        shard_days: Optional[float] = 30,
+        max_retries: int = 8,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        page_limit: int = 10_000,
+        timeout: float = 30.0,
+        session: Optional[requests.Session] = None,
+        progress: Optional[DownloadProgress] = None,
+    ):
+        self.api_key = api_key or os.getenv("PAPER_API_KEY_ID") or os.getenv("APCA_API_KEY_ID")
+        self.api_secret = api_secret or os.getenv("PAPER_API_SECRET_KEY") or os.getenv("APCA_API_SECRET_KEY")
+        if not self.api_key or not self.api_secret:
+            raise RuntimeError("API key/secret Alpaca mancanti (env PAPER_API_* o APCA_API_*).")
+        self.base_url = base_url
+        self.max_workers = max(1, int(max_workers))
+        self.bucket = TokenBucket(rate_per_minute / 60.0, capacity=max(1.0, min(10.0, rate_per_minute / 60.0 * 5)))
+        self.shard_days = shard_days
+        self.max_retries = int(max_retries)
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+        self.page_limit = int(page_limit)
+        self.timeout = timeout
+        self.session = session or _shared_session(self.max_workers)
+        self.progress = progress
+        self.headers = {
+            "Apca-Api-Key-Id": self.api_key,
+            "Apca-Api-Secret-Key": self.api_secret,
+        }
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        return min(self.backoff_max, self.backoff_base * (2 ** attempt)) * (0.5 + random.random() / 2)
+
+    def _get_page(self, params: Dict[str, Any]) -> dict:
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                r = self.session.get(self.base_url, headers=self.headers, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                retry_after, err = None, e
+            else:
+                if r.status_code not in RETRY_STATUS:
+                    r.raise_for_status()
+                    return r.json() or {}
+                if attempt >= self.max_retries:
+                    r.raise_for_status()
+                retry_after, err = r.headers.get("Retry-After"), f"HTTP {r.status_code}"
+            wait = self._backoff(attempt, retry_after)
+            attempt += 1
+            if self.progress:
+                self.progress.on_retry()
+            print(f"[DL] {err} su {params.get('symbols')} (page_token={params.get('page_token')}), "
+                  f"retry {attempt}/{self.max_retries} tra {wait:.2f}s")
+            time.sleep(wait)
+
+    def iter_pages(self, symbols: List[str], start_iso: str, end_iso: str, timeframe_minutes: int,
+                   page_token: Optional[str] = None):
+        """
+        Generatore delle pagine di un task: yield (bars_by_symbol, next_page_token).
+        page_token permette di riprendere un download interrotto.
+        """
+        params = {
+            "symbols": ",".join(symbols),
+            "timeframe": _alpaca_timeframe(timeframe_minutes),
+            "start": start_iso,
+            "end": end_iso,
+            "limit": self.page_limit,  # massimo consentito per pagina
+        }
+        while True:
+            p = dict(params)
+            if page_token:
+                p["page_token"] = page_token
+            data = self._get_page(p)
+            # formato: {"bars": {"BTC/USD":[{t:..., o:...,h:...,l:...,c:...,v:...}, ...]}, "next_page_token": ...}
+            bars = (data.get("bars") or {}) if isinstance(data, dict) else {}
+            page_token = data.get("next_page_token") if isinstance(data, dict) else None
+            if self.progress:
+                self.progress.on_page(sum(len(a) for a in bars.values() if isinstance(a, list)))
+            yield bars, page_token
+            if not page_token:
+                break
+
+    def tasks(self, symbols: List[str], start_iso: str, end_iso: str) -> List[Task]:
+        """Un task per simbolo × shard temporale."""
+        syms = [_norm_symbol(s) for s in symbols]
+        return [([sym], s, e) for sym in syms for s, e in shard_range(start_iso, end_iso, self.shard_days)]
+
+    def run_tasks(self, tasks: List[Task], timeframe_minutes: int, sink) -> None:
+        """
+        Esegue i task in parallelo consegnando ogni pagina al sink appena arriva, nel thread del worker:
+          sink.on_page(task, bars_by_symbol, next_page_token)
+          sink.on_task_done(task)
+        In memoria resta al più una pagina per worker.
+        """
+        if not tasks:
+            return
+        if self.progress is not None:
+            self.progress.total_tasks += len(tasks)
+
+        def _run(task: Task):
+            syms, s, e = task
+            for bars, token in self.iter_pages(syms, s, e, timeframe_minutes):
+                sink.on_page(task, bars, token)
+            sink.on_task_done(task)
+            if self.progress:
+                self.progress.on_task_done()
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(tasks)),
+                                thread_name_prefix="BarDownloader") as ex:
+            futs = [ex.submit(_run, t) for t in tasks]
+            for fut in as_completed(futs):
+                fut.result()
+
+    def fetch(self, symbols: List[str], start_iso: str, end_iso: str, timeframe_minutes: int) -> Dict[str, List[dict]]:
+        """Wrapper in memoria: raccoglie tutte le pagine in { simbolo: [bar dict, ...] }."""
+        tasks = self.tasks(symbols, start_iso, end_iso)
+        sink = _CollectSink(tasks)
+        self.run_tasks(tasks, timeframe_minutes, sink)
+        result: Dict[str, List[dict]] = {_norm_symbol(s): [] for s in symbols}
+        # ricompone nell'ordine dei task (shard consecutivi -> già in ordine temporale)
+        for i in range(len(tasks)):
+            for sym, arr in sink.parts[i].items():
+                result.setdefault(sym, []).extend(arr)
+        for sym in result:
+            result[sym].sort(key=lambda x: x.get("t", ""))
+        return result
+
+class _CollectSink:
+    def __init__(self, tasks: List[Task]):
+        self._index = {id(t): i for i, t in enumerate(tasks)}
+        self.parts: Dict[int, Dict[str, List[dict]]] = {i: {} for i in range(len(tasks))}
+
+    def on_page(self, task: Task, bars: Dict[str, list], next_page_token: Optional[str]) -> None:
+        part = self.parts[self._index[id(task)]]
+        for sym, arr in bars.items():
+            if isinstance(arr, list):
+                part.setdefault(sym, []).extend(arr)
+
+    def on_task_done(self, task: Task) -> None:
+        pass
+
 def fetch_crypto_bars(
     symbols: List[str],
     start_iso: str,
@@ -20,58 +297,13 @@ def fetch_crypto_bars(
     timeframe_minutes: int,
     api_key: str | None = None,
     api_secret: str | None = None,
+    **engine_kwargs,
 ) -> Dict[str, List[dict]]:
     """
-    Scarica barre storiche crypto per più simboli da Alpaca v1beta3.
+    Scarica barre storiche crypto per più simboli da Alpaca v1beta3 (vedi BarDownloader
+    per i parametri opzionali: max_workers, rate_per_minute, shard_days, base_url, progress, ...).
     Ritorna: { "BTC/USD": [ {t: iso, o:..., h:..., l:..., c:..., v:...}, ... ], ... }
     """
-    api_key = api_key or os.getenv("PAPER_API_KEY_ID") or os.getenv("APCA_API_KEY_ID")
-    api_secret = api_secret or os.getenv("PAPER_API_SECRET_KEY") or os.getenv("APCA_API_SECRET_KEY")
-    if not api_key or not api_secret:
-        raise RuntimeError("API key/secret Alpaca mancanti (env PAPER_API_* o APCA_API_*).")
-
-    headers = {
-        "Apca-Api-Key-Id": api_key,
-        "Apca-Api-Secret-Key": api_secret,
-    }
-
-    tf = f"{int(timeframe_minutes)}Min"
-    syms = [_norm_symbol(s) for s in symbols]
-    result: Dict[str, List[dict]] = {s: [] for s in syms}
-
-    params = {
-        "symbols": ",".join(syms),
-        "timeframe": tf,
-        "start": start_iso,
-        "end": end_iso,
-        "limit": 10_000,  # massimo consentito per pagina
-    }
-
-    next_page_token = None
-    while True:
-        p = dict(params)
-        if next_page_token:
-            p["page_token"] = next_page_token
-        r = requests.get(ALPACA_DATA_BASE, headers=headers, params=p, timeout=30)
-        r.raise_for_status()
-        data = r.json() or {}
-
-        # formato: {"bars": {"BTC/USD":[{t:..., o:...,h:...,l:...,c:...,v:...}, ...], "ETH/USD":[...]}, "next_page_token": ...}
-        bars = (data.get("bars") or {}) if isinstance(data, dict) else {}
-        for sym, arr in bars.items():
-            if not isinstance(arr, list):
-                continue
-            result.setdefault(sym, [])
-            result[sym].extend(arr)
-
-        next_page_token = data.get("next_page_token")
-        if not next_page_token:
-            break
-        # Piccolo respiro per non saturare
-        time.sleep(0.05)
-
-    # Ordina per timestamp
-    for sym in result:
-        result[sym].sort(key=lambda x: x.get("t", ""))
-
-    return result
+    engine_kwargs.setdefault("progress", DownloadProgress())
+    dl = BarDownloader(api_key=api_key, api_secret=api_secret, **engine_kwargs)
+    return dl.fetch(symbols, start_iso, end_iso, timeframe_minutes)
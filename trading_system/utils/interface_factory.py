@@ -6,5 +6,9 @@ def get_trading_interface():
 
     if provider == "alpaca":
         return AlpacaTradingInterface()
+    elif provider == "sim":
+        # broker locale: parametri da env SIM_* (vedi sim_trading_interface.SIM_ENV)
+        from .sim_trading_interface import SimulatedTradingInterface
+        return SimulatedTradingInterface()
     else:
         raise ValueError(f"Unsupported trading provider: {provider}")
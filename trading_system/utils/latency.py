@@ -0,0 +1,172 @@
+# trading_system/utils/latency.py
+from __future__ import annotations
+import os
+import threading
+from time import perf_counter_ns
+from typing import Dict, List, Optional, Tuple
+
+LATENCY_ENV = "LATENCY_TRACE"
+
+# checkpoint del percorso di una barra, in ordine; ogni valore è la latenza cumulata
+# dall'arrivo della barra (rx_ns, timestamp monotono preso nell'adapter):
+#   adapter    payload pronto (dopo bar_payload)
+#   aggregate  ingresso in AggregatingBarStream._on_bar_1m (fan-out dell'hub incluso)
+#   runner     ingresso in StrategyRunner._on_bar_agg (solo le barre che chiudono una candela)
+#   strategy   ritorno di Strategy.on_data
+#   book       ritorno di PortfolioManager.book_buy/book_sell (ordine accodato)
+#   submit     ritorno di submit_order nel worker della OrderPipeline
+STAGES = ("adapter", "aggregate", "runner", "strategy", "book", "submit")
+
+# bucket log-lineari: 2**SUB_BITS sotto-bucket per ottava, errore relativo <= 1/2**SUB_BITS
+SUB_BITS = 3
+_SUB = 1 << SUB_BITS
+_BUCKETS = 64 * _SUB
+
+# ===================== ISTOGRAMMA =====================
+
+class Histogram:
+    """Istogramma di durate in ns a bucket log-lineari; record() è O(1) e senza lock."""
+    __slots__ = ("counts", "n", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * _BUCKETS
+        self.n = 0
+        self.total = 0
+        self.max = 0
+
+    @staticmethod
+    def _index(ns: int) -> int:
+        if ns < _SUB:
+            return max(0, ns)
+        e = ns.bit_length() - SUB_BITS - 1
+        return ((e + 1) << SUB_BITS) + ((ns >> e) - _SUB)
+
+    @staticmethod
+    def _upper(idx: int) -> int:
+        if idx < _SUB:
+            return idx
+        e = (idx >> SUB_BITS) - 1
+        return ((_SUB + (idx & (_SUB - 1)) + 1) << e) - 1
+
+    def record(self, ns: int) -> None:
+        self.counts[self._index(ns)] += 1
+        self.n += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def merge(self, other: "Histogram") -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.n += other.n
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> int:
+        """Limite superiore del bucket che contiene il quantile q (mai oltre il max osservato)."""
+        if self.n == 0:
+            return 0
+        rank = max(1, int(q * self.n + 0.5))
+        seen = 0
+        for idx, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(self._upper(idx), self.max)
+        return self.max
+
+# ===================== TRACER =====================
+
+class LatencyTracer:
+    """
+    Raccolta delle latenze per (simbolo, checkpoint).
+
+    Ogni thread scrive nei propri istogrammi (threading.local): sul percorso caldo non ci
+    sono lock, la registrazione del dizionario del thread avviene una volta sola. report()
+    e snapshot() fondono le copie di tutti i thread. Con il tracer disabilitato i punti
+    strumentati si riducono al test di `enabled`.
+    """
+    def __init__(self, enabled: Optional[bool] = None):
+        if enabled is None:
+            enabled = os.getenv(LATENCY_ENV, "0").strip().lower() in ("1", "true", "on", "yes")
+        self.enabled = bool(enabled)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._tables: List[Dict[Tuple[str, str], Histogram]] = []
+
+    # ---------- controllo ----------
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self._lock:
+            for table in self._tables:
+                table.clear()
+
+    # ---------- origine della traccia corrente (per thread) ----------
+    def set_origin(self, rx_ns: Optional[int]) -> None:
+        self._local.origin = rx_ns
+
+    def origin(self) -> Optional[int]:
+        return getattr(self._local, "origin", None)
+
+    # ---------- registrazione ----------
+    def _table(self) -> Dict[Tuple[str, str], Histogram]:
+        table = getattr(self._local, "table", None)
+        if table is None:
+            table = self._local.table = {}
+            with self._lock:
+                self._tables.append(table)
+        return table
+
+    def record(self, symbol: str, stage: str, rx_ns: Optional[int]) -> None:
+        """Latenza cumulata da rx_ns al checkpoint `stage` per il simbolo."""
+        if rx_ns is None:
+            return
+        key = (symbol.upper().replace("_", "/"), stage)
+        table = self._table()
+        h = table.get(key)
+        if h is None:
+            h = table[key] = Histogram()
+        h.record(perf_counter_ns() - rx_ns)
+
+    # ---------- lettura ----------
+    def snapshot(self) -> Dict[str, Dict[str, Histogram]]:
+        """{simbolo: {checkpoint: Histogram fuso su tutti i thread}}."""
+        with self._lock:
+            tables = list(self._tables)
+        out: Dict[str, Dict[str, Histogram]] = {}
+        for table in tables:
+            for (sym, stage), h in list(table.items()):
+                agg = out.setdefault(sym, {}).get(stage)
+                if agg is None:
+                    agg = out[sym][stage] = Histogram()
+                agg.merge(h)
+        return out
+
+    def report(self, symbol: Optional[str] = None) -> str:
+        snap = self.snapshot()
+        if symbol:
+            key = symbol.upper().replace("_", "/")
+            snap = {key: snap[key]} if key in snap else {}
+        if not snap:
+            state = "attivo" if self.enabled else "disattivato (latency on)"
+            return f"[Latency] nessun campione, tracing {state}"
+        lines = []
+        for sym in sorted(snap):
+            lines.append(f"\n {sym}  (µs cumulati dall'arrivo della barra; Δp50 = tempo nello stadio)")
+            lines.append(f"   {'stage':<10}{'n':>9}{'p50':>11}{'p99':>11}{'max':>11}{'Δp50':>11}")
+            prev = 0
+            for stage in STAGES:
+                h = snap[sym].get(stage)
+                if h is None:
+                    continue
+                p50 = h.quantile(0.50)
+                lines.append(f"   {stage:<10}{h.n:>9}{p50 / 1e3:>11.1f}{h.quantile(0.99) / 1e3:>11.1f}"
+                             f"{h.max / 1e3:>11.1f}{max(0, p50 - prev) / 1e3:>11.1f}")
+                prev = p50
+        return "\n".join(lines)
+
+
+TRACER = LatencyTracer()
@@ -0,0 +1,172 @@
+# trading_system/utils/market_data_hub.py
+from __future__ import annotations
+import threading
+from time import perf_counter_ns
+from typing import Callable, Dict, List, Optional, Tuple
+
+from trading_system.utils.alpaca_bars_adapter import to_alpaca_symbol
+from trading_system.utils.bars import Bar
+from trading_system.utils.latency import TRACER
+
+# le sorgenti reali consegnano Bar; i dict del vecchio payload restano accettati (test, tap)
+BarCallback = Callable[[Bar], None]
+
+# ===================== SORGENTI =====================
+#
+# Una sorgente espone:
+#   start(on_bar, symbols)  apre la connessione e inizia a consegnare barre a on_bar(Bar)
+#   subscribe(symbols)      aggiunge simboli a connessione aperta
+#   unsubscribe(symbols)    li rimuove
+#   stop()
+# La sorgente reale è AlpacaBarSource (alpaca_bars_adapter.py), FakeBarSource serve per i test.
+
+
+class FakeBarSource:
+    """Sorgente in-process: le barre si iniettano con push(), consegnate nel thread del chiamante."""
+    def __init__(self):
+        self.symbols: set = set()
+        self.connects = 0
+        self.running = False
+        self._on_bar: Optional[BarCallback] = None
+
+    def start(self, on_bar: BarCallback, symbols) -> None:
+        self._on_bar = on_bar
+        self.symbols.update(symbols)
+        self.connects += 1
+        self.running = True
+
+    def subscribe(self, symbols) -> None:
+        self.symbols.update(symbols)
+
+    def unsubscribe(self, symbols) -> None:
+        self.symbols.difference_update(symbols)
+
+    def stop(self) -> None:
+        self.running = False
+        self._on_bar = None
+
+    def push(self, bar) -> None:
+        # come il websocket: arrivano solo le barre dei simboli sottoscritti
+        if self.running and to_alpaca_symbol(bar["symbol"]) in self.symbols:
+            self._on_bar(bar)
+
+# ===================== HUB =====================
+
+class MarketDataHub:
+    """
+    Feed unico per processo: una sola connessione (sorgente) per tutti i simboli, con
+    fan-out delle barre 1m ai subscriber registrati per simbolo.
+
+      - la sorgente parte alla prima sottoscrizione; i simboli successivi vengono aggiunti
+        con source.subscribe() senza riconnettere, e rimossi quando non ha più subscriber;
+      - i subscriber sono tuple immutabili sostituite sotto lock (copy-on-write): il dispatch
+        legge senza lock e un subscriber può entrare/uscire anche durante una consegna;
+      - un'eccezione in un subscriber viene loggata e non ferma gli altri;
+      - i "tap" (add_tap) ricevono tutte le barre di tutti i simboli, senza sottoscriverne
+        di nuovi (es. QuoteCache alimentata passivamente dallo stream).
+    """
+    def __init__(self, source_factory: Optional[Callable[[], object]] = None):
+        self._source_factory = source_factory or _default_source
+        self._source = None
+        self._lock = threading.Lock()
+        self._subs: Dict[str, Tuple[BarCallback, ...]] = {}
+        self._taps: Tuple[BarCallback, ...] = ()
+
+    @property
+    def source(self):
+        return self._source
+
+    def symbols(self) -> List[str]:
+        return sorted(self._subs)
+
+    def subscribe(self, symbol: str, callback: BarCallback) -> Tuple[str, BarCallback]:
+        """Registra callback(bar) per un simbolo; ritorna l'handle da passare a unsubscribe()."""
+        sym = to_alpaca_symbol(symbol)
+        with self._lock:
+            cur = self._subs.get(sym, ())
+            # prima la sorgente, poi il subscriber: se l'avvio fallisce il simbolo non resta
+            # registrato senza essere sottoscritto alla sorgente
+            if self._source is None:
+                src = self._source_factory()
+                try:
+                    src.start(self._dispatch, sorted(set(self._subs) | {sym}))
+                except Exception:
+                    try:
+                        src.stop()
+                    except Exception:
+                        pass
+                    raise
+                self._source = src
+            elif not cur:
+                self._source.subscribe([sym])
+            self._subs[sym] = cur + (callback,)
+        return sym, callback
+
+    def unsubscribe(self, handle: Tuple[str, BarCallback]) -> None:
+        sym, callback = handle
+        with self._lock:
+            cur = self._subs.get(sym, ())
+            if callback not in cur:
+                return
+            rest = tuple(cb for cb in cur if cb is not callback)
+            if rest:
+                self._subs[sym] = rest
+            else:
+                del self._subs[sym]
+                if self._source is not None:
+                    self._source.unsubscribe([sym])
+
+    def add_tap(self, callback: BarCallback) -> None:
+        with self._lock:
+            if callback not in self._taps:
+                self._taps = self._taps + (callback,)
+
+    def remove_tap(self, callback: BarCallback) -> None:
+        with self._lock:
+            self._taps = tuple(cb for cb in self._taps if cb != callback)
+
+    def _dispatch(self, bar) -> None:
+        if TRACER.enabled and "rx_ns" not in bar:
+            # sorgenti senza timestamp d'arrivo (replay, test): la traccia parte dall'hub
+            if isinstance(bar, Bar):
+                bar.rx_ns = perf_counter_ns()
+            else:
+                bar["rx_ns"] = perf_counter_ns()
+        for cb in self._taps + self._subs.get(to_alpaca_symbol(bar["symbol"]), ()):
+            try:
+                cb(bar)
+            except Exception as e:
+                print(f"[MarketDataHub] subscriber error ({bar.get('symbol')}): {e}")
+
+    def close(self) -> None:
+        with self._lock:
+            src, self._source = self._source, None
+            self._subs = {}
+        if src is not None:
+            src.stop()
+
+
+def _default_source():
+    from trading_system.utils.alpaca_bars_adapter import AlpacaBarSource
+    return AlpacaBarSource()
+
+# ===================== ISTANZA CONDIVISA =====================
+
+_HUB: Optional[MarketDataHub] = None
+_HUB_LOCK = threading.Lock()
+
+
+def get_market_data_hub() -> MarketDataHub:
+    """Hub del processo (creato alla prima richiesta, sorgente Alpaca)."""
+    global _HUB
+    with _HUB_LOCK:
+        if _HUB is None:
+            _HUB = MarketDataHub()
+        return _HUB
+
+
+def set_market_data_hub(hub: Optional[MarketDataHub]) -> None:
+    """Sostituisce l'hub del processo (es. hub con FakeBarSource nei test o replay)."""
+    global _HUB
+    with _HUB_LOCK:
+        _HUB = hub
@@ -1,60 +1,68 @@
 # market_data_stream_bars.py
-from typing import Callable, Optional, Deque, Tuple, List
-from collections import deque
+from typing import Callable, Optional, Tuple, List
 from datetime import datetime, timedelta
 import threading
 
+import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from matplotlib.animation import FuncAnimation
 from matplotlib.patches import Rectangle
 
-from trading_system.utils.alpaca_bars_adapter import AlpacaBars1mAdapter
-
-
-def _parse_iso_ts(ts_iso: str) -> datetime:
-    # accetta "...Z" o offset +00:00
-    return datetime.fromisoformat(ts_iso.replace("Z", "+00:00"))
+from trading_system.utils.market_data_hub import MarketDataHub, get_market_data_hub
+from trading_system.utils.bars import BAR_DTYPE, Bar, NS_PER_SEC, NS_PER_MIN, to_ns, ns_to_dt
 
 
 class _BarBuffer:
     """
     Buffer thread-safe di barre (timestamp, o,h,l,c,vol) con finestra temporale scorrevole.
     Le barre in ingresso sono già 1m: manteniamo solo l'ultima finestra (es. 24h).
+    Le barre stanno in un array strutturato BAR_DTYPE (48 byte a barra, nessun oggetto per
+    barra): si scrive in coda e, a buffer pieno, la finestra viva viene ricompattata in testa.
     """
     def __init__(self, window: timedelta = timedelta(hours=24)):
         self._lock = threading.Lock()
         self.window = window
-        # deques allineati
-        self.ts: Deque[datetime] = deque()
-        self.o: Deque[float] = deque()
-        self.h: Deque[float] = deque()
-        self.l: Deque[float] = deque()
-        self.c: Deque[float] = deque()
-        self.v: Deque[float] = deque()
-
-    def add_bar(self, ts_iso: str, o: float, h: float, l: float, c: float, v: float):
-        t = _parse_iso_ts(ts_iso)
+        self._window_ns = int(window.total_seconds() * NS_PER_SEC)
+        # capacità iniziale: la finestra in barre 1m, con margine per la ricompattazione
+        self._data = np.empty(max(16, 2 * (self._window_ns // NS_PER_MIN + 1)), dtype=BAR_DTYPE)
+        self._lo = 0
+        self._hi = 0
+
+    def __len__(self) -> int:
+        return self._hi - self._lo
+
+    def add_bar(self, t, o: float, h: float, l: float, c: float, v: float):
+        """t: epoch-ns (int); per compatibilità anche stringa ISO o datetime."""
+        t = to_ns(t)
         with self._lock:
-            self.ts.append(t)
-            self.o.append(float(o))
-            self.h.append(float(h))
-            self.l.append(float(l))
-            self.c.append(float(c))
-            self.v.append(float(v))
+            if self._hi == len(self._data):
+                n = self._hi - self._lo
+                if n * 2 > len(self._data):
+                    # finestra più fitta di una barra al minuto: raddoppia
+                    grown = np.empty(2 * len(self._data), dtype=BAR_DTYPE)
+                    grown[:n] = self._data[self._lo:self._hi]
+                    self._data = grown
+                else:
+                    self._data[:n] = self._data[self._lo:self._hi]
+                self._lo, self._hi = 0, n
+            self._data[self._hi] = (t, o, h, l, c, v)
+            self._hi += 1
             # purge vecchi
-            cutoff = t - self.window
-            while self.ts and self.ts[0] < cutoff:
-                self.ts.popleft()
-                self.o.popleft()
-                self.h.popleft()
-                self.l.popleft()
-                self.c.popleft()
-                self.v.popleft()
+            ts = self._data["t"]
+            cutoff = t - self._window_ns
+            while self._lo < self._hi and ts[self._lo] < cutoff:
+                self._lo += 1
 
-    def snapshot(self) -> Tuple[List[datetime], List[float], List[float], List[float], List[float], List[float]]:
+    def records(self) -> np.ndarray:
+        """Copia delle barre nella finestra (array BAR_DTYPE)."""
         with self._lock:
-            return (list(self.ts), list(self.o), list(self.h), list(self.l), list(self.c), list(self.v))
+            return self._data[self._lo:self._hi].copy()
+
+    def snapshot(self) -> Tuple[List[datetime], List[float], List[float], List[float], List[float], List[float]]:
+        rec = self.records()
+        return ([ns_to_dt(t) for t in rec["t"].tolist()], rec["o"].tolist(), rec["h"].tolist(),
+                rec["l"].tolist(), rec["c"].tolist(), rec["v"].tolist())
 
 
 class _LiveCandlestickChart:
@@ -185,6 +193,7 @@ class MarketDataStreamBars:
         chart_window: timedelta = timedelta(hours=24),
         chart_refresh_ms: int = 10_000,
         chart_title: Optional[str] = None,
+        hub: Optional[MarketDataHub] = None,
     ):
         self.stock = stock
         self.on_data_callback = on_data_callback
@@ -193,13 +202,9 @@ class MarketDataStreamBars:
         # buffer per il grafico
         self._buffer = _BarBuffer(window=chart_window)
 
-        # adapter Alpaca
-        self._adapter = AlpacaBars1mAdapter(
-            symbol=stock,
-            on_bar_callback=self._on_bar,  # nostro handler interno che alimenta buffer + inoltra
-            api_key=api_key,
-            api_secret=api_secret
-        )
+        # barre dal feed condiviso del processo (nessuna connessione dedicata)
+        self._hub = hub
+        self._handle = None
 
         self._chart = _LiveCandlestickChart(
             buffer=self._buffer,
@@ -209,34 +214,36 @@ class MarketDataStreamBars:
 
     # ==== STREAM LIFECYCLE ====================================================
     def start(self):
-        self._adapter.start()
+        if self._handle is None:
+            self._hub = self._hub or get_market_data_hub()
+            # nostro handler interno che alimenta buffer + inoltra
+            self._handle = self._hub.subscribe(self.stock, self._on_bar)
 
     def stop(self):
-        self._adapter.stop()
+        if self._handle is not None:
+            self._hub.unsubscribe(self._handle)
+            self._handle = None
 
     # ==== CALLBACK INTERNO ====================================================
-    def _on_bar(self, bar: dict):
+    def _on_bar(self, bar):
         """
-        bar tipico:
-          {
-            "symbol":"BTC/USD", "timestamp":"...+00:00",
-            "open":..., "high":..., "low":..., "close":..., "volume":...,
-            "timeframe":"1Min", "source":"alpaca_ws"
-          }
+        bar tipico: Bar 1m dall'hub (symbol "BTC/USD", t epoch-ns, o/h/l/c/v);
+        i dict del vecchio payload ({"timestamp": iso, "open": ..., ...}) sono ancora accettati.
         """
-        ts = bar.get("timestamp")
-        if ts:
-            try:
+        try:
+            if isinstance(bar, Bar):
+                self._buffer.add_bar(bar.t, bar.o, bar.h, bar.l, bar.c, bar.v)
+            elif bar.get("timestamp"):
                 self._buffer.add_bar(
-                    ts_iso=ts,
+                    bar["timestamp"],
                     o=bar.get("open", 0.0),
                     h=bar.get("high", 0.0),
                     l=bar.get("low", 0.0),
                     c=bar.get("close", 0.0),
                     v=bar.get("volume", 0.0),
                 )
-            except Exception as e:
-                print(f"[MarketDataStreamBars] Errore buffer.add_bar: {e}")
+        except Exception as e:
+            print(f"[MarketDataStreamBars] Errore buffer.add_bar: {e}")
 
         # inoltra al callback utente (se presente)
         if self.on_data_callback:
@@ -0,0 +1,272 @@
+# trading_system/utils/order_pipeline.py
+from __future__ import annotations
+import time
+import uuid
+import queue
+import threading
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .latency import TRACER
+
+# ===================== ORDINI =====================
+#
+# Il trader, per usare il percorso asincrono completo, espone:
+#   submit_order(symbol, side, qty, client_order_id) -> update
+#   get_order(broker_id)                             -> update
+# dove update = {"id", "status", "filled_qty", "filled_avg_price"}.
+# Un trader che ha solo buy()/sell() (es. _NoOpTrader) viene chiamato dal worker e
+# l'ordine è considerato eseguito subito al prezzo indicativo del segnale.
+
+QUEUED = "queued"
+SUBMITTED = "submitted"
+PARTIAL = "partially_filled"
+FILLED = "filled"
+REJECTED = "rejected"
+FAILED = "failed"
+
+# stati Alpaca (e del simulatore) dopo i quali l'ordine non cambia più
+FINAL_STATUSES = {FILLED, REJECTED, FAILED, "canceled", "expired", "replaced", "done_for_day"}
+
+
+class OrderTicket:
+    """Stato locale di un ordine; `id` è il client_order_id restituito subito da submit()."""
+    __slots__ = ("id", "symbol", "side", "qty", "price_hint", "status", "broker_id",
+                 "filled_qty", "filled_avg_price", "error", "created_at", "done", "rx_ns")
+
+    def __init__(self, symbol: str, side: str, qty: float, price_hint: Optional[float]):
+        self.id = uuid.uuid4().hex
+        self.symbol = symbol
+        self.side = side
+        self.qty = float(qty)
+        self.price_hint = price_hint
+        self.status = QUEUED
+        self.broker_id: Optional[str] = None
+        self.filled_qty = 0.0
+        self.filled_avg_price = 0.0
+        self.error: Optional[str] = None
+        self.created_at = time.monotonic()
+        self.done = threading.Event()
+        self.rx_ns: Optional[int] = None       # origine della traccia di latenza (vedi latency.py)
+
+    @property
+    def final(self) -> bool:
+        return self.status in FINAL_STATUSES
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id, "symbol": self.symbol, "side": self.side, "qty": self.qty,
+            "status": self.status, "broker_id": self.broker_id,
+            "filled_qty": self.filled_qty, "filled_avg_price": self.filled_avg_price,
+            "error": self.error,
+        }
+
+# fill incrementale: on_fill(ticket, qty, price) con qty/price della sola parte nuova
+FillCallback = Callable[[OrderTicket, float, float], None]
+
+# ===================== PIPELINE =====================
+
+class OrderPipeline:
+    """
+    Invio ordini non bloccante.
+
+      - submit() crea il ticket, lo accoda e ritorna subito il client_order_id: il thread
+        che gestisce il segnale (callback del websocket, task asyncio) non fa I/O;
+      - `workers` thread consumano la coda e inviano gli ordini con lo stesso trader
+        (un solo client HTTP con pool di connessioni, vedi AlpacaTradingInterface);
+      - un thread di riconciliazione interroga gli ordini aperti ogni `poll_interval`
+        secondi e passa a on_fill() solo la parte di esecuzione nuova (fill parziali
+        inclusi), così lo stato locale segue i fill reali e non il segnale.
+
+    `orders` contiene solo gli ordini non ancora finali; quelli chiusi passano in `history`
+    (gli ultimi `history_size`), e `counts` tiene il totale per stato finale. La quantità
+    in sospeso per (simbolo, lato) è un indice aggiornato a ogni submit/fill/chiusura, così
+    pending_qty() è O(1) qualunque sia la durata della sessione.
+    """
+    def __init__(self, trader, on_fill: Optional[FillCallback] = None,
+                 workers: int = 4, poll_interval: float = 0.5, max_queue: int = 10_000,
+                 history_size: int = 1000):
+        self.trader = trader
+        self.on_fill = on_fill
+        self.workers = max(1, int(workers))
+        self.poll_interval = float(poll_interval)
+        self.orders: Dict[str, OrderTicket] = {}
+        self.history: "OrderedDict[str, OrderTicket]" = OrderedDict()
+        self.history_size = max(0, int(history_size))
+        self.submitted = 0
+        self.counts: Counter = Counter()
+        self._pending: Dict[Tuple[str, str], float] = {}
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._open: Dict[str, OrderTicket] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._async_api = hasattr(trader, "submit_order") and hasattr(trader, "get_order")
+
+    # ---------- ciclo di vita ----------
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for k in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"OrderWorker-{k}", daemon=True)
+                t.start()
+                self._threads.append(t)
+            if self._async_api:
+                t = threading.Thread(target=self._reconcile_loop, name="OrderReconciler", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Svuota la coda (gli ordini già accodati vengono inviati) e ferma i thread."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        if not threads:
+            return
+        for _ in range(self.workers):
+            self._queue.put(None)
+        for t in threads:
+            if t.name.startswith("OrderWorker"):
+                t.join(timeout=timeout)
+        self._stop.set()
+        for t in threads:
+            t.join(timeout=timeout)
+
+    # ---------- API ----------
+    def submit(self, symbol: str, side: str, qty: float, price_hint: Optional[float] = None) -> str:
+        if side not in ("buy", "sell"):
+            raise ValueError(f"side non valido: {side}")
+        if not self._threads:
+            self.start()
+        ticket = OrderTicket(symbol, side, qty, price_hint)
+        if TRACER.enabled:
+            ticket.rx_ns = TRACER.origin()
+        key = (symbol, side)
+        with self._lock:
+            self.submitted += 1
+            self.orders[ticket.id] = ticket
+            self._pending[key] = self._pending.get(key, 0.0) + ticket.qty
+        try:
+            self._queue.put_nowait(ticket)
+        except queue.Full:
+            # chiamato dal thread del feed: niente eccezioni, l'ordine è rifiutato localmente
+            ticket.error = "coda ordini piena"
+            self._finish(ticket, FAILED)
+            print(f"[Orders] coda piena, ordine scartato {side} {qty} {symbol}")
+        return ticket.id
+
+    def get(self, order_id: str) -> Optional[OrderTicket]:
+        with self._lock:
+            return self.orders.get(order_id) or self.history.get(order_id)
+
+    def wait(self, order_id: str, timeout: Optional[float] = None) -> bool:
+        """Attende che l'ordine arrivi a uno stato finale; False allo scadere del timeout."""
+        ticket = self.get(order_id)
+        return ticket is not None and ticket.done.wait(timeout)
+
+    def pending_qty(self, symbol: str, side: str) -> float:
+        """Quantità accodata/inviata e non ancora eseguita per simbolo e lato."""
+        return self._pending.get((symbol, side), 0.0)
+
+    def _unreserve(self, ticket: OrderTicket, qty: float) -> None:
+        # chiamato con self._lock
+        key = (ticket.symbol, ticket.side)
+        left = self._pending.get(key, 0.0) - qty
+        if left > 1e-12:
+            self._pending[key] = left
+        else:
+            self._pending.pop(key, None)
+
+    # ---------- worker ----------
+    def _worker(self) -> None:
+        while True:
+            ticket = self._queue.get()
+            if ticket is None:
+                return
+            try:
+                self._send(ticket)
+            except Exception as e:
+                ticket.error = str(e)
+                self._finish(ticket, FAILED)
+                print(f"[Orders] invio fallito {ticket.side} {ticket.qty} {ticket.symbol}: {e}")
+
+    def _send(self, ticket: OrderTicket) -> None:
+        if not self._async_api:
+            getattr(self.trader, ticket.side)(ticket.symbol, ticket.qty)
+            if ticket.rx_ns is not None:
+                TRACER.record(ticket.symbol, "submit", ticket.rx_ns)
+            self._apply(ticket, {"status": FILLED, "filled_qty": ticket.qty,
+                                 "filled_avg_price": ticket.price_hint or 0.0})
+            return
+        update = self.trader.submit_order(ticket.symbol, ticket.side, ticket.qty, ticket.id)
+        if ticket.rx_ns is not None:
+            TRACER.record(ticket.symbol, "submit", ticket.rx_ns)
+        ticket.broker_id = update.get("id")
+        if ticket.status == QUEUED:
+            ticket.status = SUBMITTED
+        self._apply(ticket, update)
+        if not ticket.final:
+            with self._lock:
+                self._open[ticket.id] = ticket
+
+    # ---------- riconciliazione ----------
+    def _reconcile_loop(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            self.reconcile()
+        self.reconcile()
+
+    def reconcile(self) -> None:
+        """Un giro di polling sugli ordini aperti."""
+        with self._lock:
+            open_orders = list(self._open.values())
+        for ticket in open_orders:
+            try:
+                self._apply(ticket, self.trader.get_order(ticket.broker_id))
+            except Exception as e:
+                print(f"[Orders] stato non disponibile per {ticket.id}: {e}")
+                continue
+            if ticket.final:
+                with self._lock:
+                    self._open.pop(ticket.id, None)
+
+    def _apply(self, ticket: OrderTicket, update: dict) -> None:
+        filled = float(update.get("filled_qty") or 0.0)
+        avg = float(update.get("filled_avg_price") or 0.0)
+        status = update.get("status") or ticket.status
+        if filled > ticket.filled_qty + 1e-12:
+            # parte nuova: quantità e prezzo medio che riportano il cumulativo a (filled, avg)
+            dq = filled - ticket.filled_qty
+            dp = (filled * avg - ticket.filled_qty * ticket.filled_avg_price) / dq
+            with self._lock:
+                if not ticket.final:
+                    self._unreserve(ticket, min(dq, ticket.qty - ticket.filled_qty))
+                ticket.filled_qty, ticket.filled_avg_price = filled, avg
+            if self.on_fill is not None:
+                try:
+                    self.on_fill(ticket, dq, dp)
+                except Exception as e:
+                    print(f"[Orders] on_fill error ({ticket.id}): {e}")
+        if status == REJECTED:
+            ticket.error = update.get("reason") or ticket.error
+        if status in FINAL_STATUSES:
+            self._finish(ticket, status)
+        else:
+            ticket.status = status
+
+    def _finish(self, ticket: OrderTicket, status: str) -> None:
+        with self._lock:
+            if ticket.final:
+                ticket.status = status
+                return
+            # residuo non eseguito: non è più in sospeso
+            self._unreserve(ticket, max(0.0, ticket.qty - ticket.filled_qty))
+            ticket.status = status
+            self.counts[status] += 1
+            self.orders.pop(ticket.id, None)
+            self._open.pop(ticket.id, None)
+            if self.history_size:
+                self.history[ticket.id] = ticket
+                while len(self.history) > self.history_size:
+                    self.history.popitem(last=False)
+        ticket.done.set()
@@ -2,11 +2,12 @@
 from __future__ import annotations
 from typing import Dict, Any
 import os
+import threading
 import yaml
-from copy import deepcopy
 
 from .interface_factory import get_trading_interface
-from .stock_state_manager import StockStateManager
+from .stock_state_manager import StockStateManager, make_state_backend
+from .order_pipeline import OrderPipeline
 
 def _norm(sym: str) -> str:
     return sym.lower().replace("/", "_").strip()
@@ -14,6 +15,13 @@ def _norm(sym: str) -> str:
 def _real(sym: str) -> str:
     return sym.upper().replace("_", "/")
 
+def last_prices(trader, symbols) -> Dict[str, float]:
+    """{SYMBOL: prezzo | None}: una chiamata batch se il trader la supporta, altrimenti una per simbolo."""
+    symbols = [_real(s) for s in symbols]
+    if hasattr(trader, "get_last_prices"):
+        return trader.get_last_prices(symbols)
+    return {s: trader.get_last_price(s) for s in symbols}
+
 # === NUOVO: trader che non fa nulla (silenzioso) ===
 class _NoOpTrader:
     def buy(self, symbol: str, qty: float): 
@@ -26,16 +34,26 @@ class _NoOpTrader:
         return a
     def get_last_price(self, symbol: str):
         return 0.0
+    def get_last_prices(self, symbols):
+        return {s.upper(): 0.0 for s in symbols}
 
 class PortfolioManager:
     def __init__(self, config_path: str = "config/portfolio.yaml",
                  broker_enabled: bool = True,        # <-- NUOVO
-                 trader=None):                        # <-- opzionale override trader
+                 trader=None,                         # <-- opzionale override trader
+                 stock_state: StockStateManager | None = None,
+                 state_backend=None,
+                 order_pipeline=None):
         self.config_path = config_path
         self.broker_enabled = bool(broker_enabled)    # <-- NUOVO
 
-        # stato e config
-        self.stock_state = StockStateManager()
+        # stato e config: senza broker (backtest) lo stato resta in memoria e non tocca
+        # data/stock_state.yaml; state_backend = "memory" | "file" | istanza di backend
+        if stock_state is None:
+            if state_backend is None:
+                state_backend = "file" if self.broker_enabled else "memory"
+            stock_state = StockStateManager(backend=make_state_backend(state_backend))
+        self.stock_state = stock_state
         self.initial_budget: float = 0.0
         self.allocations: Dict[str, float] = {}
         self.stock_cash: Dict[str, float] = {}
@@ -44,6 +62,9 @@ class PortfolioManager:
         self.reinvest_ratio: Dict[str, float] = {}
         self.default_reinvest_ratio: float = 1.0
 
+        # registro dei trade (attivo solo se è una lista): (side, stock, qty, price, pnl_pool_part)
+        self.ledger: list | None = None
+
         self._load_config()
 
         # trader: reale o no-op
@@ -52,6 +73,15 @@ class PortfolioManager:
         else:
             self.trader = get_trading_interface() if self.broker_enabled else _NoOpTrader()
 
+        # ordini: con broker abilitato passano dalla pipeline asincrona (book_* non fanno I/O,
+        # stato e cash si aggiornano sui fill); order_pipeline=False = invio sincrono
+        self._lock = threading.RLock()
+        if order_pipeline is None and self.broker_enabled:
+            order_pipeline = OrderPipeline(self.trader)
+        self.orders: OrderPipeline | None = order_pipeline or None
+        if self.orders is not None:
+            self.orders.on_fill = self._on_fill
+
     def _load_config(self):
         if not os.path.exists(self.config_path):
             raise FileNotFoundError(f"Portfolio config non trovata: {self.config_path}")
@@ -78,48 +108,85 @@ class PortfolioManager:
 
     # --- booking trade ---
     def book_buy(self, stock: str, qty: float, price: float):
+        """Ritorna l'id dell'ordine se passa dalla pipeline (applicato al fill), altrimenti None."""
         s = _norm(stock)
         notional = qty * price
         cash = self.stock_cash.get(s, 0.0)
         if notional > cash + 1e-9:
             print(f"[Portfolio] WARN: cash insufficiente per {s}: need {notional:.2f}, have {cash:.2f}")
 
+        if self.orders is not None:
+            return self.orders.submit(_real(s), "buy", qty, price)
         # SOLO se broker abilitato inviamo l'ordine reale
         if self.broker_enabled:
             self.trader.buy(_real(s), qty)
         # Aggiorna lo stato interno sempre
-        self.stock_state.update_on_buy(s, qty, notional)
-        self.stock_cash[s] = cash - notional
+        self._apply_buy(s, qty, price)
 
     def book_sell(self, stock: str, qty: float, price: float):
         s = _norm(stock)
-        st = deepcopy(self.stock_state.get_state(s)) or {}
-        cur_qty = float(st.get("quantity", 0))
-        invested = float(st.get("money_invested", 0.0))
-        avg_cost = (invested / cur_qty) if cur_qty > 0 else 0.0
-
-        proceeds = qty * price
-        principal = qty * avg_cost
-        profit = proceeds - principal
-
+        if self.orders is not None:
+            # non rivendere quantità già impegnata in vendite non ancora eseguite
+            qty = min(qty, float(self.stock_state.get_quantity(s)) - self.orders.pending_qty(_real(s), "sell"))
+            if qty <= 0:
+                return None
+            return self.orders.submit(_real(s), "sell", qty, price)
         if self.broker_enabled:
             self.trader.sell(_real(s), qty)
-        self.stock_state.update_on_sell(s, qty, proceeds)
+        self._apply_sell(s, qty, price)
 
-        rratio = self.get_reinvest_ratio(s)
-        reinvest_profit = max(0.0, profit) * rratio
-        pnl_pool_part = profit - reinvest_profit
+    def _on_fill(self, ticket, qty: float, price: float):
+        """Fill (anche parziale) riconciliato dalla pipeline: qty e prezzo della sola parte nuova."""
+        s = _norm(ticket.symbol)
+        if ticket.side == "buy":
+            self._apply_buy(s, qty, price)
+        else:
+            self._apply_sell(s, qty, price)
 
-        self.stock_cash[s] = self.stock_cash.get(s, 0.0) + principal + reinvest_profit
-        self.realized_pnl_pool += pnl_pool_part
+    def _apply_buy(self, s: str, qty: float, price: float):
+        notional = qty * price
+        with self._lock:
+            self.stock_state.update_on_buy(s, qty, notional)
+            self.stock_cash[s] = self.stock_cash.get(s, 0.0) - notional
+            if self.ledger is not None:
+                self.ledger.append(("buy", s, qty, price, 0.0))
+
+    def _apply_sell(self, s: str, qty: float, price: float):
+        with self._lock:
+            pos = self.stock_state.get_position(s)
+            cur_qty = float(pos.quantity) if pos is not None else 0.0
+            invested = float(pos.money_invested) if pos is not None else 0.0
+            avg_cost = (invested / cur_qty) if cur_qty > 0 else 0.0
+
+            proceeds = qty * price
+            principal = qty * avg_cost
+            profit = proceeds - principal
+
+            self.stock_state.update_on_sell(s, qty, proceeds)
+
+            rratio = self.get_reinvest_ratio(s)
+            reinvest_profit = max(0.0, profit) * rratio
+            pnl_pool_part = profit - reinvest_profit
+
+            self.stock_cash[s] = self.stock_cash.get(s, 0.0) + principal + reinvest_profit
+            self.realized_pnl_pool += pnl_pool_part
+            if self.ledger is not None:
+                self.ledger.append(("sell", s, qty, price, pnl_pool_part))
+
+    def close(self):
+        """Attende l'invio degli ordini accodati, ferma la pipeline e compatta lo stato su disco."""
+        if self.orders is not None:
+            self.orders.close()
+        # dopo la pipeline: i fill riconciliati in chiusura finiscono nello snapshot
+        self.stock_state.close()
 
     def snapshot(self) -> Dict[str, Any]:
         rows = {}
         total_holdings = total_cash_alloc = 0.0
+        prices = last_prices(self.trader, self.allocations)
         for s, w in self.allocations.items():
-            st = self.stock_state.get_state(s) or {}
-            qty = float(st.get("quantity", 0))
-            last = self.trader.get_last_price(_real(s)) or 0.0
+            qty = float(self.stock_state.get_quantity(s))
+            last = prices.get(_real(s)) or 0.0
             val = qty * last
             cash = self.stock_cash.get(s, 0.0)
             rows[s] = {
@@ -0,0 +1,199 @@
+# trading_system/utils/profiling.py
+from __future__ import annotations
+import os
+import sys
+import time
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+# Profilazione a caldo del processo interattivo (comandi `profile` e `memsnap` di main.py):
+# niente riavvii, i thread delle strategie e le posizioni aperte non vengono toccati.
+
+PROFILE_DIR = "logs"
+MAX_DEPTH = 128
+
+
+def _stamp() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+# ===================== CPU =====================
+
+class SamplingProfiler:
+    """
+    Profiler a campionamento di tutti i thread del processo.
+
+    Un thread daemon legge ogni `interval` secondi gli stack correnti (sys._current_frames)
+    e conta le pile per thread; stop() scrive il file in formato "folded"
+    (`thread;frame;...;frame conteggio`, una riga per pila) leggibile da flamegraph.pl,
+    speedscope o inferno. Il costo per campione è proporzionale al numero di thread e alla
+    profondità delle pile, non al lavoro svolto: i thread campionati non sono strumentati.
+    """
+    def __init__(self, interval: float = 0.01, out_dir: str = PROFILE_DIR):
+        if interval <= 0:
+            raise ValueError("interval deve essere > 0")
+        self.interval = float(interval)
+        self.out_dir = out_dir
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._labels: Dict[object, str] = {}     # code object -> etichetta del frame
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, interval: Optional[float] = None) -> None:
+        if self.running:
+            raise RuntimeError("profiler già attivo")
+        if interval is not None:
+            if interval <= 0:
+                raise ValueError("interval deve essere > 0")
+            self.interval = float(interval)
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = time.monotonic()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="SamplingProfiler", daemon=True)
+        self._thread.start()
+
+    def stop(self, path: Optional[str] = None) -> Tuple[str, dict]:
+        """Ferma il campionamento e scrive le pile; ritorna (percorso, riepilogo)."""
+        if not self.running:
+            raise RuntimeError("profiler non attivo")
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        elapsed = time.monotonic() - self.started_at
+        path = path or os.path.join(self.out_dir, f"profile_{_stamp()}.folded")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in sorted(self.stacks.items()):
+                f.write(f"{stack} {n}\n")
+        return path, self.summary(elapsed)
+
+    # ---------- campionamento ----------
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            # ';' separa i frame e lo spazio finale il conteggio: niente ';' nelle etichette
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            label = self._labels[code] = label.replace(";", ":")
+        return label
+
+    def _loop(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.sample(skip=me)
+
+    def sample(self, skip: Optional[int] = None) -> None:
+        """Un campione di tutti i thread (tranne `skip`)."""
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == skip:
+                continue
+            frames: List[str] = []
+            while frame is not None and len(frames) < MAX_DEPTH:
+                frames.append(self._label(frame.f_code))
+                frame = frame.f_back
+            frames.append(names.get(ident, f"thread-{ident}").replace(";", ":").replace(" ", "_"))
+            self.stacks[";".join(reversed(frames))] += 1
+        self.samples += 1
+
+    # ---------- lettura ----------
+    def summary(self, elapsed: Optional[float] = None, top: int = 10) -> dict:
+        """Campioni per thread e funzioni con più tempo "self" (foglia della pila)."""
+        by_thread: Counter = Counter()
+        leaves: Counter = Counter()
+        for stack, n in self.stacks.items():
+            parts = stack.split(";")
+            by_thread[parts[0]] += n
+            if len(parts) > 1:
+                leaves[parts[-1]] += n
+        return {
+            "samples": self.samples,
+            "seconds": elapsed if elapsed is not None else
+                       (time.monotonic() - self.started_at if self.started_at else 0.0),
+            "threads": dict(by_thread.most_common()),
+            "top_self": leaves.most_common(top),
+        }
+
+# ===================== MEMORIA =====================
+
+class MemorySnapshots:
+    """
+    Diff di snapshot tracemalloc tra chiamate successive di snap().
+
+    La prima chiamata avvia tracemalloc (se non già attivo) e prende la baseline; ogni
+    chiamata successiva scrive in logs/ un report con le righe di codice la cui memoria è
+    cresciuta di più dall'ultimo snapshot e le allocazioni vive più grandi. tracemalloc
+    rallenta le allocazioni finché è attivo: stop() lo spegne.
+    """
+    _FILTERS = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+
+    def __init__(self, frames: int = 1, out_dir: str = PROFILE_DIR):
+        self.frames = max(1, int(frames))
+        self.out_dir = out_dir
+        self._prev: Optional[tracemalloc.Snapshot] = None
+        self._owned = False     # tracemalloc avviato da noi (stop() lo spegne)
+
+    @property
+    def active(self) -> bool:
+        return self._prev is not None and tracemalloc.is_tracing()
+
+    def _take(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(self._FILTERS)
+
+    def snap(self, top: int = 25, path: Optional[str] = None) -> Optional[str]:
+        """Baseline alla prima chiamata (ritorna None), poi report del diff; ritorna il percorso."""
+        if not self.active:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+                self._owned = True
+            self._prev = self._take()
+            return None
+        cur = self._take()
+        key = "traceback" if self.frames > 1 else "lineno"
+        diff = cur.compare_to(self._prev, key)
+        live = cur.statistics(key)
+        size, peak = tracemalloc.get_traced_memory()
+        path = path or os.path.join(self.out_dir, f"memsnap_{_stamp()}.txt")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"tracemalloc: {size / 2**20:.2f} MiB tracciati, picco {peak / 2**20:.2f} MiB\n")
+            f.write(f"delta totale dall'ultimo snapshot: "
+                    f"{sum(s.size_diff for s in diff) / 2**10:+.1f} KiB\n")
+            f.write(f"\n=== top {top} crescite dall'ultimo snapshot ===\n")
+            for s in diff[:top]:
+                f.write(f"{s.size_diff / 2**10:+12.1f} KiB {s.count_diff:+9d} blocchi  "
+                        f"(tot {s.size / 2**10:.1f} KiB)\n")
+                f.write(self._where(s.traceback))
+            f.write(f"\n=== top {top} allocazioni vive ===\n")
+            for s in live[:top]:
+                f.write(f"{s.size / 2**10:12.1f} KiB {s.count:9d} blocchi\n")
+                f.write(self._where(s.traceback))
+        self._prev = cur
+        return path
+
+    @staticmethod
+    def _where(tb: tracemalloc.Traceback) -> str:
+        return "".join(f"      {fr.filename}:{fr.lineno}\n" for fr in tb)
+
+    def stop(self) -> None:
+        self._prev = None
+        if self._owned and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._owned = False
+
+
+PROFILER = SamplingProfiler()
+MEMSNAP = MemorySnapshots()
@@ -0,0 +1,109 @@
+# trading_system/utils/quote_cache.py
+from __future__ import annotations
+import os
+import time
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .bars import NS_PER_MIN, NS_PER_SEC
+
+# fetcher(symbols) -> {symbol: price}; i simboli passati sono già normalizzati (BTC/USD, AAPL)
+Fetcher = Callable[[List[str]], Dict[str, float]]
+
+QUOTE_TTL_ENV = "QUOTE_TTL"
+QUOTE_MAX_STALE_ENV = "QUOTE_MAX_STALE"
+QUOTE_BAR_GRACE_ENV = "QUOTE_BAR_GRACE"
+
+
+def _norm(symbol: str) -> str:
+    return symbol.strip().upper().replace("_", "/")
+
+
+def asset_class(symbol: str) -> str:
+    """'crypto' per le coppie (BTC/USD), 'stock' altrimenti."""
+    return "crypto" if "/" in symbol else "stock"
+
+
+class QuoteCache:
+    """
+    Cache dei last price con TTL.
+
+      - get_last_prices(symbols): i prezzi più recenti di `ttl` secondi vengono dalla cache,
+        gli altri con UNA richiesta batch per classe di asset (crypto / stock) tramite fetcher;
+      - policy di staleness: se il refresh fallisce o non restituisce il simbolo, un prezzo
+        scaduto viene comunque servito se ha meno di `max_stale` secondi (0 = mai);
+      - put()/on_bar(): alimentazione passiva dallo stream live (MarketDataHub.add_tap),
+        così con lo stream attivo snapshot e status non fanno nessuna chiamata REST: un
+        prezzo arrivato con una barra resta fresco per la durata della barra più `bar_grace`
+        secondi (la barra successiva arriva entro quella finestra), non solo per `ttl`.
+    """
+    def __init__(self, fetcher: Optional[Fetcher] = None, ttl: Optional[float] = None,
+                 max_stale: Optional[float] = None, clock: Callable[[], float] = time.monotonic,
+                 bar_grace: Optional[float] = None):
+        self.fetcher = fetcher
+        self.ttl = float(ttl if ttl is not None else os.getenv(QUOTE_TTL_ENV, 5.0))
+        self.max_stale = float(max_stale if max_stale is not None else os.getenv(QUOTE_MAX_STALE_ENV, 300.0))
+        self.bar_grace = float(bar_grace if bar_grace is not None else os.getenv(QUOTE_BAR_GRACE_ENV, 15.0))
+        self._clock = clock
+        self._lock = threading.Lock()
+        # symbol -> (price, t_ricezione, scadenza della freschezza)
+        self._quotes: Dict[str, Tuple[float, float, float]] = {}
+        self.requests = 0
+
+    # ---------- alimentazione ----------
+    def put(self, symbol: str, price: float, at: Optional[float] = None, ttl: Optional[float] = None) -> None:
+        """Prezzo fresco per `ttl` secondi da `at` (default: ttl della cache, da adesso)."""
+        if price is None:
+            return
+        t = self._clock() if at is None else at
+        with self._lock:
+            self._quotes[_norm(symbol)] = (float(price), t, t + (self.ttl if ttl is None else ttl))
+
+    def put_many(self, prices: Dict[str, float]) -> None:
+        now = self._clock()
+        with self._lock:
+            for s, p in prices.items():
+                if p is not None:
+                    self._quotes[_norm(s)] = (float(p), now, now + self.ttl)
+
+    def on_bar(self, bar) -> None:
+        """Callback per le barre dello stream: la close è l'ultimo prezzo noto fino alla barra successiva."""
+        window = getattr(bar, "tf_ns", NS_PER_MIN) / NS_PER_SEC + self.bar_grace
+        self.put(bar["symbol"], bar["close"], ttl=max(self.ttl, window))
+
+    # ---------- lettura ----------
+    def get_last_price(self, symbol: str) -> Optional[float]:
+        return self.get_last_prices([symbol]).get(_norm(symbol))
+
+    def get_last_prices(self, symbols: Iterable[str]) -> Dict[str, Optional[float]]:
+        """{simbolo normalizzato: prezzo | None}; al più una richiesta per classe di asset."""
+        syms = list(dict.fromkeys(_norm(s) for s in symbols))
+        now = self._clock()
+        out: Dict[str, Optional[float]] = {}
+        missing: Dict[str, List[str]] = {}
+        with self._lock:
+            for s in syms:
+                q = self._quotes.get(s)
+                if q is not None and now <= q[2]:
+                    out[s] = q[0]
+                else:
+                    missing.setdefault(asset_class(s), []).append(s)
+
+        if missing and self.fetcher is not None:
+            for group in missing.values():
+                try:
+                    self.requests += 1
+                    fetched = self.fetcher(group) or {}
+                except Exception as e:
+                    print(f"[QuoteCache] refresh fallito per {group}: {e}")
+                    fetched = {}
+                self.put_many({_norm(k): v for k, v in fetched.items()})
+
+        now = self._clock()
+        with self._lock:
+            for group in missing.values():
+                for s in group:
+                    q = self._quotes.get(s)
+                    fresh = q is not None and now <= q[2]
+                    out[s] = q[0] if q is not None and (fresh or now - q[1] <= self.max_stale) else None
+        return out
@@ -0,0 +1,119 @@
+# trading_system/utils/resample.py
+from __future__ import annotations
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from trading_system.utils.bars import BarArrays, NS_PER_MIN
+
+# ===================== BUCKET MATH (condivisa backtest/live) =====================
+#
+# I bucket sono allineati all'epoch UTC: start = t - (t mod tf). Per i tf che dividono l'ora
+# coincide con il vecchio "minute % tf"; funziona anche per 90m, 4h, 1d (mezzanotte UTC), ecc.
+
+def bucket_start_ns(t, timeframe_minutes: int):
+    """Inizio del bucket (epoch-ns) per un int o un array int64 di timestamp."""
+    tf_ns = int(timeframe_minutes) * NS_PER_MIN
+    return t - t % tf_ns
+
+
+def _segments(starts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Indici di inizio e fine (inclusa) di ogni run di bucket uguali in un array ordinato."""
+    n = len(starts)
+    change = np.flatnonzero(starts[1:] != starts[:-1]) + 1
+    first = np.concatenate(([0], change))
+    last = np.concatenate((change - 1, [n - 1]))
+    return first, last
+
+
+def _reduce(bars: BarArrays, timeframe_minutes: int) -> BarArrays:
+    """Riduzione segmentata first/max/min/last/sum; t = inizio bucket."""
+    if not len(bars):
+        return BarArrays.empty()
+    starts = bucket_start_ns(bars.t, timeframe_minutes)
+    first, last = _segments(starts)
+    return BarArrays(
+        starts[first],
+        bars.o[first],
+        np.maximum.reduceat(bars.h, first),
+        np.minimum.reduceat(bars.l, first),
+        bars.c[last],
+        np.add.reduceat(bars.v, first),
+    )
+
+
+def _relabel(bars: BarArrays, timeframe_minutes: int, label: str) -> BarArrays:
+    if label == "left":
+        return bars
+    if label == "right":
+        return BarArrays(bars.t + int(timeframe_minutes) * NS_PER_MIN, bars.o, bars.h, bars.l, bars.c, bars.v)
+    raise ValueError(f"label non valido: {label} (usa 'left' o 'right')")
+
+
+def resample(bars: BarArrays, timeframe_minutes: int, label: str = "left") -> BarArrays:
+    """
+    Aggrega barre ordinate al timeframe richiesto.
+    label='left' -> t = inizio finestra, label='right' -> t = fine finestra (convenzione del backtest).
+    """
+    if timeframe_minutes < 1:
+        raise ValueError("timeframe_minutes deve essere >= 1")
+    return _relabel(_reduce(bars, timeframe_minutes), timeframe_minutes, label)
+
+
+def resample_many(bars: BarArrays, timeframes: Iterable[int], label: str = "left") -> Dict[int, BarArrays]:
+    """
+    Costruisce più timeframe in una sola passata sui dati sorgente: ogni tf viene ridotto
+    dal tf più grande già calcolato che lo divide (es. 1m -> 5m -> 15m -> 1h -> 4h -> 1d),
+    quindi solo il primo livello scorre tutte le barre in ingresso.
+    """
+    done: Dict[int, BarArrays] = {}
+    for tf in sorted(set(int(x) for x in timeframes)):
+        if tf < 1:
+            raise ValueError("timeframe_minutes deve essere >= 1")
+        parents = [p for p in done if tf % p == 0]
+        src = done[max(parents)] if parents else bars
+        done[tf] = _reduce(src, tf)
+    return {tf: _relabel(b, tf, label) for tf, b in done.items()}
+
+
+# ===================== STREAMING =====================
+
+class BarBucketer:
+    """
+    Versione incrementale della stessa bucket math, per lo stream live.
+    add() accumula una barra; quando arriva la prima barra di un bucket nuovo
+    restituisce il bucket precedente chiuso come (start_ns, o, h, l, c, v).
+    """
+    __slots__ = ("tf", "tf_ns", "start", "o", "h", "l", "c", "v")
+
+    def __init__(self, timeframe_minutes: int):
+        if timeframe_minutes < 1:
+            raise ValueError("timeframe_minutes deve essere >= 1")
+        self.tf = int(timeframe_minutes)
+        self.tf_ns = self.tf * NS_PER_MIN
+        self.start: Optional[int] = None
+        self.o = self.h = self.l = self.c = 0.0
+        self.v = 0.0
+
+    def add(self, t_ns: int, o: float, h: float, l: float, c: float, v: float = 0.0):
+        start = t_ns - t_ns % self.tf_ns
+        closed = None
+        if self.start is not None and start != self.start:
+            closed = (self.start, self.o, self.h, self.l, self.c, self.v)
+            self.start = None
+        if self.start is None:
+            self.start = start
+            self.o = o; self.h = h; self.l = l; self.c = c; self.v = v
+        else:
+            if h > self.h: self.h = h
+            if l < self.l: self.l = l
+            self.c = c
+            self.v += v
+        return closed
+
+    def flush(self):
+        if self.start is None:
+            return None
+        closed = (self.start, self.o, self.h, self.l, self.c, self.v)
+        self.start = None
+        return closed
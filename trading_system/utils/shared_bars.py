@@ -0,0 +1,68 @@
+# trading_system/utils/shared_bars.py
+from __future__ import annotations
+from multiprocessing import shared_memory
+from typing import Tuple
+
+import numpy as np
+
+from trading_system.utils.bars import BarArrays
+
+# Barre condivise fra processi senza pickling: un blocco multiprocessing.shared_memory
+# con le 6 colonne contigue (t int64, poi o/h/l/c/v float64). Al worker si passa solo
+# l'handle {"name", "rows"}; le colonne lato worker sono viste sul blocco (zero-copy).
+
+_ITEM = 8  # int64 / float64
+
+
+def share_bars(bars: BarArrays) -> Tuple[shared_memory.SharedMemory, dict]:
+    """Copia le barre in un nuovo blocco condiviso. Il chiamante fa close()+unlink() a fine uso."""
+    n = len(bars)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, n * _ITEM * len(BarArrays.COLUMNS)))
+    for i, col in enumerate(BarArrays.COLUMNS):
+        dst = np.ndarray((n,), dtype=np.int64 if col == "t" else np.float64, buffer=shm.buf, offset=i * n * _ITEM)
+        dst[:] = getattr(bars, col)
+        del dst
+    return shm, {"name": shm.name, "rows": n}
+
+
+def attach_bars(handle: dict) -> Tuple[shared_memory.SharedMemory, BarArrays]:
+    """
+    Apre un blocco creato da share_bars. Le colonne restituite sono viste sul blocco:
+    vanno rilasciate (del) prima di shm.close().
+    """
+    shm = shared_memory.SharedMemory(name=handle["name"])
+    n = int(handle["rows"])
+    cols = [
+        np.ndarray((n,), dtype=np.int64 if col == "t" else np.float64, buffer=shm.buf, offset=i * n * _ITEM)
+        for i, col in enumerate(BarArrays.COLUMNS)
+    ]
+    return shm, BarArrays(*cols)
+
+
+def share_array(a: np.ndarray) -> Tuple[shared_memory.SharedMemory, dict]:
+    """Come share_bars per un generico array float64 (es. cache di indicatori, una riga per serie)."""
+    a = np.ascontiguousarray(a, dtype=np.float64)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, a.nbytes))
+    dst = np.ndarray(a.shape, dtype=np.float64, buffer=shm.buf)
+    dst[...] = a
+    del dst
+    return shm, {"name": shm.name, "shape": list(a.shape)}
+
+
+def attach_array(handle: dict) -> Tuple[shared_memory.SharedMemory, np.ndarray]:
+    """Apre un blocco creato da share_array; l'array è una vista (del prima di shm.close())."""
+    shm = shared_memory.SharedMemory(name=handle["name"])
+    return shm, np.ndarray(tuple(handle["shape"]), dtype=np.float64, buffer=shm.buf)
+
+
+def release(shm: shared_memory.SharedMemory, unlink: bool = False) -> None:
+    try:
+        shm.close()
+    except BufferError:
+        # restano viste vive sul blocco: verrà chiuso alla loro distruzione
+        pass
+    if unlink:
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,206 @@
+# trading_system/utils/sim_trading_interface.py
+from __future__ import annotations
+import os
+import time
+import uuid
+import random
+import threading
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+from .base_interface import TradingInterface
+from .quote_cache import QuoteCache, _norm
+from .bar_store import BarStore, STORE_ROOT
+from .bars import Bar, to_ns
+
+# parametri di default (sovrascrivibili da env o kwargs)
+SIM_ENV = {
+    "latency_ms": ("SIM_LATENCY_MS", 50.0),          # ritardo fra invio e (primo) fill
+    "slippage_bps": ("SIM_SLIPPAGE_BPS", 2.0),       # slippage avverso sul prezzo di fill
+    "partial_prob": ("SIM_PARTIAL_PROB", 0.0),       # probabilità che il primo fill sia parziale
+    "reject_prob": ("SIM_REJECT_PROB", 0.0),         # probabilità di rifiuto casuale
+    "rate_limit": ("SIM_RATE_LIMIT", 0.0),           # ordini/minuto ammessi (0 = nessun limite)
+    "cash": ("SIM_CASH", 100_000.0),                 # cash iniziale del conto simulato
+}
+
+
+class RateLimitError(RuntimeError):
+    """Come la 429 del broker: l'ordine non viene accettato."""
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+# ===================== PREZZI =====================
+
+class SimQuotes(QuoteCache):
+    """
+    Last price del simulatore. Le barre del replay (o dello stream) arrivano con on_bar()
+    tramite MarketDataHub.add_tap e fanno avanzare anche l'orologio simulato `now_ns`;
+    un simbolo mai visto viene letto dallo store locale: ultima close 1m <= now_ns,
+    così il simulatore non vede mai barre "future" rispetto al replay.
+    """
+    def __init__(self, store: Optional[BarStore] = None, timeframe_minutes: int = 1):
+        super().__init__(self._from_store, ttl=float("inf"), max_stale=float("inf"))
+        self.store = store or BarStore(STORE_ROOT)
+        self.tf = int(timeframe_minutes)
+        self.now_ns: Optional[int] = None
+
+    def on_bar(self, bar) -> None:
+        t = bar.t if isinstance(bar, Bar) else to_ns(bar["timestamp"])
+        if self.now_ns is None or t > self.now_ns:
+            self.now_ns = t
+        super().on_bar(bar)
+
+    def _from_store(self, symbols: List[str]) -> Dict[str, float]:
+        out = {}
+        for s in symbols:
+            bars = self.store.load(s, self.tf, None, self.now_ns)
+            if len(bars):
+                out[s] = float(bars.c[-1])
+        return out
+
+# ===================== BROKER SIMULATO =====================
+
+class SimulatedTradingInterface(TradingInterface):
+    """
+    Broker locale con la stessa interfaccia di AlpacaTradingInterface (buy/sell sincroni,
+    submit_order/get_order per la OrderPipeline), senza rete.
+
+      - latenza: un ordine resta "accepted" per `latency_ms` (tempo reale) prima del fill;
+      - slippage: fill al last price di quel momento, peggiorato di `slippage_bps`;
+      - fill parziali: con probabilità `partial_prob` il primo fill copre il 20-80% e il
+        resto arriva dopo un'altra latenza;
+      - rifiuti: casuali (`reject_prob`), per cash insufficiente o quantità non posseduta;
+      - rate limit: più di `rate_limit` ordini nell'ultimo minuto -> RateLimitError.
+
+    I fill sono risolti in modo pigro quando la pipeline interroga get_order(), come un
+    broker reale visto in polling. `seed` rende ripetibili rifiuti e parziali.
+    """
+    def __init__(self, quotes: Optional[SimQuotes] = None, seed: Optional[int] = None,
+                 clock: Callable[[], float] = time.monotonic, **params):
+        unknown = set(params) - set(SIM_ENV)
+        if unknown:
+            raise ValueError(f"Parametri simulatore sconosciuti: {sorted(unknown)}")
+        for key, (env, default) in SIM_ENV.items():
+            setattr(self, key, float(params[key]) if key in params else _env_float(env, default))
+        self.quotes = quotes or SimQuotes()
+        seed = seed if seed is not None else os.getenv("SIM_SEED")
+        self._rng = random.Random(None if seed is None else int(seed))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._orders: Dict[str, dict] = {}
+        self._sent: List[float] = []                    # istanti degli invii (rate limit)
+        self.positions: Dict[str, List[float]] = {}     # symbol -> [qty, costo]
+        self.fills = 0
+        self.rejects = 0
+
+    # ---------- prezzi ----------
+    def get_last_price(self, symbol: str):
+        return self.quotes.get_last_price(symbol)
+
+    def get_last_prices(self, symbols):
+        return self.quotes.get_last_prices(symbols)
+
+    # ---------- ordini ----------
+    def submit_order(self, symbol: str, side: str, qty: float, client_order_id: str = None):
+        now = self._clock()
+        sym = _norm(symbol)
+        with self._lock:
+            if self.rate_limit > 0:
+                self._sent = [t for t in self._sent if now - t < 60.0]
+                if len(self._sent) >= self.rate_limit:
+                    raise RateLimitError(f"429 rate limit: {int(self.rate_limit)} ordini/minuto")
+                self._sent.append(now)
+            order = {
+                "id": uuid.uuid4().hex, "client_order_id": client_order_id,
+                "symbol": sym, "side": side, "qty": float(qty),
+                "status": "accepted", "filled_qty": 0.0, "filled_avg_price": 0.0,
+                "next_fill": now + self.latency_ms / 1000.0, "reason": None,
+            }
+            if self.reject_prob > 0 and self._rng.random() < self.reject_prob:
+                self._reject(order, "rifiuto simulato")
+            self._orders[order["id"]] = order
+            return self._update(order)
+
+    def get_order(self, order_id: str):
+        with self._lock:
+            order = self._orders[order_id]
+            self._advance(order, self._clock())
+            return self._update(order)
+
+    def buy(self, symbol: str, qty: float):
+        return self._submit_and_wait(symbol, "buy", qty)
+
+    def sell(self, symbol: str, qty: float):
+        return self._submit_and_wait(symbol, "sell", qty)
+
+    def _submit_and_wait(self, symbol: str, side: str, qty: float):
+        # percorso sincrono (senza pipeline): blocca per la latenza come una REST call
+        update = self.submit_order(symbol, side, qty)
+        while update["status"] not in ("filled", "rejected", "canceled"):
+            time.sleep(self.latency_ms / 1000.0)
+            update = self.get_order(update["id"])
+        return update
+
+    # ---------- matching ----------
+    def _advance(self, order: dict, now: float) -> None:
+        while order["status"] in ("accepted", "partially_filled") and now >= order["next_fill"]:
+            price = self.quotes.get_last_price(order["symbol"])
+            if not price:
+                self._reject(order, "prezzo non disponibile")
+                return
+            slip = self.slippage_bps / 10_000.0
+            price *= (1.0 + slip) if order["side"] == "buy" else (1.0 - slip)
+
+            remaining = order["qty"] - order["filled_qty"]
+            qty = remaining
+            if order["status"] == "accepted" and self.partial_prob > 0 and self._rng.random() < self.partial_prob:
+                qty = remaining * self._rng.uniform(0.2, 0.8)
+            if not self._book(order, qty, price):
+                return
+            done = order["filled_qty"] + qty
+            order["filled_avg_price"] = (order["filled_qty"] * order["filled_avg_price"] + qty * price) / done
+            order["filled_qty"] = done
+            order["status"] = "filled" if qty >= remaining else "partially_filled"
+            order["next_fill"] += self.latency_ms / 1000.0
+            self.fills += 1
+
+    def _book(self, order: dict, qty: float, price: float) -> bool:
+        pos = self.positions.setdefault(order["symbol"], [0.0, 0.0])
+        if order["side"] == "buy":
+            if qty * price > self.cash + 1e-9:
+                self._reject(order, "cash insufficiente")
+                return False
+            self.cash -= qty * price
+            pos[0] += qty
+            pos[1] += qty * price
+        else:
+            if qty > pos[0] + 1e-9:
+                self._reject(order, "quantità non disponibile")
+                return False
+            avg = pos[1] / pos[0] if pos[0] > 0 else 0.0
+            self.cash += qty * price
+            pos[0] -= qty
+            pos[1] -= qty * avg
+        return True
+
+    def _reject(self, order: dict, reason: str) -> None:
+        # un ordine già parzialmente eseguito si chiude come "canceled" (il fill resta)
+        order["status"] = "canceled" if order["filled_qty"] > 0 else "rejected"
+        order["reason"] = reason
+        self.rejects += 1
+
+    @staticmethod
+    def _update(order: dict) -> dict:
+        return {k: order[k] for k in ("id", "status", "filled_qty", "filled_avg_price", "reason")}
+
+    # ---------- conto ----------
+    def get_position(self, symbol: str):
+        pos = self.positions.get(_norm(symbol))
+        if not pos or pos[0] <= 0:
+            return None
+        return SimpleNamespace(symbol=_norm(symbol), qty=pos[0], avg_entry_price=pos[1] / pos[0])
+
+    def get_account(self):
+        return SimpleNamespace(cash=self.cash, buying_power=self.cash)
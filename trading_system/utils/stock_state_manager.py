@@ -1,78 +1,246 @@
 import yaml
+import json
 import threading
 import os
 
 STATE_FILE = "data/stock_state.yaml"
+JOURNAL_SUFFIX = ".journal"
+# ogni quanti record di journal si riscrive lo snapshot
+COMPACT_EVERY = 1000
 
-class StockStateManager:
+# ===================== POSIZIONI =====================
+
+class Position:
+    """Stato di uno stock con attributi semplici (niente dict copiati a ogni lettura)."""
+    __slots__ = ("money_invested", "quantity", "realized_pnl")
+
+    def __init__(self, money_invested=0.0, quantity=0, realized_pnl=0.0):
+        self.money_invested = money_invested
+        self.quantity = quantity
+        self.realized_pnl = realized_pnl
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d.get("money_invested", 0.0), d.get("quantity", 0), d.get("realized_pnl", 0.0))
+
+    def to_dict(self):
+        return {"money_invested": self.money_invested, "quantity": self.quantity,
+                "realized_pnl": self.realized_pnl}
+
+# ===================== BACKEND =====================
+
+class MemoryStateBackend:
+    """Nessuna persistenza: default per backtest e sweep (non tocca il file di stato live)."""
+    def load(self):
+        return {}
+
+    def commit(self, stock, state, all_states):
+        pass
+
+    def compact(self, all_states):
+        pass
+
+    def close(self, all_states):
+        pass
+
+
+class FileStateBackend:
     """
-        Class that manages to save the state of the transactions 
-        and keep track of it 
+    Persistenza a journal (write-ahead):
+      - data/stock_state.yaml          snapshot YAML, prima riga "# seq: N"
+      - data/stock_state.yaml.journal  un record JSON per riga con lo stato
+                                       completo dello stock toccato: {"seq", "stock", "state"}
+    Ogni trade appende e fa fsync di un solo record (costo O(1) rispetto al numero
+    di simboli); ogni COMPACT_EVERY record lo snapshot viene riscritto in modo atomico
+    (tmp + fsync + replace) e il journal svuotato. All'avvio: snapshot + replay dei
+    record con seq > N. Una riga troncata in coda (crash durante la scrittura) viene scartata.
     """
+    def __init__(self, state_file=STATE_FILE, compact_every=COMPACT_EVERY, fsync=True):
+        self.state_file = state_file
+        self.journal_file = state_file + JOURNAL_SUFFIX
+        self.compact_every = int(compact_every)
+        self.fsync = bool(fsync)
+        self.seq = 0
+        self._journal = None
+        self._journal_records = 0
 
+    # ---------- caricamento ----------
+    def load(self):
+        state = self._load_snapshot()
+        valid_end = self._replay_journal(state)
+        self._open_journal(valid_end)
+        return state
 
-    def __init__(self):
-        self.lock = threading.Lock()
-        self.state = self._load_state()
-
-    def _load_state(self):
-        if not os.path.exists(STATE_FILE):
+    def _load_snapshot(self):
+        if not os.path.exists(self.state_file):
             return {}
-        with open(STATE_FILE, 'r') as f:
-            return yaml.safe_load(f) or {}
+        with open(self.state_file, 'r') as f:
+            text = f.read()
+        first = text.split("\n", 1)[0]
+        if first.startswith("# seq:"):
+            try:
+                self.seq = int(first[len("# seq:"):].strip())
+            except ValueError:
+                self.seq = 0
+        return yaml.safe_load(text) or {}
 
-    def _save_state(self):
-        with open(STATE_FILE, 'w') as f:
-            yaml.dump(self.state, f)
+    def _replay_journal(self, state):
+        """Applica i record successivi allo snapshot; ritorna l'offset di fine dell'ultimo record valido."""
+        if not os.path.exists(self.journal_file):
+            return 0
+        valid_end = 0
+        with open(self.journal_file, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    break
+                valid_end += len(line)
+                self._journal_records += 1
+                if rec["seq"] > self.seq:
+                    state[rec["stock"]] = rec["state"]
+                    self.seq = rec["seq"]
+        return valid_end
 
-    def update_on_buy(self, stock, qty, total_cost):
-        with self.lock:
-            s = self.state.get(stock, {"money_invested": 0.0, "quantity": 0})
-            s["money_invested"] += total_cost
-            s["quantity"] += qty
-            self.state[stock] = s
-            self._save_state()
+    def _open_journal(self, valid_end):
+        d = os.path.dirname(self.journal_file)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._journal = open(self.journal_file, 'ab')
+        if self._journal.tell() > valid_end:
+            # coda di un record scritto a metà: va tolta prima di appendere
+            print(f"[StockState] journal troncato: scartati {self._journal.tell() - valid_end} byte finali")
+            self._journal.truncate(valid_end)
 
-    def update_on_sell(self, stock, qty, total_return):
-        with self.lock:
-            s = self.state.get(stock, {"money_invested": 0.0, "quantity": 0})
-            if qty > s["quantity"]:
-                print(f"[Warning] Selling more than owned for {stock}")
-            avg_cost_per_share = s["money_invested"] / s["quantity"] if s["quantity"] > 0 else 0
-            s["money_invested"] -= avg_cost_per_share * qty
-            s["quantity"] -= qty
-            self.state[stock] = s
-            self._save_state()
+    # ---------- scrittura ----------
+    def commit(self, stock, state, all_states):
+        self.seq += 1
+        rec = {"seq": self.seq, "stock": stock, "state": state}
+        self._journal.write((json.dumps(rec, separators=(",", ":")) + "\n").encode("utf-8"))
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+        self._journal_records += 1
+        if self._journal_records >= self.compact_every:
+            self.compact(all_states)
 
-    def get_state(self, stock):
+    def compact(self, all_states):
+        # snapshot atomico, poi journal svuotato (i record con seq <= snapshot verrebbero comunque ignorati)
+        tmp = self.state_file + ".tmp"
+        with open(tmp, 'w') as f:
+            f.write(f"# seq: {self.seq}\n")
+            yaml.dump(all_states(), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.state_file)
+        if os.name != "nt":
+            fd = os.open(os.path.dirname(os.path.abspath(self.state_file)), os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        self._journal.truncate(0)
+        self._journal_records = 0
+
+    def close(self, all_states):
+        if self._journal is not None:
+            self.compact(all_states)
+            self._journal.close()
+            self._journal = None
+
+
+def make_state_backend(kind, state_file=STATE_FILE):
+    """'memory' | 'file' | istanza di backend -> backend."""
+    if kind is None or kind == "file":
+        return FileStateBackend(state_file)
+    if kind == "memory":
+        return MemoryStateBackend()
+    if isinstance(kind, str):
+        raise ValueError(f"State backend non valido: {kind} (usa 'memory' o 'file')")
+    return kind
+
+# ===================== MANAGER =====================
+
+class StockStateManager:
+    """
+        Class that manages to save the state of the transactions
+        and keep track of it
+
+        Lo stato vive in memoria come Position per stock; la persistenza è delegata
+        al backend (FileStateBackend: journal + snapshot, MemoryStateBackend: nessuna).
+    """
+
+
+    def __init__(self, state_file=STATE_FILE, compact_every=COMPACT_EVERY, fsync=True, backend=None):
+        # state_file=None -> stato solo in memoria (es. worker di backtest)
+        if backend is None:
+            backend = FileStateBackend(state_file, compact_every, fsync) if state_file else MemoryStateBackend()
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.positions = {k: Position.from_dict(v or {}) for k, v in backend.load().items()}
+
+    def _all_dicts(self):
+        return {k: p.to_dict() for k, p in self.positions.items()}
+
+    def _commit(self, stock, pos):
+        # chiamare con self.lock acquisito
+        self.backend.commit(stock, pos.to_dict(), self._all_dicts)
+
+    def compact(self):
         with self.lock:
-            return self.state.get(stock, {"money_invested": 0.0, "quantity": 0})
+            self.backend.compact(self._all_dicts)
 
-    def get_all_states(self):
+    def close(self):
         with self.lock:
-            return self.state.copy()
+            self.backend.close(self._all_dicts)
 
+    # ---------- API ----------
     def update_on_buy(self, stock, qty, total_cost):
         with self.lock:
-            s = self.state.get(stock, {"money_invested": 0.0, "quantity": 0, "realized_pnl": 0.0})
-            s["money_invested"] += total_cost
-            s["quantity"] += qty
-            self.state[stock] = s
-            self._save_state()
+            p = self.positions.get(stock)
+            if p is None:
+                p = self.positions[stock] = Position()
+            p.money_invested += total_cost
+            p.quantity += qty
+            self._commit(stock, p)
 
     def update_on_sell(self, stock, qty, total_return):
         with self.lock:
-            s = self.state.get(stock, {"money_invested": 0.0, "quantity": 0, "realized_pnl": 0.0})
-            if qty > s["quantity"]:
+            p = self.positions.get(stock)
+            if p is None:
+                p = self.positions[stock] = Position()
+            if qty > p.quantity:
                 print(f"[Warning] Selling more than owned for {stock}")
 
-            avg_cost = s["money_invested"] / s["quantity"] if s["quantity"] > 0 else 0
+            avg_cost = p.money_invested / p.quantity if p.quantity > 0 else 0
             cost_basis = avg_cost * qty
             realized_pnl = total_return - cost_basis
 
-            s["money_invested"] -= cost_basis
-            s["quantity"] -= qty
-            s["realized_pnl"] += realized_pnl
+            p.money_invested -= cost_basis
+            p.quantity -= qty
+            p.realized_pnl += realized_pnl
+            self._commit(stock, p)
+
+    def get_position(self, stock):
+        """Position viva (attributi, nessuna copia) o None. Da non modificare fuori dal manager."""
+        return self.positions.get(stock)
 
-            self.state[stock] = s
-            self._save_state()
+    def get_quantity(self, stock):
+        p = self.positions.get(stock)
+        return p.quantity if p is not None else 0
+
+    def get_state(self, stock):
+        with self.lock:
+            p = self.positions.get(stock)
+            return p.to_dict() if p is not None else {"money_invested": 0.0, "quantity": 0}
+
+    def get_all_states(self):
+        with self.lock:
+            return self._all_dicts()
+
+    def set_state(self, stock, state):
+        with self.lock:
+            p = self.positions[stock] = Position.from_dict(state)
+            self._commit(stock, p)
@@ -0,0 +1,276 @@
+# trading_system/utils/synthetic_bars.py
+"""
+Generatore vettoriale di barre 1m sintetiche multi-simbolo, per benchmark e stress test
+senza chiamare Alpaca.
+
+    python -m trading_system.utils.synthetic_bars --symbols 100 --start 2015-01-01 --end 2025-01-01
+    python -m trading_system.utils.synthetic_bars --symbols 5 --start 2024-01-01 --end 2024-07-01 \\
+        --format csv --timeframe 5 --session us
+
+Modello (log-rendimenti per minuto):
+  - correlazione: un fattore di mercato comune più una componente idiosincratica,
+    con caricamento per simbolo attorno a `corr`;
+  - regimi di volatilità: catena di Markov a due stati (calmo / volatile) comune a tutti
+    i simboli, durate geometriche;
+  - salti: eventi rari di mercato e per simbolo con ampiezza normale;
+  - gap "overnight": con session="us" restano solo i minuti 14:30-21:00 UTC lun-ven e il
+    primo minuto di ogni sessione riceve la varianza del periodo chiuso (ridotta di
+    `overnight_factor`);
+  - minuti mancanti: ogni barra viene scartata con probabilità `missing`, il prezzo
+    sottostante prosegue (come un buco nel feed).
+
+La generazione procede a blocchi di `chunk_days` giorni per tutti i simboli: la memoria
+resta O(minuti del blocco) e le barre vengono scritte man mano nello store colonnare
+(formato letto da fetch_local_bars/BarStore) o in CSV data/<TF>m/<SYMBOL>.csv.
+"""
+from __future__ import annotations
+import os
+import sys
+import time
+import argparse
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from trading_system.utils.bars import BarArrays, NS_PER_MIN, to_ns
+from trading_system.utils.bar_store import BarStore, STORE_ROOT, store_symbol
+from trading_system.utils.bar_csv import write_csv_bars
+from trading_system.utils.resample import resample
+
+MIN_PER_DAY = 1440
+NS_PER_DAY = MIN_PER_DAY * NS_PER_MIN
+US_SESSION = (14 * 60 + 30, 21 * 60)   # minuti UTC [apertura, chiusura)
+
+DEFAULTS = {
+    "vol": (0.4, 1.0),            # volatilità annua, estratta uniforme per simbolo
+    "corr": 0.5,                  # correlazione media fra simboli (fattore di mercato)
+    "regime_mult": (1.0, 2.5),    # moltiplicatore di volatilità calmo / volatile
+    "regime_days": (5.0, 1.0),    # durata media dei due regimi, in giorni
+    "jump_rate": 2e-5,            # probabilità per minuto di un salto (mercato e simbolo)
+    "jump_size": 0.02,            # deviazione standard del log-salto
+    "overnight_factor": 0.3,      # quota della varianza del periodo chiuso applicata al gap
+    "missing": 0.002,             # probabilità di barra mancante
+}
+
+
+def default_symbols(n: int) -> List[str]:
+    return [f"SYN{i:03d}/USD" for i in range(int(n))]
+
+
+def _session_mask(t: np.ndarray, session: Optional[str]) -> np.ndarray:
+    if session is None or session == "none":
+        return np.ones(len(t), dtype=bool)
+    if session != "us":
+        raise ValueError(f"Sessione non supportata: {session} (usa 'none' o 'us')")
+    minute = (t // NS_PER_MIN) % MIN_PER_DAY
+    weekday = (t // NS_PER_DAY + 3) % 7            # 1970-01-01 era giovedì -> 0 = lunedì
+    return (minute >= US_SESSION[0]) & (minute < US_SESSION[1]) & (weekday < 5)
+
+
+class _Regimes:
+    """Catena a due stati con durate geometriche, continua fra un blocco e il successivo."""
+    def __init__(self, rng: np.random.Generator, mean_minutes: Tuple[float, float]):
+        self.rng = rng
+        self.p = [1.0 / max(1.0, m) for m in mean_minutes]
+        self.state = 0
+        self.left = int(rng.geometric(self.p[0]))
+
+    def take(self, n: int) -> np.ndarray:
+        out = np.empty(n, dtype=np.int8)
+        i = 0
+        while i < n:
+            k = min(self.left, n - i)
+            out[i:i + k] = self.state
+            i += k
+            self.left -= k
+            if self.left == 0:
+                self.state ^= 1
+                self.left = int(self.rng.geometric(self.p[self.state]))
+        return out
+
+
+class SyntheticMarket:
+    """
+    Stato del generatore (prezzi, regime, parametri per simbolo) fra un blocco e l'altro.
+    generate(start, end) produce {simbolo: BarArrays 1m} per blocchi consecutivi.
+
+    Ogni simbolo ha il proprio stream casuale (SeedSequence.spawn): il risultato dipende
+    solo dal seed, anche quando i simboli sono calcolati in parallelo su `workers` thread
+    (numpy rilascia il GIL nelle operazioni vettoriali).
+    """
+    def __init__(self, symbols: List[str], seed: int = 7, session: Optional[str] = None,
+                 workers: Optional[int] = None, **params):
+        unknown = set(params) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f"Parametri sconosciuti: {sorted(unknown)}")
+        self.p = {**DEFAULTS, **params}
+        self.symbols = list(symbols)
+        self.session = None if session in (None, "none") else session
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        n = len(self.symbols)
+        seeds = np.random.SeedSequence(seed).spawn(n + 1)
+        self.rng = np.random.default_rng(seeds[0])                 # fattore di mercato e regimi
+        self.sym_rng = [np.random.default_rng(s) for s in seeds[1:]]
+
+        # minuti di trading per anno: volatilità annua -> per minuto
+        per_year = 252 * (US_SESSION[1] - US_SESSION[0]) if self.session else 365 * MIN_PER_DAY
+        lo, hi = self.p["vol"]
+        self.sigma = self.rng.uniform(lo, hi, n) / np.sqrt(per_year)
+        rho = float(self.p["corr"])
+        self.load = np.clip(np.sqrt(rho) * self.rng.uniform(0.8, 1.2, n), 0.0, 0.99)
+        self.price = np.exp(self.rng.uniform(np.log(5.0), np.log(50_000.0), n))
+        mean_min = tuple(d * MIN_PER_DAY for d in self.p["regime_days"])
+        self.regimes = _Regimes(self.rng, mean_min)
+        self.last_kept_ns: Optional[int] = None
+
+    @staticmethod
+    def _sparse(rng: np.random.Generator, k: int, prob: float) -> np.ndarray:
+        """Posizioni di eventi rari (salti, barre mancanti) senza un estrazione per minuto."""
+        return rng.integers(0, k, rng.binomial(k, prob)) if prob > 0 else np.empty(0, dtype=np.int64)
+
+    def _chunk(self, t0: int, minutes: int) -> Dict[str, BarArrays]:
+        p = self.p
+        t = t0 + np.arange(minutes, dtype=np.int64) * NS_PER_MIN
+        t = t[_session_mask(t, self.session)]
+        k = len(t)
+        if k == 0:
+            return {}
+
+        # minuti chiusi prima di ogni barra (0 in continuo, > 0 all'apertura di sessione)
+        prev = np.empty(k, dtype=np.int64)
+        prev[0] = t[0] - NS_PER_MIN if self.last_kept_ns is None else self.last_kept_ns
+        prev[1:] = t[:-1]
+        closed = (t - prev) // NS_PER_MIN - 1
+        self.last_kept_ns = int(t[-1])
+        gap_idx = np.flatnonzero(closed > 0)
+        gap_scale = np.sqrt(closed[gap_idx] * p["overnight_factor"])
+
+        mult = np.asarray(p["regime_mult"], dtype=np.float32)[self.regimes.take(k)]
+        market = self.rng.standard_normal(k, dtype=np.float32)
+        mkt_jump_idx = self._sparse(self.rng, k, p["jump_rate"])
+        mkt_jumps = self.rng.normal(0.0, p["jump_size"], len(mkt_jump_idx))
+
+        def one(i: int) -> BarArrays:
+            rng, a, sigma = self.sym_rng[i], self.load[i], self.sigma[i]
+            z = rng.standard_normal(k, dtype=np.float32)
+            z *= np.float32(np.sqrt(1.0 - a * a))
+            z += np.float32(a) * market
+            z *= mult
+            z *= np.float32(sigma)
+            intrabar = z                                        # rendimento dentro la barra
+            jump_idx = self._sparse(rng, k, p["jump_rate"])
+            np.add.at(intrabar, jump_idx, rng.normal(0.0, p["jump_size"], len(jump_idx)).astype(np.float32))
+            np.add.at(intrabar, mkt_jump_idx, (a * mkt_jumps).astype(np.float32))
+
+            # gap: parte del rendimento maturata a mercato chiuso, va nell'open
+            step = intrabar.astype(np.float64)
+            step[gap_idx] += sigma * gap_scale * rng.standard_normal(len(gap_idx))
+            log_c = np.cumsum(step)
+            log_c += np.log(self.price[i])
+            c = np.exp(log_c)
+            o = np.exp(log_c - intrabar)
+            self.price[i] = c[-1]
+
+            spread = np.abs(rng.standard_normal(k, dtype=np.float32))
+            spread *= mult
+            spread *= np.float32(0.5 * sigma)
+            spread = np.exp(spread)
+            h = np.maximum(o, c) * spread
+            l = np.minimum(o, c) / spread
+            v = rng.standard_normal(k, dtype=np.float32)
+            v = np.exp(v) * mult
+
+            keep = np.ones(k, dtype=bool)
+            keep[self._sparse(rng, k, p["missing"])] = False
+            return BarArrays(t[keep], o[keep], h[keep], l[keep], c[keep], v[keep])
+
+        if self.workers > 1 and len(self.symbols) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=self.workers) as ex:
+                series = list(ex.map(one, range(len(self.symbols))))
+        else:
+            series = [one(i) for i in range(len(self.symbols))]
+        return dict(zip(self.symbols, series))
+
+    def generate(self, start_iso: str, end_iso: str, chunk_days: int = 30) -> Iterator[Dict[str, BarArrays]]:
+        start_ns, end_ns = to_ns(start_iso), to_ns(end_iso)
+        step = int(chunk_days) * NS_PER_DAY
+        t0 = start_ns
+        while t0 < end_ns:
+            t1 = min(t0 + step, end_ns)
+            chunk = self._chunk(t0, int((t1 - t0) // NS_PER_MIN))
+            if chunk:
+                yield chunk
+            t0 = t1
+
+# ===================== SCRITTURA =====================
+
+def csv_path(root: str, symbol: str, timeframe_minutes: int) -> str:
+    """data/<TF>m/<BTC-USD>.csv, uno dei layout cercati da fetch_local_bars."""
+    return os.path.join(root, f"{int(timeframe_minutes)}m", f"{store_symbol(symbol)}.csv")
+
+
+def write_synthetic(symbols: List[str], start_iso: str, end_iso: str, fmt: str = "store",
+                    root: Optional[str] = None, timeframe_minutes: int = 1, seed: int = 7,
+                    session: Optional[str] = None, chunk_days: int = 30, workers: Optional[int] = None,
+                    **params) -> Dict[str, float]:
+    """
+    Genera e scrive le serie; fmt="store" (colonnare, data/store) oppure "csv" (data/<TF>m/).
+    Le serie esistenti degli stessi simboli/timeframe vengono sostituite.
+    """
+    if fmt not in ("store", "csv"):
+        raise ValueError(f"Formato non valido: {fmt} (usa 'store' o 'csv')")
+    tf = int(timeframe_minutes)
+    if MIN_PER_DAY % tf:
+        raise ValueError("timeframe_minutes deve dividere 1440 (i blocchi sono giorni interi)")
+    if to_ns(start_iso) % NS_PER_DAY:
+        raise ValueError("start deve essere una mezzanotte UTC")
+    root = root or (STORE_ROOT if fmt == "store" else "data")
+    store = BarStore(root) if fmt == "store" else None
+
+    market = SyntheticMarket(symbols, seed=seed, session=session, workers=workers, **params)
+    rows, first = 0, True
+    t_start = time.perf_counter()
+    for chunk in market.generate(start_iso, end_iso, chunk_days):
+        for sym, bars in chunk.items():
+            if tf > 1:
+                bars = resample(bars, tf, label="left")
+            if fmt == "store":
+                (store.write if first else store.append)(sym, tf, bars)
+            else:
+                write_csv_bars(csv_path(root, sym, tf), bars, append=not first)
+            rows += len(bars)
+        first = False
+    dt = time.perf_counter() - t_start
+    return {"symbols": len(symbols), "rows": rows, "seconds": dt, "rows_per_sec": rows / dt if dt > 0 else 0.0}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--symbols", default="10", help="numero di simboli o lista separata da virgola (BTC/USD,ETH/USD)")
+    ap.add_argument("--start", default="2024-01-01")
+    ap.add_argument("--end", default="2025-01-01")
+    ap.add_argument("--format", choices=("store", "csv"), default="store")
+    ap.add_argument("--root", default=None, help=f"default {STORE_ROOT} (store) o data (csv)")
+    ap.add_argument("--timeframe", type=int, default=1)
+    ap.add_argument("--session", choices=("none", "us"), default="none")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--chunk-days", type=int, default=30)
+    ap.add_argument("--corr", type=float, default=DEFAULTS["corr"])
+    ap.add_argument("--missing", type=float, default=DEFAULTS["missing"])
+    args = ap.parse_args(argv)
+
+    symbols = default_symbols(int(args.symbols)) if args.symbols.isdigit() else \
+        [s.strip().upper() for s in args.symbols.split(",")]
+    print(f"[Synthetic] {len(symbols)} simboli, {args.start} -> {args.end}, tf={args.timeframe}m, "
+          f"session={args.session}, formato={args.format}")
+    out = write_synthetic(symbols, args.start, args.end, fmt=args.format, root=args.root,
+                          timeframe_minutes=args.timeframe, seed=args.seed, session=args.session,
+                          chunk_days=args.chunk_days, corr=args.corr, missing=args.missing)
+    print(f"[Synthetic] {out['rows']:,} barre in {out['seconds']:.1f}s ({out['rows_per_sec']:,.0f} barre/s)")
+
+
+if __name__ == "__main__":
+    main()
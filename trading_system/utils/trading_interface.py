@@ -2,13 +2,29 @@ from .base_interface import TradingInterface
 from alpaca.data.requests import CryptoLatestTradeRequest
 from alpaca.data.requests import StockLatestTradeRequest
 from .alpaca_client import get_trading_client, get_crypto_data_client, get_stock_data_client
+from .quote_cache import QuoteCache, asset_class
 from alpaca.trading.enums import OrderSide, TimeInForce
 from alpaca.trading.requests import MarketOrderRequest
 import os
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
 load_dotenv(override=True)
 
+# connessioni HTTP keep-alive verso l'API ordini (una per worker della OrderPipeline)
+ORDER_POOL_SIZE = int(os.getenv("ORDER_POOL_SIZE", "8"))
+
+
+def _order_update(order) -> dict:
+    """Order Alpaca -> update della OrderPipeline."""
+    status = getattr(order.status, "value", order.status)
+    return {
+        "id": str(order.id),
+        "status": str(status),
+        "filled_qty": float(order.filled_qty or 0.0),
+        "filled_avg_price": float(order.filled_avg_price or 0.0),
+    }
+
 
 class AlpacaTradingInterface:
     def __init__(self):
@@ -18,21 +34,38 @@ class AlpacaTradingInterface:
         self.api_key = os.getenv("PAPER_API_KEY_ID")
         self.api_secret = os.getenv("PAPER_API_SECRET_KEY")
 
+        # un solo client condiviso dai worker della pipeline ordini: pool di connessioni
+        # dimensionato sui worker, così gli invii concorrenti non riaprono connessioni TLS
+        session = getattr(self.trading_client, "_session", None)
+        if session is not None:
+            adapter = HTTPAdapter(pool_connections=ORDER_POOL_SIZE, pool_maxsize=ORDER_POOL_SIZE)
+            session.mount("https://", adapter)
+
+        # last price con TTL, refresh a batch (una richiesta per classe di asset)
+        self.quotes = QuoteCache(self._fetch_last_prices)
+
+    def _fetch_last_prices(self, symbols):
+        """Una sola richiesta latest-trade per tutti i simboli (tutti della stessa classe di asset)."""
+        syms = [s.upper() for s in symbols]
+        if asset_class(syms[0]) == "crypto":  # Crypto symbol e.g. BTC/USD
+            request = CryptoLatestTradeRequest(symbol_or_symbols=syms)
+            response = self.crypto_data_client.get_crypto_latest_trade(request)
+        else:  # Stock symbol e.g. AAPL
+            request = StockLatestTradeRequest(symbol_or_symbols=syms)
+            response = self.stock_data_client.get_stock_latest_trade(request)
+        return {s: float(t.price) for s, t in response.items()}
 
     def get_last_price(self, symbol: str):
         try:
-            if "/" in symbol:  # Crypto symbol e.g. BTC/USD
-                request = CryptoLatestTradeRequest(symbol_or_symbols=[symbol.upper()])
-                response = self.crypto_data_client.get_crypto_latest_trade(request)
-                return float(response[symbol.upper()].price)
-            else:  # Stock symbol e.g. AAPL
-                request = StockLatestTradeRequest(symbol_or_symbols=[symbol.upper()])
-                response = self.stock_data_client.get_stock_latest_trade(request)
-                return float(response[symbol.upper()].price)
+            return self.quotes.get_last_price(symbol)
         except Exception as e:
             print(f"[Alpaca] Error fetching last price for {symbol}: {e}")
             return None
 
+    def get_last_prices(self, symbols):
+        """{SYMBOL: prezzo | None} con al più una richiesta per classe di asset."""
+        return self.quotes.get_last_prices(symbols)
+
     def buy(self, symbol: str, qty: float):
         
         print(f"[Alpaca] Buying {qty} {symbol}")
@@ -63,6 +96,21 @@ class AlpacaTradingInterface:
             order_data=order_request
         )
 
+    # ---------- API per OrderPipeline ----------
+    def submit_order(self, symbol: str, side: str, qty: float, client_order_id: str = None):
+        order_request = MarketOrderRequest(
+            symbol=symbol.upper().replace("_", "/"),
+            qty=qty,
+            side=OrderSide.BUY if side == "buy" else OrderSide.SELL,
+            type="market",
+            time_in_force=TimeInForce.GTC,
+            client_order_id=client_order_id,
+        )
+        return _order_update(self.trading_client.submit_order(order_data=order_request))
+
+    def get_order(self, order_id: str):
+        return _order_update(self.trading_client.get_order_by_id(order_id))
+
     def get_position(self, symbol: str):
         try:
             return self.trading_client.get_open_position(symbol.upper())